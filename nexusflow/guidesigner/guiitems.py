@@ -6,14 +6,17 @@ from PySide6.QtWidgets import QWidget, QVBoxLayout, QGridLayout, QFileDialog, QL
 from PySide6.QtCore import Qt, Signal, Slot
 from PySide6.QtGui import QPixmap
 from dataclasses import dataclass
-from typing import Optional, List, Tuple, Union
+from typing import Any, Optional, List, Tuple, Union
 
 from nexusflow.guidesigner.guicomponents.primitives.outputs import Label
 from nexusflow.utils import string_uuid
 from nexusflow import router
+from nexusflow.messages import SampleBlock
 from nexusflow.globalconstants import int_range, float_range
 from nexusflow.utils import string_uuid
 from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+from nexusflow.systemdesigner.module.addressmap import AddressMap, address_map_topic, get_address_map
+from nexusflow.systemdesigner.controllers.okfpga import connection_route
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -488,7 +491,7 @@ class GuiInputWidgetItem(QTreeWidgetItem):
             editor = QCheckBox()
             editor.setChecked(self.data.value.initial == 1)
             editor.stateChanged.connect(
-                lambda state: router.route('aihfdoaousadpgfpef', {'function': 'ADD3 3', 'value': state == 2})
+                lambda state: self.publish_value(state == 2)
             )
             layout.addWidget(editor, 0, 1)
             widget.setLayout(layout)
@@ -500,6 +503,16 @@ class GuiInputWidgetItem(QTreeWidgetItem):
         # container_layout.addWidget(widget, self.position.row, self.position.column)
         return widget
 
+    def publish_value(self, value: Any):
+        """ Write the pin on the active board, the handle is looked up on every write as re-imports renumber pins
+        """
+        try:
+            handle = get_address_map().handle_of(self.data.id)
+        except (RuntimeError, KeyError):
+            logging.warning(f"Input {self.data.id} is not an imported pin, {value} is not written")
+            return
+        router.publish(f'fpga/channel/{handle}', value)
+
 
 @dataclass(kw_only=True)
 class GuiIntOutputSettings:
@@ -576,6 +589,68 @@ class GuiOutputSettings:
         return self.type_options[self.type]
 
 
+def set_led(led: QLabel, on: bool):
+    led.setStyleSheet(
+        f'background-color: {"red" if on else "gray"};border: 2px solid black;border-radius: 7px;'
+        f'max-width: 14px;max-height: 14px;')
+
+
+class PinSampleDisplay:
+    def __init__(self, pin_id: str, display: callable, widget: QWidget):
+        """ Shows the latest converted sample of a pin on a widget, at most once per frame
+
+        The handle is looked up again whenever a new address map is published, so a re-import that renumbers
+        the pins keeps showing this pin. Both subscriptions end when the widget is destroyed.
+
+        :param pin_id: The pin id
+        :type pin_id: str
+        :param display: Called with the latest value
+        :type display: callable
+        :param widget: The widget showing the value
+        :type widget: QWidget
+        """
+        self.pin_id = pin_id
+        self.display = display
+        self.handle: Optional[int] = None
+        self.sample_subscription = None
+        self.address_map_subscription = router.subscribe(address_map_topic, self.resubscribe, kind='state')
+        widget.destroyed.connect(lambda: self.unsubscribe())
+        try:
+            address_map = get_address_map()
+        except RuntimeError:
+            address_map = None
+        self.resubscribe(address_map)
+
+    def resubscribe(self, address_map: Optional[AddressMap]):
+        if self.sample_subscription is not None:
+            router.unsubscribe_samples(self.sample_subscription)
+            self.sample_subscription = None
+        self.handle = None
+        if address_map is None or self.pin_id not in address_map.handles:
+            logging.warning(f"Output {self.pin_id} is not an imported pin, it shows its initial value only")
+            return
+        handle = self.handle = address_map.handle_of(self.pin_id)
+        self.sample_subscription = router.subscribe_samples(
+            lambda block: self.show(handle, block),
+            handles=[handle],
+            name=f'output/{self.pin_id}',
+            kind='state'
+        )
+
+    def show(self, handle: int, block: SampleBlock):
+        # A block queued before the pins were renumbered belongs to another pin now
+        if handle == self.handle:
+            self.display(float(block.values[-1]))
+
+    def unsubscribe(self):
+        if self.sample_subscription is not None:
+            router.unsubscribe_samples(self.sample_subscription)
+            self.sample_subscription = None
+        if self.address_map_subscription is not None:
+            router.unsubscribe(self.address_map_subscription)
+            self.address_map_subscription = None
+
+
 class GuiOutputWidgetItem(QTreeWidgetItem):
     def __init__(self):
         super().__init__([f'New Output', ''])
@@ -612,6 +687,7 @@ class GuiOutputWidgetItem(QTreeWidgetItem):
             editor.display(self.data.value.initial)
             layout.addWidget(editor, 0, 1)
             widget.setLayout(layout)
+            PinSampleDisplay(self.data.id, editor.display, widget)
         elif self.data.main_gui.display_type == 'str':
             widget = QLabel(self.data.value.initial)
         elif self.data.main_gui.display_type == 'list':
@@ -623,13 +699,10 @@ class GuiOutputWidgetItem(QTreeWidgetItem):
             layout = QGridLayout()
             layout.addWidget(QLabel(self.data.name), 0, 0)
             editor = QLabel()
-            if self.data.value.initial == 1:
-                editor.setStyleSheet(
-                    'background-color: red;border: 2px solid black;border-radius: 7px;max-width: 14px;max-height: 14px;')
-            else:
-                editor.setStyleSheet(
-                    'background-color: gray;border: 2px solid black;border-radius: 7px;max-width: 14px;max-height: 14px;')
+            set_led(editor, self.data.value.initial == 1)
             layout.addWidget(editor, 0, 1)
+            widget.setLayout(layout)
+            PinSampleDisplay(self.data.id, lambda value: set_led(editor, value != 0), widget)
 
         return widget
 
@@ -639,7 +712,7 @@ class GuiControllerWidgetItem(QTreeWidgetItem):
         super().__init__([f'OpalKelly FPGA', 'fpga_controller'])
         self.uuid = string_uuid()
         self.position = GuiItemPositionData()
-        router.register_route('asdoncdsajcbds', self.route_handler)
+        router.register_route(connection_route, self.route_handler, kind='state')
 
     def route_handler(self, payload):
         if payload['function'] == 'on':
@@ -658,16 +731,12 @@ class GuiControllerWidgetItem(QTreeWidgetItem):
         layout.addWidget(self.is_connected_led)
         connect_button = QPushButton('Connect')
         connect_button.clicked.connect(
-            lambda checked: router.route('aihfdoaousadpgfpef',
-                                         {'function': 'connect'}
-                                         )
+            lambda checked: router.publish('fpga/connect', None)
         )
         layout.addWidget(connect_button)
         disconnect_button = QPushButton('Disconnect')
         disconnect_button.clicked.connect(
-            lambda checked: router.route('aihfdoaousadpgfpef',
-                                         {'function': 'disconnect'}
-                                         )
+            lambda checked: router.publish('fpga/disconnect', None)
         )
         layout.addWidget(disconnect_button)
         # layout.addStretch(1)
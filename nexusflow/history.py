@@ -0,0 +1,273 @@
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from nexusflow.messages import SampleBlock
+
+logging.basicConfig(level=logging.DEBUG)
+
+default_capacity = 1024  # entries per channel and level
+default_factors = (16, 256)  # samples per bucket of the decimated levels
+
+
+@dataclass(kw_only=True)
+class HistoryQuery:
+    timestamps: np.ndarray  # timestamp of the first sample of every point
+    minimum: np.ndarray
+    maximum: np.ndarray
+    mean: np.ndarray
+    factor: int  # samples per bucket of the level the points were taken from
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class HistoryLevel:
+    def __init__(self, channel_count: int, capacity: int, factor: int):
+        """ Circular buffer of buckets of ``factor`` samples for every channel
+
+        The bucket being filled is kept in the partial arrays and written to the ring once it holds
+        ``factor`` samples. With factor 1 the level holds the raw samples and min, max and mean share one
+        array.
+        """
+        self.capacity = capacity
+        self.factor = factor
+        self.timestamps = np.zeros((channel_count, capacity))
+        self.minimum = np.zeros((channel_count, capacity))
+        if factor == 1:
+            self.maximum = self.mean = self.minimum
+        else:
+            self.maximum = np.zeros((channel_count, capacity))
+            self.mean = np.zeros((channel_count, capacity))
+        self.count = np.zeros(channel_count, dtype=np.int64)  # buckets written since the start
+
+        self.partial_count = np.zeros(channel_count, dtype=np.int64)
+        self.partial_start = np.zeros(channel_count)
+        self.partial_minimum = np.full(channel_count, np.inf)
+        self.partial_maximum = np.full(channel_count, -np.inf)
+        self.partial_sum = np.zeros(channel_count)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = {id(array): array for array in (self.timestamps, self.minimum, self.maximum, self.mean)}
+        return sum(array.nbytes for array in arrays.values())
+
+    def add(self, channels: np.ndarray, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """ Add one sample to each of the channels, which must be unique
+        """
+        counts = self.partial_count[channels]
+        starting = counts == 0
+        self.partial_start[channels[starting]] = timestamps[starting]
+        self.partial_minimum[channels] = np.minimum(self.partial_minimum[channels], values)
+        self.partial_maximum[channels] = np.maximum(self.partial_maximum[channels], values)
+        self.partial_sum[channels] += values
+        self.partial_count[channels] = counts + 1
+        full = counts + 1 >= self.factor
+        if full.any():
+            self.commit(channels[full])
+
+    def commit(self, channels: np.ndarray) -> None:
+        slots = self.count[channels] % self.capacity
+        self.timestamps[channels, slots] = self.partial_start[channels]
+        self.minimum[channels, slots] = self.partial_minimum[channels]
+        self.maximum[channels, slots] = self.partial_maximum[channels]
+        self.mean[channels, slots] = self.partial_sum[channels] / self.partial_count[channels]
+        self.count[channels] += 1
+
+        self.partial_count[channels] = 0
+        self.partial_minimum[channels] = np.inf
+        self.partial_maximum[channels] = -np.inf
+        self.partial_sum[channels] = 0.0
+
+    def oldest(self, channel: int) -> int:
+        """ Logical index of the oldest bucket still in the ring
+        """
+        return max(0, int(self.count[channel]) - self.capacity)
+
+    def search(self, channel: int, t: float, side: str = 'left') -> int:
+        """ Logical index of the first bucket starting at or after t (after t for side 'right')
+
+        The ring holds at most two sorted runs, each is searched with a binary search.
+        """
+        first = self.oldest(channel)
+        length = int(self.count[channel]) - first
+        start_slot = first % self.capacity
+        head = self.timestamps[channel, start_slot:min(self.capacity, start_slot + length)]
+        index = int(np.searchsorted(head, t, side=side))
+        if index < len(head):
+            return first + index
+        tail = self.timestamps[channel, :length - len(head)]
+        return first + len(head) + int(np.searchsorted(tail, t, side=side))
+
+    def window(self, channel: int, start: float, end: float) -> Tuple[int, int]:
+        """ Logical index range of the buckets starting in [start, end]
+        """
+        return self.search(channel, start), self.search(channel, end, side='right')
+
+    def oldest_timestamp(self, channel: int) -> float:
+        """ Start of the oldest bucket still held, inf if there is none
+        """
+        if self.count[channel]:
+            return float(self.timestamps[channel, self.oldest(channel) % self.capacity])
+        if self.partial_count[channel]:
+            return float(self.partial_start[channel])
+        return np.inf
+
+    def read(self, channel: int, first: int, last: int, start: float,
+             end: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Buckets [first, last) followed by the partial bucket if it started in [start, end]
+
+        :return: timestamps, minimum, maximum, mean and number of samples per bucket
+        """
+        slots = np.arange(first, last) % self.capacity
+        timestamps = self.timestamps[channel, slots]
+        minimum = self.minimum[channel, slots]
+        maximum = self.maximum[channel, slots]
+        mean = self.mean[channel, slots]
+        counts = np.full(len(slots), self.factor)
+        if self.partial_count[channel] and start <= self.partial_start[channel] <= end:
+            timestamps = np.append(timestamps, self.partial_start[channel])
+            minimum = np.append(minimum, self.partial_minimum[channel])
+            maximum = np.append(maximum, self.partial_maximum[channel])
+            mean = np.append(mean, self.partial_sum[channel] / self.partial_count[channel])
+            counts = np.append(counts, self.partial_count[channel])
+        return timestamps, minimum, maximum, mean, counts
+
+
+class HistoryStore:
+    def __init__(self, channel_count: int, capacity: int = default_capacity,
+                 factors: Sequence[int] = default_factors):
+        """ Bounded history of every channel with min/max/mean pyramids
+
+        Every channel has a preallocated ring of its last ``capacity`` raw samples, and for every decimation
+        factor a ring of ``capacity`` buckets holding the min, max and mean of ``factor`` samples. The
+        buckets are filled as samples arrive, so memory is fixed and a query for W points reads O(W)
+        buckets from the finest level that covers the requested time range.
+
+        :param channel_count: Number of channels, handles are 0 .. channel_count - 1
+        :type channel_count: int
+        :param capacity: Raw samples and buckets kept per channel and level
+        :type capacity: int
+        :param factors: Samples per bucket of the decimated levels, increasing
+        :type factors: Sequence[int]
+        ...
+        :raises ValueError: If the capacity is not positive or the factors are not increasing
+        """
+        factors = tuple(int(factor) for factor in factors)
+        if capacity < 1:
+            raise ValueError(f"History capacity must be positive, got {capacity}")
+        if any(factor <= previous for previous, factor in zip((1,) + factors, factors)):
+            raise ValueError(f"Decimation factors must be increasing and larger than 1, got {factors}")
+        self.channel_count = channel_count
+        self.levels: List[HistoryLevel] = [HistoryLevel(channel_count, capacity, factor) for factor in (1,) + factors]
+        self.latest_value = np.full(channel_count, np.nan)
+        self.latest_timestamp = np.full(channel_count, np.nan)
+        self.lock = threading.Lock()
+
+        logging.debug(f"History of {channel_count} channels uses {self.nbytes / 1e6:.1f} MB")
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def append(self, block: SampleBlock) -> None:
+        """ Add a block of samples, samples of unknown handles are ignored
+
+        Samples of the same channel must arrive in time order.
+
+        :param block: The samples
+        :type block: SampleBlock
+        """
+        handles = block.handles.astype(np.int64)
+        known = handles < self.channel_count
+        if not known.all():
+            handles = handles[known]
+            block = block.select(known)
+        if not len(handles):
+            return
+        values = block.values
+        timestamps = block.timestamps
+
+        with self.lock:
+            if len(np.unique(handles)) == len(handles):
+                self.add(handles, values, timestamps)
+            else:
+                # Repeated channels: add the n-th sample of every channel in round n
+                order = np.argsort(handles, kind='stable')
+                sorted_handles = handles[order]
+                first = np.searchsorted(sorted_handles, sorted_handles, side='left')
+                rounds = np.empty(len(handles), dtype=np.int64)
+                rounds[order] = np.arange(len(handles)) - first
+                for round_index in range(int(rounds.max()) + 1):
+                    in_round = rounds == round_index
+                    self.add(handles[in_round], values[in_round], timestamps[in_round])
+
+    def add(self, handles: np.ndarray, values: np.ndarray, timestamps: np.ndarray) -> None:
+        for level in self.levels:
+            level.add(handles, values, timestamps)
+        self.latest_value[handles] = values
+        self.latest_timestamp[handles] = timestamps
+
+    def latest(self, handle: int) -> Tuple[float, float]:
+        """ Last value of a channel and its timestamp, NaN if it has none yet
+        """
+        return float(self.latest_value[handle]), float(self.latest_timestamp[handle])
+
+    def query(self, handle: int, duration: float, width: int, now: Optional[float] = None) -> HistoryQuery:
+        """ The last ``duration`` seconds of a channel as at most ``width`` min/max/mean points
+
+        :param handle: The channel
+        :type handle: int
+        :param duration: Seconds back from ``now``
+        :type duration: float
+        :param width: Maximum number of points, e.g. the plot width in pixels
+        :type width: int
+        :param now: End of the range, defaults to time.time()
+        :type now: Optional[float]
+        ...
+        :return: The points
+        :rtype: HistoryQuery
+        """
+        end = time.time() if now is None else now
+        return self.query_range(handle, end - duration, end, width)
+
+    def query_range(self, handle: int, start: float, end: float, width: int) -> HistoryQuery:
+        """ The samples of a channel between start and end as at most ``width`` min/max/mean points
+
+        :raises IndexError: If the handle is out of range
+        """
+        if not 0 <= handle < self.channel_count:
+            raise IndexError(f"Channel handle {handle} out of range 0 .. {self.channel_count - 1}")
+        width = max(int(width), 1)
+        with self.lock:
+            level = self.select_level(handle, start, end, width)
+            first, last = level.window(handle, start, end)
+            timestamps, minimum, maximum, mean, counts = level.read(handle, first, last, start, end)
+
+        group = math.ceil(len(timestamps) / width) if len(timestamps) else 1
+        if group > 1:
+            starts = np.arange(0, len(timestamps), group)
+            weighted = np.add.reduceat(mean * counts, starts)
+            timestamps = timestamps[starts]
+            minimum = np.minimum.reduceat(minimum, starts)
+            maximum = np.maximum.reduceat(maximum, starts)
+            mean = weighted / np.add.reduceat(counts, starts)
+        return HistoryQuery(timestamps=timestamps, minimum=minimum, maximum=maximum, mean=mean, factor=level.factor)
+
+    def select_level(self, handle: int, start: float, end: float, width: int) -> HistoryLevel:
+        """ Finest level that reaches back to the start of the range, or as far as any level does, and
+        needs no more than a few buckets per point
+        """
+        oldest = [level.oldest_timestamp(handle) for level in self.levels]
+        for index, (level, coarser) in enumerate(zip(self.levels, self.levels[1:])):
+            if oldest[index] > start and min(oldest[index + 1:]) < oldest[index]:
+                continue
+            first, last = level.window(handle, start, end)
+            if last - first <= width * (coarser.factor // level.factor):
+                return level
+        return self.levels[-1]
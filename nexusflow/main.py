@@ -12,6 +12,7 @@ from nexusflow.systemdesigner.systemdesigner import System
 from guidesigner.guidesigner import GuiDesigner
 from automationsdesigner.automationsdesigner import AutomationsDesigner
 from nexusflow import router
+from nexusflow.systemrunner import SystemRunner
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -233,6 +234,8 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("NexusFlow")
         # self.showMaximized()
 
+        router.enable_message_bus()
+
         self.create_menu()
 
         self.statusBar().showMessage('Welcome to NexusFlow!')
@@ -260,8 +263,11 @@ class MainWindow(QMainWindow):
         # self.central_widget.currentChanged.connect(self.tab_changed_handler)
 
         self.system_runner_dock = QDockWidget("System Runner")
+        self.system_runner = SystemRunner()
+        self.system_runner_dock.setWidget(self.system_runner)
         self.addDockWidget(Qt.BottomDockWidgetArea, self.system_runner_dock)
         self.system_runner_dock.hide()
+        self.view_menu.addAction(self.system_runner_dock.toggleViewAction())
 
     def create_menu(self) -> None:
         """ Creates menu bar
@@ -271,6 +277,9 @@ class MainWindow(QMainWindow):
         save_project_action = file_menu.addAction("&Save")
         save_project_action.triggered.connect(self.save_action_handler)
 
+        # View menu, dock toggles are added once the docks exist
+        self.view_menu = self.menuBar().addMenu("&View")
+
         about_menu = self.menuBar().addMenu("&About")
         about_action = about_menu.addAction("&About")
         about_action.triggered.connect(self.about_action_handler)
@@ -289,6 +298,10 @@ def main():
     window = MainWindow()
     window.show()
     app.exec()
+    window.system_designer.close_controllers()
+    router.stop_recording()
+    router.disable_message_bus()
+    router.shutdown_workers()
 
 
 if __name__ == '__main__':
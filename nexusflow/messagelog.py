@@ -0,0 +1,253 @@
+import json
+import logging
+import mmap
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+import numpy as np
+
+from nexusflow.messages import SampleBlock, sample_dtype
+
+logging.basicConfig(level=logging.DEBUG)
+
+file_magic = b'NXFLOG'
+file_version = 2
+file_header = struct.Struct('<6sH')
+# timestamp, destination handle, value type, payload length
+record_header = struct.Struct('<dIBI')
+
+# Destination kinds, stored in the declaration record of every destination
+destination_route = 0
+destination_topic = 1
+destination_samples = 2
+
+# Value types
+value_declaration = 0
+value_none = 1
+value_bool = 2
+value_int = 3
+value_float = 4
+value_str = 5
+value_samples = 6
+value_json = 7  # dicts and lists, never pickle: replaying a log from the field must not run code
+
+int_struct = struct.Struct('<q')
+float_struct = struct.Struct('<d')
+
+
+def pack_value(payload: Any) -> Tuple[int, bytes]:
+    """ Value type and bytes of a payload, dicts, lists and tuples are stored as JSON (tuples come back as lists)
+
+    :raises TypeError: If the payload cannot be stored, e.g. an object or a dict holding one
+    :raises ValueError: If a dict or list refers to itself
+    """
+    if payload is None:
+        return value_none, b''
+    elif isinstance(payload, bool):
+        return value_bool, b'\x01' if payload else b'\x00'
+    elif isinstance(payload, int) and -2 ** 63 <= payload < 2 ** 63:
+        return value_int, int_struct.pack(payload)
+    elif isinstance(payload, float):
+        return value_float, float_struct.pack(payload)
+    elif isinstance(payload, str):
+        return value_str, payload.encode('utf-8')
+    elif isinstance(payload, SampleBlock):
+        return value_samples, payload.samples.tobytes()
+    elif isinstance(payload, (dict, list, tuple)):
+        return value_json, json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    else:
+        raise TypeError(f"Cannot record a {type(payload).__name__} payload")
+
+
+def unpack_value(value_type: int, data: memoryview) -> Any:
+    if value_type == value_none:
+        return None
+    elif value_type == value_bool:
+        return data[0] == 1
+    elif value_type == value_int:
+        return int_struct.unpack(data)[0]
+    elif value_type == value_float:
+        return float_struct.unpack(data)[0]
+    elif value_type == value_str:
+        return bytes(data).decode('utf-8')
+    elif value_type == value_samples:
+        return SampleBlock(np.frombuffer(data, dtype=sample_dtype).copy())
+    elif value_type == value_json:
+        return json.loads(bytes(data).decode('utf-8'))
+    else:
+        raise ValueError(f"Unknown value type {value_type}")
+
+
+class MessageRecorder:
+    def __init__(self, path: Path | str, flush_interval: float = 1.0):
+        """ Appends every routed message to a compact binary log
+
+        Each destination is declared once and then referenced by an integer handle, so a record is a
+        17 byte header plus the packed value. A payload that cannot be packed is skipped with a warning
+        (once per destination), recording never keeps a message from being routed.
+
+        :param path: Log file, appended to if it exists
+        :type path: Path | str
+        :param flush_interval: Seconds between flushes to disk
+        :type flush_interval: float
+        ...
+        :raises ValueError: If the file exists and is not a log of this version
+        """
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.handles: Dict[Tuple[int, str], int] = {}
+        self.record_count = 0
+        self.skipped_count = 0
+        self.unrecordable = set()
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        if not new:
+            with open(self.path, 'rb') as file:
+                header = file.read(file_header.size)
+            if len(header) < file_header.size or file_header.unpack(header) != (file_magic, file_version):
+                raise ValueError(f"{self.path} is not a version {file_version} message log, cannot append to it")
+        self.file = open(self.path, 'ab')
+        if new:
+            self.file.write(file_header.pack(file_magic, file_version))
+        self.last_flush = time.perf_counter()
+
+    def get_handle(self, kind: int, destination: str) -> int:
+        handle = self.handles.get((kind, destination))
+        if handle is None:
+            handle = len(self.handles)
+            self.handles[(kind, destination)] = handle
+            name = destination.encode('utf-8')
+            self.file.write(record_header.pack(time.time(), handle, value_declaration, len(name) + 1))
+            self.file.write(bytes((kind,)) + name)
+        return handle
+
+    def record(self, kind: int, destination: str, payload: Any) -> None:
+        try:
+            value_type, data = pack_value(payload)
+        except (TypeError, ValueError) as error:
+            with self.lock:
+                self.skipped_count += 1
+                if (kind, destination) in self.unrecordable:
+                    return
+                self.unrecordable.add((kind, destination))
+            logging.warning(f"Messages to {destination} are not recorded: {error}")
+            return
+        timestamp = time.time()
+        with self.lock:
+            if self.file is None:
+                return
+            handle = self.get_handle(kind, destination)
+            self.file.write(record_header.pack(timestamp, handle, value_type, len(data)))
+            self.file.write(data)
+            self.record_count += 1
+            now = time.perf_counter()
+            if now - self.last_flush > self.flush_interval:
+                self.file.flush()
+                self.last_flush = now
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        logging.debug(f"Recorded {self.record_count} messages to {self.path}, skipped {self.skipped_count}")
+
+
+class MessageReplayer:
+    def __init__(self, path: Path | str):
+        """ Memory maps a message log and re-injects its messages into the router
+
+        :param path: Log file written by MessageRecorder
+        :type path: Path | str
+        ...
+        :raises ValueError: If the file is not a message log
+        """
+        self.path = Path(path)
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = file_header.unpack_from(self.map, 0)
+        if magic != file_magic or version != file_version:
+            self.close()
+            raise ValueError(f"{self.path} is not a version {file_version} message log")
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def messages(self) -> Iterator[Tuple[float, int, str, Any]]:
+        """ Iterate over the recorded messages
+
+        :return: Iterator of (timestamp, destination kind, destination, payload)
+        :rtype: Iterator[Tuple[float, int, str, Any]]
+        """
+        destinations = {}
+        view = memoryview(self.map)
+        offset = file_header.size
+        end = len(self.map)
+        try:
+            while offset + record_header.size <= end:
+                timestamp, handle, value_type, length = record_header.unpack_from(self.map, offset)
+                offset += record_header.size
+                if offset + length > end:
+                    logging.warning(f"Truncated record at the end of {self.path}")
+                    return
+                data = view[offset:offset + length]
+                offset += length
+                if value_type == value_declaration:
+                    destinations[handle] = (data[0], bytes(data[1:]).decode('utf-8'))
+                    continue
+                kind, destination = destinations[handle]
+                yield timestamp, kind, destination, unpack_value(value_type, data)
+        finally:
+            view.release()
+
+    def replay(self, speed: float = 1.0) -> int:
+        """ Re-inject every message, blocking until done or stopped
+
+        :param speed: Playback speed, 1.0 is real time, values <= 0 replay as fast as possible
+        :type speed: float
+        ...
+        :return: Number of replayed messages
+        :rtype: int
+        """
+        from nexusflow import router
+
+        replayed = 0
+        start_time = time.perf_counter()
+        first_timestamp = None
+        for timestamp, kind, destination, payload in self.messages():
+            if self.stop_event.is_set():
+                break
+            if speed > 0:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                delay = (timestamp - first_timestamp) / speed - (time.perf_counter() - start_time)
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+            if kind == destination_route:
+                router.route(destination, payload)
+            elif kind == destination_topic:
+                router.publish(destination, payload)
+            else:
+                router.publish_samples(payload)
+            replayed += 1
+        return replayed
+
+    def start(self, speed: float = 1.0) -> None:
+        """ Replay on a background thread
+        """
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.replay, args=(speed,), name='nexusflow-replay', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self) -> None:
+        self.stop()
+        self.map.close()
+        self.file.close()
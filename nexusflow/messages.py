@@ -0,0 +1,152 @@
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+sample_dtype = np.dtype([
+    ('handle', '<u4'),
+    ('value', '<f8'),
+    ('timestamp', '<f8')
+])
+
+
+class ChannelSample:
+    """ Single channel value, for low rate senders that do not batch samples
+    """
+    __slots__ = ('handle', 'value', 'timestamp')
+
+    def __init__(self, handle: int, value: float, timestamp: Optional[float] = None):
+        self.handle = handle
+        self.value = value
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __repr__(self):
+        return f'ChannelSample(handle={self.handle}, value={self.value}, timestamp={self.timestamp})'
+
+
+class SampleBlock:
+    """ Block of channel samples backed by one NumPy structured array
+
+    ``data`` may be larger than the block, only the first ``size`` rows are valid. ``handles``, ``values``
+    and ``timestamps`` are views, no samples are copied.
+    """
+    __slots__ = ('data', 'size')
+
+    def __init__(self, data: np.ndarray, size: Optional[int] = None):
+        if data.dtype != sample_dtype:
+            raise TypeError(f"Sample block data has dtype {data.dtype}, expected {sample_dtype}")
+        self.data = data
+        self.size = len(data) if size is None else size
+
+    @classmethod
+    def allocate(cls, capacity: int) -> 'SampleBlock':
+        """ Create an empty block that can be filled up to capacity without reallocating
+
+        :param capacity: Maximum number of samples
+        :type capacity: int
+        ...
+        :return: Empty block
+        :rtype: SampleBlock
+        """
+        return cls(np.empty(capacity, dtype=sample_dtype), 0)
+
+    @classmethod
+    def from_arrays(cls, handles: np.ndarray, values: np.ndarray, timestamps: np.ndarray | float) -> 'SampleBlock':
+        """ Create a block from column arrays, timestamps may be a single value shared by every sample
+
+        :return: Block holding a copy of the columns
+        :rtype: SampleBlock
+        """
+        data = np.empty(len(handles), dtype=sample_dtype)
+        data['handle'] = handles
+        data['value'] = values
+        data['timestamp'] = timestamps
+        return cls(data)
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[ChannelSample]) -> 'SampleBlock':
+        samples = list(samples)
+        data = np.empty(len(samples), dtype=sample_dtype)
+        for index, sample in enumerate(samples):
+            data[index] = (sample.handle, sample.value, sample.timestamp)
+        return cls(data)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self):
+        return f'SampleBlock(size={self.size})'
+
+    @property
+    def samples(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    @property
+    def handles(self) -> np.ndarray:
+        return self.data['handle'][:self.size]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.data['value'][:self.size]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.data['timestamp'][:self.size]
+
+    def append(self, handle: int, value: float, timestamp: float) -> None:
+        """ Write one sample into the preallocated storage
+
+        :raises IndexError: If the block is full
+        """
+        if self.size >= len(self.data):
+            raise IndexError(f"Sample block is full ({len(self.data)} samples)")
+        self.data[self.size] = (handle, value, timestamp)
+        self.size += 1
+
+    def clear(self) -> None:
+        self.size = 0
+
+    def sample(self, index: int) -> ChannelSample:
+        handle, value, timestamp = self.samples[index]
+        return ChannelSample(int(handle), float(value), float(timestamp))
+
+    def select(self, mask: np.ndarray) -> 'SampleBlock':
+        """ Return the samples where mask is True as a new block
+
+        :param mask: Boolean mask, one entry per sample
+        :type mask: np.ndarray
+        ...
+        :return: Selected samples
+        :rtype: SampleBlock
+        """
+        return SampleBlock(self.samples[mask])
+
+
+class HandleFilter:
+    """ Precompiled set of channel handles, selects the matching samples of a block with one lookup
+    """
+    __slots__ = ('lookup',)
+
+    def __init__(self, handles: Iterable[int]):
+        handles = np.fromiter(handles, dtype=np.int64)
+        self.lookup = np.zeros(int(handles.max()) + 1 if len(handles) else 0, dtype=bool)
+        self.lookup[handles] = True
+
+    def mask(self, handles: np.ndarray) -> np.ndarray:
+        in_range = handles < len(self.lookup)
+        mask = np.zeros(len(handles), dtype=bool)
+        mask[in_range] = self.lookup[handles[in_range]]
+        return mask
+
+    def apply(self, block: SampleBlock) -> Optional[SampleBlock]:
+        """ Samples of the block belonging to the filtered handles
+
+        :return: The selected samples or None if no sample matches
+        :rtype: Optional[SampleBlock]
+        """
+        mask = self.mask(block.handles)
+        if not mask.any():
+            return None
+        if mask.all():
+            return block
+        return block.select(mask)
@@ -1,12 +1,483 @@
-from PySide6.QtCore import QObject, Qt, Signal, Slot
-from nexusflow.utils import string_uuid
+import logging
+import queue
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QTimer, Qt, Signal, Slot
+from nexusflow.topics import TopicTree, Subscription
+from nexusflow.routestats import RouteStatistics
+from nexusflow.messages import SampleBlock, HandleFilter
+from nexusflow.messagelog import MessageRecorder, destination_route, destination_topic, destination_samples
+
+logging.basicConfig(level=logging.DEBUG)
+
+route_kinds = ('event', 'state')
+route_affinities = ('gui', 'io', 'pool')
+default_frame_interval = 16  # ms, roughly one 60 Hz frame
+pool_workers = 4
 
 routes = {}
+routes_kind = {}
+routes_affinity = {}
+message_bus = None
+io_workers: Dict[str, 'IOWorker'] = {}
+io_workers_lock = threading.Lock()
+thread_pool = None
+gui_thread_id = threading.main_thread().ident
+topic_tree = TopicTree()
+sample_subscriptions = []
+statistics = None
+recorder = None
 
 
-def register_route(destination_id: str, destination_callback: callable):
+def register_route(destination_id: str, destination_callback: callable, kind: str = 'event',
+                   affinity: str = 'gui'):
+    """ Register a callback for a destination
+
+    :param destination_id: The destination id used by senders
+    :type destination_id: str
+    :param destination_callback: Callable receiving the payload
+    :type destination_callback: callable
+    :param kind: 'event' delivers every payload, 'state' only delivers the latest payload per frame
+    :type kind: str
+    :param affinity: Thread the callback runs on, 'gui', 'io' (dedicated I/O thread), 'io:<name>' (dedicated
+        I/O thread of its own, e.g. one per board) or 'pool' (thread pool)
+    :type affinity: str
+    ...
+    :raises ValueError: If the kind or affinity is not supported
+    """
+    if kind not in route_kinds:
+        raise ValueError(f"Unknown route kind {kind}, expected one of {route_kinds}")
+    check_affinity(affinity)
     routes[destination_id] = destination_callback
+    routes_kind[destination_id] = kind
+    routes_affinity[destination_id] = affinity
+
+
+def has_route(destination_id: str) -> bool:
+    return destination_id in routes
+
+
+def check_affinity(affinity: str) -> None:
+    """ :raises ValueError: If the affinity is not supported
+    """
+    if affinity not in route_affinities and not (affinity.startswith('io:') and len(affinity) > 3):
+        raise ValueError(f"Unknown route affinity {affinity}, expected one of {route_affinities} or 'io:<name>'")
+
+
+def route(destination_id: str, payload: Any):
+    """ Send a payload to a destination
+
+    Routes with 'io' or 'pool' affinity are handed to their worker and never run on the caller's thread.
+    GUI routes are called right away when sent from the GUI thread without a message bus, otherwise
+    they are queued and delivered on the GUI thread.
+
+    :param destination_id: The destination id
+    :type destination_id: str
+    :param payload: The payload passed to the destination callback
+    :type payload: Any
+    """
+    if recorder is not None:
+        recorder.record(destination_route, destination_id, payload)
+    dispatch(destination_id, destination_id, routes[destination_id], payload, routes_kind[destination_id],
+             routes_affinity[destination_id])
+
+
+def subscribe(pattern: str, callback: callable, converters: Tuple[callable, ...] = (), kind: str = 'event',
+              affinity: str = 'gui') -> Subscription:
+    """ Subscribe to every topic matching a pattern
+
+    The callback is called with the levels matched by wildcards followed by the payload, e.g. a subscription
+    to 'fpga/ADD3/+' with converters (int,) receives ``callback(3, payload)`` for topic 'fpga/ADD3/3'.
+
+    :param pattern: Topic pattern, levels separated by '/', '+' matches one level, '#' all remaining levels
+    :type pattern: str
+    :param callback: Callable receiving the address followed by the payload
+    :type callback: callable
+    :param converters: Converters applied to the matched levels, once per topic
+    :type converters: Tuple[callable, ...]
+    :param kind: 'event' or 'state', see register_route
+    :type kind: str
+    :param affinity: 'gui', 'io' or 'pool', see register_route
+    :type affinity: str
+    ...
+    :raises ValueError: If the kind, affinity or pattern is not supported
+    ...
+    :return: The subscription, used to unsubscribe
+    :rtype: Subscription
+    """
+    if kind not in route_kinds:
+        raise ValueError(f"Unknown route kind {kind}, expected one of {route_kinds}")
+    check_affinity(affinity)
+    return topic_tree.subscribe(
+        Subscription(pattern=pattern, callback=callback, converters=converters, kind=kind, affinity=affinity)
+    )
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    topic_tree.unsubscribe(subscription)
+
+
+def publish(topic: str, payload: Any) -> int:
+    """ Send a payload to every subscription matching a topic
+
+    :param topic: The topic, e.g. 'fpga/ADD3/3'
+    :type topic: str
+    :param payload: The payload
+    :type payload: Any
+    ...
+    :return: Number of matching subscriptions
+    :rtype: int
+    """
+    if recorder is not None:
+        recorder.record(destination_topic, topic, payload)
+    resolved = topic_tree.resolve(topic)
+    for match in resolved:
+        subscription = match.subscription
+        dispatch((topic, id(subscription)), subscription.pattern, match.deliver, payload, subscription.kind,
+                 subscription.affinity)
+    return len(resolved)
+
+
+def subscribe_samples(callback: callable, handles: Optional[Iterable[int]] = None, name: str = 'samples',
+                      kind: str = 'event', affinity: str = 'gui') -> 'SampleSubscription':
+    """ Subscribe to sample blocks
+
+    The callback receives a SampleBlock holding only the samples of the requested handles, blocks without
+    any of them are not delivered.
+
+    :param callback: Callable receiving a SampleBlock
+    :type callback: callable
+    :param handles: Channel handles of interest, None for every channel
+    :type handles: Optional[Iterable[int]]
+    :param name: Name the subscription is shown under in the route statistics
+    :type name: str
+    :param kind: 'event' or 'state', a 'state' subscriber only gets the latest block per frame
+    :type kind: str
+    :param affinity: 'gui', 'io' or 'pool', see register_route
+    :type affinity: str
+    ...
+    :raises ValueError: If the kind or affinity is not supported
+    ...
+    :return: The subscription, used to unsubscribe
+    :rtype: SampleSubscription
+    """
+    if kind not in route_kinds:
+        raise ValueError(f"Unknown route kind {kind}, expected one of {route_kinds}")
+    check_affinity(affinity)
+    subscription = SampleSubscription(
+        callback=callback,
+        handle_filter=HandleFilter(handles) if handles is not None else None,
+        name=name,
+        kind=kind,
+        affinity=affinity
+    )
+    sample_subscriptions.append(subscription)
+    return subscription
+
+
+def unsubscribe_samples(subscription: 'SampleSubscription') -> None:
+    sample_subscriptions.remove(subscription)
+
+
+def publish_samples(block: SampleBlock) -> None:
+    """ Deliver a block of samples to every sample subscriber
+
+    :param block: The samples
+    :type block: SampleBlock
+    """
+    if recorder is not None:
+        recorder.record(destination_samples, 'samples', block)
+    for subscription in tuple(sample_subscriptions):
+        if subscription.handle_filter is None:
+            selected = block
+        else:
+            selected = subscription.handle_filter.apply(block)
+            if selected is None:
+                continue
+        dispatch(subscription, subscription.name, subscription.callback, selected, subscription.kind,
+                 subscription.affinity)
+
+
+def dispatch(key: Hashable, name: str, callback: callable, payload: Any, kind: str, affinity: str):
+    if statistics is not None:
+        callback = statistics.instrument(name, callback)
+    if affinity == 'gui':
+        if message_bus is not None:
+            if message_bus.post(key, callback, payload, kind) and statistics is not None:
+                statistics.record_coalesced(name)
+        elif threading.get_ident() == gui_thread_id:
+            callback(payload)
+        else:
+            gui_dispatcher.dispatch.emit(callback, payload)
+    elif affinity == 'pool':
+        get_thread_pool().submit(call_safely, callback, payload)
+    else:
+        get_io_worker(affinity).submit(callback, payload)
+
+
+def call_safely(callback: callable, payload: Any):
+    try:
+        callback(payload)
+    except Exception:
+        logging.exception(f"Route callback {callback} failed")
+
+
+class SampleSubscription:
+    __slots__ = ('callback', 'handle_filter', 'name', 'kind', 'affinity')
+
+    def __init__(self, *, callback: callable, handle_filter: Optional[HandleFilter], name: str, kind: str,
+                 affinity: str):
+        self.callback = callback
+        self.handle_filter = handle_filter
+        self.name = name
+        self.kind = kind
+        self.affinity = affinity
+
+
+class GuiDispatcher(QObject):
+    """ Hands payloads sent from worker threads over to the GUI thread through a queued signal
+    """
+    dispatch = Signal(object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.dispatch.connect(self.deliver, Qt.QueuedConnection)
+
+    @Slot(object, object)
+    def deliver(self, callback: callable, payload: Any):
+        callback(payload)
+
+
+class IOWorker(threading.Thread):
+    """ Dedicated thread that runs slow hardware calls one after another
+    """
+
+    def __init__(self, name: str = 'io'):
+        super().__init__(name=f'nexusflow-{name}', daemon=True)
+        self.jobs = queue.SimpleQueue()
+
+    def submit(self, callback: callable, payload: Any):
+        self.jobs.put((callback, payload))
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            call_safely(*job)
+
+
+def get_io_worker(affinity: str = 'io') -> IOWorker:
+    """ The I/O thread of an 'io' or 'io:<name>' affinity, started on first use
+    """
+    worker = io_workers.get(affinity)
+    if worker is None:
+        with io_workers_lock:
+            worker = io_workers.get(affinity)
+            if worker is None:
+                worker = IOWorker(affinity)
+                worker.start()
+                io_workers[affinity] = worker
+    return worker
+
+
+def stop_io_worker(affinity: str) -> None:
+    """ Stop an I/O thread after its queued jobs are done, e.g. when its board is removed
+    """
+    with io_workers_lock:
+        worker = io_workers.pop(affinity, None)
+    if worker is not None:
+        worker.stop()
+        if worker is not threading.current_thread():
+            worker.join()
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global thread_pool
+    if thread_pool is None:
+        thread_pool = ThreadPoolExecutor(max_workers=pool_workers, thread_name_prefix='nexusflow-pool')
+    return thread_pool
+
+
+def shutdown_workers() -> None:
+    """ Stop the I/O threads and the thread pool after their queued jobs are done
+    """
+    global thread_pool
+    for affinity in list(io_workers):
+        stop_io_worker(affinity)
+    if thread_pool is not None:
+        thread_pool.shutdown(wait=True)
+        thread_pool = None
+
+
+gui_dispatcher = GuiDispatcher()
+
+
+class MessageBus(QObject):
+    """ Queues payloads for GUI routes and delivers them in one batch per GUI frame
+
+    Posting is thread safe, delivery always happens on the GUI thread. Payloads for 'state' destinations
+    are coalesced so only the latest value is delivered, payloads for 'event' destinations are all
+    delivered in the order they were sent.
+    """
+    flushed = Signal(int)
+
+    def __init__(self, frame_interval: int = default_frame_interval):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.pending_states: Dict[Hashable, Tuple[callable, Any]] = {}
+        self.pending_events: Dict[Hashable, Tuple[callable, List[Any]]] = {}
+        self.posted_count = 0
+        self.delivered_count = 0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(frame_interval)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.flush)
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.flush()
+
+    def post(self, key: Hashable, callback: callable, payload: Any, kind: str) -> bool:
+        """ Queue a payload until the next flush
+
+        :return: True if a pending payload for the same state key was replaced
+        :rtype: bool
+        """
+        with self.lock:
+            self.posted_count += 1
+            if kind == 'state':
+                replaced = key in self.pending_states
+                self.pending_states[key] = (callback, payload)
+                return replaced
+            else:
+                pending = self.pending_events.get(key)
+                if pending is None:
+                    self.pending_events[key] = (callback, [payload])
+                else:
+                    pending[1].append(payload)
+                return False
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return len(self.pending_states) + sum(len(events) for _, events in self.pending_events.values())
+
+    @Slot()
+    def flush(self) -> int:
+        """ Deliver every queued payload
+
+        :return: Number of callbacks called
+        :rtype: int
+        """
+        with self.lock:
+            if not self.pending_states and not self.pending_events:
+                return 0
+            states, self.pending_states = self.pending_states, {}
+            events, self.pending_events = self.pending_events, {}
+
+        # A failing subscriber must not cost the other topics their updates of this frame
+        delivered = 0
+        for callback, payloads in events.values():
+            for payload in payloads:
+                call_safely(callback, payload)
+            delivered += len(payloads)
+        for callback, payload in states.values():
+            call_safely(callback, payload)
+        delivered += len(states)
+
+        self.delivered_count += delivered
+        self.flushed.emit(delivered)
+        return delivered
+
+
+def enable_message_bus(frame_interval: int = default_frame_interval) -> MessageBus:
+    """ Switch routing to frame batched delivery, requires a running QApplication
+
+    :param frame_interval: Frame tick in milliseconds
+    :type frame_interval: int
+    ...
+    :return: The active message bus
+    :rtype: MessageBus
+    """
+    global message_bus
+    if message_bus is None:
+        message_bus = MessageBus(frame_interval)
+        message_bus.start()
+        logging.debug(f"Message bus enabled, frame interval {frame_interval} ms")
+    return message_bus
+
+
+def disable_message_bus() -> None:
+    """ Deliver everything still queued and switch back to immediate routing
+    """
+    global message_bus
+    if message_bus is not None:
+        bus, message_bus = message_bus, None
+        bus.stop()
+        logging.debug("Message bus disabled")
+
+
+def enable_statistics() -> RouteStatistics:
+    """ Start recording per destination counts, latency, queue depth and callback execution time
+
+    :return: The active statistics
+    :rtype: RouteStatistics
+    """
+    global statistics
+    if statistics is None:
+        statistics = RouteStatistics()
+    return statistics
+
+
+def disable_statistics() -> None:
+    global statistics
+    statistics = None
+
+
+def queue_depths() -> Dict[str, int]:
+    """ Current number of payloads waiting in the message bus and the workers
+
+    :return: Queue name -> number of waiting payloads
+    :rtype: Dict[str, int]
+    """
+    depths = {
+        'gui': message_bus.pending_count() if message_bus is not None else 0,
+        'io': 0,
+        'pool': thread_pool._work_queue.qsize() if thread_pool is not None else 0
+    }
+    for affinity, worker in list(io_workers.items()):
+        depths[affinity] = worker.jobs.qsize()
+    return depths
+
+
+def start_recording(path: Path | str) -> MessageRecorder:
+    """ Append every routed, published and sample message to a binary log
+
+    :param path: The log file
+    :type path: Path | str
+    ...
+    :return: The active recorder
+    :rtype: MessageRecorder
+    """
+    global recorder
+    if recorder is None:
+        recorder = MessageRecorder(path)
+        logging.debug(f"Recording messages to {path}")
+    return recorder
 
 
-def route(destination_id: str, payload: dict):
-    routes[destination_id](payload)
+def stop_recording() -> None:
+    global recorder
+    if recorder is not None:
+        active, recorder = recorder, None
+        active.close()
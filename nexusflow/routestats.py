@@ -0,0 +1,152 @@
+import threading
+import time
+from typing import Any, Dict, List
+
+# Histogram bucket upper bounds in seconds, 1 us doubling up to ~17 s
+histogram_bounds = tuple(1e-6 * 2 ** index for index in range(25))
+
+
+class Histogram:
+    """ Fixed log2 bucket histogram, cheap enough to update on every message
+    """
+    __slots__ = ('counts', 'total', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * (len(histogram_bounds) + 1)
+        self.total = 0
+        self.maximum = 0.0
+
+    def add(self, value: float) -> None:
+        index = 0
+        bound = 1e-6
+        while value > bound and index < len(histogram_bounds):
+            index += 1
+            bound *= 2
+        self.counts[index] += 1
+        self.total += 1
+        if value > self.maximum:
+            self.maximum = value
+
+    def percentile(self, percent: float) -> float:
+        """ Upper bound of the bucket holding the given percentile
+
+        :param percent: Percentile between 0 and 100
+        :type percent: float
+        ...
+        :return: Value in seconds, 0.0 if the histogram is empty
+        :rtype: float
+        """
+        if self.total == 0:
+            return 0.0
+        threshold = self.total * percent / 100
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return histogram_bounds[index] if index < len(histogram_bounds) else self.maximum
+        return self.maximum
+
+
+class DestinationStatistics:
+    __slots__ = ('name', 'posted', 'delivered', 'coalesced', 'failed', 'max_queue_depth', 'latency',
+                 'execution', 'first_delivery', 'last_delivery')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.posted = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.latency = Histogram()
+        self.execution = Histogram()
+        self.first_delivery = 0.0
+        self.last_delivery = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.posted - self.delivered - self.coalesced - self.failed
+
+    def snapshot(self) -> Dict[str, Any]:
+        duration = self.last_delivery - self.first_delivery
+        return {
+            'name': self.name,
+            'messages': self.delivered,
+            'coalesced': self.coalesced,
+            'rate': (self.delivered - 1) / duration if duration > 0 and self.delivered > 1 else 0.0,
+            'latency_p50': self.latency.percentile(50),
+            'latency_p99': self.latency.percentile(99),
+            'execution_p50': self.execution.percentile(50),
+            'execution_p99': self.execution.percentile(99),
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth
+        }
+
+
+class RouteStatistics:
+    """ Per destination message counts, delivery latency, queue depth and callback execution time
+
+    The router only touches this object while statistics are enabled, otherwise routing pays a single
+    ``is None`` check.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.destinations: Dict[str, DestinationStatistics] = {}
+
+    def get_destination(self, name: str) -> DestinationStatistics:
+        destination = self.destinations.get(name)
+        if destination is None:
+            with self.lock:
+                destination = self.destinations.setdefault(name, DestinationStatistics(name))
+        return destination
+
+    def instrument(self, name: str, callback: callable) -> callable:
+        """ Wrap a callback so its delivery gets measured
+
+        :param name: Destination name the measurement is recorded under
+        :type name: str
+        :param callback: The callback called with the payload
+        :type callback: callable
+        ...
+        :return: Callable taking the payload
+        :rtype: callable
+        """
+        destination = self.get_destination(name)
+        posted_at = time.perf_counter()
+        with self.lock:
+            destination.posted += 1
+            if destination.queue_depth > destination.max_queue_depth:
+                destination.max_queue_depth = destination.queue_depth
+
+        def measured_callback(payload: Any):
+            started_at = time.perf_counter()
+            try:
+                callback(payload)
+            except Exception:
+                with self.lock:
+                    destination.failed += 1
+                raise
+            finished_at = time.perf_counter()
+            with self.lock:
+                destination.delivered += 1
+                destination.latency.add(started_at - posted_at)
+                destination.execution.add(finished_at - started_at)
+                if destination.first_delivery == 0.0:
+                    destination.first_delivery = started_at
+                destination.last_delivery = finished_at
+
+        return measured_callback
+
+    def record_coalesced(self, name: str) -> None:
+        destination = self.get_destination(name)
+        with self.lock:
+            destination.coalesced += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [destination.snapshot() for destination in self.destinations.values()]
+
+    def reset(self) -> None:
+        with self.lock:
+            self.destinations.clear()
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from nexusflow import router
+from nexusflow.messages import SampleBlock
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+
+logging.basicConfig(level=logging.DEBUG)
+
+# Default acquisition rate in Hz per input pin function
+default_rates = {
+    'ADC': 100.0,
+    'DIG_IN': 10.0
+}
+
+
+@dataclass(kw_only=True)
+class RateClass:
+    rate: float
+    handles: np.ndarray
+    period: float = 0.0
+    next_deadline: float = 0.0
+    ticks: int = 0
+    missed: int = 0
+    max_lateness: float = 0.0
+    read_time: float = 0.0
+    started_at: float = 0.0
+
+    def __post_init__(self):
+        self.period = 1.0 / self.rate
+
+
+class AcquisitionScheduler:
+    def __init__(self, read_channels: callable, publish: callable = router.publish_samples):
+        """ Polls input channels in rate classes on a background thread
+
+        Every tick a rate class is read with one bulk ``read_channels(handles)`` call and published as one
+        SampleBlock. Deadlines follow an absolute schedule, so sleeping late does not accumulate drift;
+        periods that are skipped entirely are counted as missed.
+
+        :param read_channels: Callable returning one value per handle in a NumPy array
+        :type read_channels: callable
+        :param publish: Callable receiving every SampleBlock
+        :type publish: callable
+        """
+        self.read_channels = read_channels
+        self.publish = publish
+        self.rate_classes: Dict[float, RateClass] = {}
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def add_channels(self, handles: Sequence[int], rate: float) -> None:
+        """ Acquire channels at a rate, channels with the same rate are read together
+
+        :param handles: Channel handles
+        :type handles: Sequence[int]
+        :param rate: Rate in Hz
+        :type rate: float
+        ...
+        :raises ValueError: If the rate is not positive
+        """
+        if rate <= 0:
+            raise ValueError(f"Acquisition rate must be positive, got {rate}")
+        handles = np.asarray(handles, dtype=np.uint32)
+        with self.lock:
+            rate_class = self.rate_classes.get(rate)
+            if rate_class is None:
+                rate_class = RateClass(rate=rate, handles=np.unique(handles))
+                rate_class.next_deadline = time.perf_counter()
+                rate_class.started_at = rate_class.next_deadline
+                self.rate_classes[rate] = rate_class
+            else:
+                rate_class.handles = np.union1d(rate_class.handles, handles).astype(np.uint32)
+
+    def add_pin_definitions(self, pin_definitions: Sequence[PinDefinition], handles: Optional[Sequence[int]] = None,
+                            rates: Optional[Dict[str, float]] = None) -> None:
+        """ Acquire every input pin at the rate of its function
+
+        :param pin_definitions: Pin definitions, pins with functions missing from rates are skipped
+        :type pin_definitions: Sequence[PinDefinition]
+        :param handles: Channel handle of every pin definition, defaults to its index
+        :type handles: Optional[Sequence[int]]
+        :param rates: Rate in Hz per pin function, defaults to default_rates
+        :type rates: Optional[Dict[str, float]]
+        """
+        rates = default_rates if rates is None else rates
+        handles = range(len(pin_definitions)) if handles is None else handles
+        grouped: Dict[float, List[int]] = {}
+        for handle, pin_definition in zip(handles, pin_definitions):
+            if pin_definition.function in rates:
+                grouped.setdefault(rates[pin_definition.function], []).append(handle)
+        for rate, rate_handles in grouped.items():
+            self.add_channels(rate_handles, rate)
+
+    def start(self) -> None:
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        now = time.perf_counter()
+        with self.lock:
+            for rate_class in self.rate_classes.values():
+                rate_class.next_deadline = now
+                rate_class.started_at = now
+                rate_class.ticks = 0
+                rate_class.missed = 0
+                rate_class.max_lateness = 0.0
+        self.thread = threading.Thread(target=self.run, name='nexusflow-acquisition', daemon=True)
+        self.thread.start()
+        logging.debug(f"Acquisition started with rates {sorted(self.rate_classes)} Hz")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            with self.lock:
+                rate_classes = list(self.rate_classes.values())
+            if not rate_classes:
+                if self.stop_event.wait(0.1):
+                    return
+                continue
+            next_deadline = min(rate_class.next_deadline for rate_class in rate_classes)
+            delay = next_deadline - time.perf_counter()
+            if delay > 0 and self.stop_event.wait(delay):
+                return
+            now = time.perf_counter()
+            for rate_class in rate_classes:
+                if rate_class.next_deadline <= now:
+                    self.tick(rate_class, now)
+
+    def tick(self, rate_class: RateClass, now: float) -> None:
+        lateness = now - rate_class.next_deadline
+        rate_class.max_lateness = max(rate_class.max_lateness, lateness)
+        skipped = int(lateness // rate_class.period)
+        if skipped:
+            rate_class.missed += skipped
+        rate_class.next_deadline += (skipped + 1) * rate_class.period
+
+        timestamp = time.time()
+        read_start = time.perf_counter()
+        try:
+            values = self.read_channels(rate_class.handles)
+        except Exception:
+            logging.exception(f"Reading {len(rate_class.handles)} channels at {rate_class.rate} Hz failed")
+            return
+        rate_class.read_time = time.perf_counter() - read_start
+        rate_class.ticks += 1
+        self.publish(SampleBlock.from_arrays(rate_class.handles, values, timestamp))
+
+    def statistics(self) -> List[Dict[str, Any]]:
+        """ Achieved rate and missed deadlines of every rate class
+
+        :return: One dict per rate class
+        :rtype: List[Dict[str, Any]]
+        """
+        now = time.perf_counter()
+        with self.lock:
+            return [
+                {
+                    'rate': rate_class.rate,
+                    'channels': len(rate_class.handles),
+                    'achieved_rate': rate_class.ticks / (now - rate_class.started_at)
+                    if now > rate_class.started_at else 0.0,
+                    'ticks': rate_class.ticks,
+                    'missed': rate_class.missed,
+                    'max_lateness': rate_class.max_lateness,
+                    'read_time': rate_class.read_time
+                }
+                for rate_class in self.rate_classes.values()
+            ]
@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from nexusflow import router
+from nexusflow.messages import SampleBlock
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+
+logging.basicConfig(level=logging.DEBUG)
+
+level_ok = 0
+level_warning = 1
+level_interlock = 2
+level_names = ('ok', 'warning', 'interlock')
+
+
+@dataclass(kw_only=True)
+class AlarmEvent:
+    handle: int
+    level: int
+    previous_level: int
+    value: float
+    timestamp: float  # sample timestamp
+    detected_at: float
+
+    @property
+    def latency(self) -> float:
+        return self.detected_at - self.timestamp
+
+    @property
+    def level_name(self) -> str:
+        return level_names[self.level]
+
+
+def publish_alarm_event(event: AlarmEvent) -> None:
+    router.publish(f'alarm/{event.level_name}/{event.handle}', event)
+
+
+class AlarmEngine:
+    def __init__(self, pin_definitions: Sequence[PinDefinition], handles: Optional[Sequence[int]] = None,
+                 on_event: callable = publish_alarm_event):
+        """ Checks sample blocks against the warning and interlock thresholds of every enabled alarm
+
+        Thresholds are stored sign adjusted (negated for 'below' alarms), so one comparison covers both
+        directions. A level is left only once the value is ``hysteresis`` back inside the threshold, and a
+        new level is only reported after it was seen in ``debounce`` + 1 consecutive samples.
+
+        :param pin_definitions: The pin definitions
+        :type pin_definitions: Sequence[PinDefinition]
+        :param handles: Channel handle of every pin definition, defaults to its index
+        :type handles: Optional[Sequence[int]]
+        :param on_event: Called with every AlarmEvent, by default published to 'alarm/<level>/<handle>'
+        :type on_event: callable
+        """
+        count = len(pin_definitions)
+        self.handles = np.arange(count) if handles is None else np.asarray(handles, dtype=np.int64)
+        self.slot_of_handle = np.full(int(self.handles.max()) + 1 if count else 0, -1, dtype=np.int64)
+        self.slot_of_handle[self.handles] = np.arange(count)
+        self.on_event = on_event
+        self.lock = threading.Lock()
+
+        self.set_thresholds(pin_definitions)
+        self.level = np.zeros(count, dtype=np.int8)
+        self.candidate = np.zeros(count, dtype=np.int8)
+        self.candidate_count = np.zeros(count, dtype=np.int64)
+
+        self.evaluated_samples = 0
+        self.max_block_latency = 0.0
+        self.max_event_latency = 0.0
+
+    def set_thresholds(self, pin_definitions: Sequence[PinDefinition]) -> None:
+        count = len(pin_definitions)
+        enabled = np.zeros(count, dtype=bool)
+        sign = np.ones(count)
+        warning = np.full(count, np.inf)
+        interlock = np.full(count, np.inf)
+        hysteresis = np.zeros(count)
+        debounce = np.zeros(count, dtype=np.int64)
+        for slot, pin_definition in enumerate(pin_definitions):
+            alarm = pin_definition.alarm
+            if alarm is None or not alarm.enable:
+                continue
+            enabled[slot] = True
+            sign[slot] = 1.0 if alarm.above else -1.0
+            # An unset threshold stays at inf, a blank cell must not trip a level
+            if alarm.warning_value is not None:
+                warning[slot] = sign[slot] * alarm.warning_value
+            if alarm.interlock_value is not None:
+                interlock[slot] = sign[slot] * alarm.interlock_value
+            hysteresis[slot] = alarm.hysteresis
+            debounce[slot] = alarm.debounce
+        self.enabled, self.sign, self.warning, self.interlock = enabled, sign, warning, interlock
+        self.hysteresis, self.debounce = hysteresis, debounce
+
+    def update_thresholds(self, pin_definitions: Sequence[PinDefinition]) -> List[AlarmEvent]:
+        """ Take over changed alarm settings while running, e.g. after a module was reloaded
+
+        The level and the debounce state of every channel are kept, the new limits apply from the next
+        sample. A channel whose alarm was disabled goes back to ok with an event, its value is NaN. The pin
+        definitions must be for the same handles.
+
+        :param pin_definitions: The pin definitions, in the order the engine was created with
+        :type pin_definitions: Sequence[PinDefinition]
+        ...
+        :raises ValueError: If the number of pin definitions changed
+        ...
+        :return: Level changes of the disabled channels
+        :rtype: List[AlarmEvent]
+        """
+        if len(pin_definitions) != len(self.handles):
+            raise ValueError(f"Alarm engine has {len(self.handles)} channels, got {len(pin_definitions)} pin "
+                             f"definitions")
+        with self.lock:
+            self.set_thresholds(pin_definitions)
+            cleared = np.flatnonzero(~self.enabled & (self.level != level_ok))
+            previous = self.level[cleared].copy()
+            self.level[~self.enabled] = level_ok
+            self.candidate[~self.enabled] = level_ok
+            self.candidate_count[~self.enabled] = 0
+        now = time.time()
+        events = [
+            AlarmEvent(handle=int(self.handles[slot]), level=level_ok, previous_level=int(previous_level),
+                       value=float('nan'), timestamp=now, detected_at=now)
+            for slot, previous_level in zip(cleared, previous)
+        ]
+        for event in events:
+            self.on_event(event)
+        return events
+
+    def evaluate(self, block: SampleBlock) -> List[AlarmEvent]:
+        """ Update the alarm state with a block of converted samples
+
+        Samples of the same channel are applied in block order, every other step is vectorized over the
+        channels.
+
+        :param block: Samples in engineering units
+        :type block: SampleBlock
+        ...
+        :return: Level changes caused by the block
+        :rtype: List[AlarmEvent]
+        """
+        handles = block.handles.astype(np.int64)
+        known = handles < len(self.slot_of_handle)
+        slots = np.full(len(handles), -1, dtype=np.int64)
+        slots[known] = self.slot_of_handle[handles[known]]
+        selected = slots >= 0
+        selected[selected] = self.enabled[slots[selected]]
+        if not selected.any():
+            return []
+
+        slots = slots[selected]
+        values = block.values[selected]
+        timestamps = block.timestamps[selected]
+
+        events = []
+        with self.lock:
+            if len(np.unique(slots)) == len(slots):
+                events.extend(self.step(slots, values, timestamps))
+            else:
+                # Repeated channels: apply the n-th sample of every channel in round n
+                order = np.argsort(slots, kind='stable')
+                sorted_slots = slots[order]
+                first = np.searchsorted(sorted_slots, sorted_slots, side='left')
+                rounds = np.empty(len(slots), dtype=np.int64)
+                rounds[order] = np.arange(len(slots)) - first
+                for round_index in range(int(rounds.max()) + 1):
+                    in_round = rounds == round_index
+                    events.extend(self.step(slots[in_round], values[in_round], timestamps[in_round]))
+
+            now = time.time()
+            self.evaluated_samples += len(slots)
+            self.max_block_latency = max(self.max_block_latency, now - float(timestamps.min()))
+            for event in events:
+                self.max_event_latency = max(self.max_event_latency, event.latency)
+
+        for event in events:
+            self.on_event(event)
+        return events
+
+    def step(self, slots: np.ndarray, values: np.ndarray, timestamps: np.ndarray) -> List[AlarmEvent]:
+        signed = values * self.sign[slots]
+        hysteresis = self.hysteresis[slots]
+        current = self.level[slots]
+        interlock = (signed >= self.interlock[slots]) | \
+            ((current >= level_interlock) & (signed >= self.interlock[slots] - hysteresis))
+        warning = (signed >= self.warning[slots]) | \
+            ((current >= level_warning) & (signed >= self.warning[slots] - hysteresis))
+        observed = np.where(interlock, level_interlock, np.where(warning, level_warning, level_ok)).astype(np.int8)
+
+        same_candidate = observed == self.candidate[slots]
+        counts = np.where(same_candidate, self.candidate_count[slots] + 1, 1)
+        self.candidate[slots] = observed
+        self.candidate_count[slots] = counts
+
+        changed = (observed != current) & (counts > self.debounce[slots])
+        if not changed.any():
+            return []
+        changed_slots = slots[changed]
+        previous = current[changed]
+        self.level[changed_slots] = observed[changed]
+
+        detected_at = time.time()
+        return [
+            AlarmEvent(
+                handle=int(self.handles[slot]),
+                level=int(level),
+                previous_level=int(previous_level),
+                value=float(value),
+                timestamp=float(timestamp),
+                detected_at=detected_at
+            )
+            for slot, level, previous_level, value, timestamp in
+            zip(changed_slots, observed[changed], previous, values[changed], timestamps[changed])
+        ]
+
+    def active(self, level: int = level_warning) -> np.ndarray:
+        """ Handles of the channels at or above a level
+
+        :return: Channel handles
+        :rtype: np.ndarray
+        """
+        return self.handles[self.level >= level]
+
+    def reset(self) -> None:
+        with self.lock:
+            self.level[:] = level_ok
+            self.candidate[:] = level_ok
+            self.candidate_count[:] = 0
+            self.max_block_latency = 0.0
+            self.max_event_latency = 0.0
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from nexusflow import router
+from nexusflow.systemdesigner.controllers.okfpga import OKFPGAController
+
+logging.basicConfig(level=logging.DEBUG)
+
+default_topic = 'fpga'
+default_timeout = 5.0  # s
+
+
+@dataclass(kw_only=True)
+class ControllerSnapshot:
+    timestamp: float  # time.time() when the operation was sent to the boards
+    duration: float  # s until the slowest board answered
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+    durations: Dict[str, float] = field(default_factory=dict)  # s per answering board
+
+    @property
+    def complete(self) -> bool:
+        return not self.errors
+
+
+class ControllerManager:
+    def __init__(self):
+        """ Keeps the board controllers of a rack keyed by serial number or UUID
+
+        Every board gets its own I/O thread (router affinity 'io:<key>'), so a slow board does not hold
+        up the others. Routed messages of a board run on its thread, and ``fan_out`` runs one operation on
+        every board at the same time and collects the answers in one ControllerSnapshot.
+
+        The active board gets the 'fpga' topics the GUI components publish to, the other boards are
+        reachable under 'board/<key>/...'. The first board added is active until another one is made active.
+        """
+        self.controllers: Dict[str, OKFPGAController] = {}
+        self.active: Optional[str] = None
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.controllers)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.controllers
+
+    def add(self, controller: OKFPGAController, active: bool = False) -> str:
+        """ Add a board and start its I/O thread
+
+        :param controller: The board controller
+        :type controller: OKFPGAController
+        :param active: Give the board the 'fpga' topics, the first board added gets them anyway
+        :type active: bool
+        ...
+        :raises KeyError: If a board with the same key was already added
+        ...
+        :return: The key of the board
+        :rtype: str
+        """
+        key = controller.key
+        with self.lock:
+            if key in self.controllers:
+                raise KeyError(f"Controller {key} was already added")
+            self.controllers[key] = controller
+            active = active or self.active is None
+        controller.set_routing(self.board_topic(key), self.affinity(key))
+        if active:
+            self.set_active(key)
+        logging.debug(f"Controller {controller.name} ({key}) added on topic {controller.topic}")
+        return key
+
+    def set_active(self, key: str) -> None:
+        """ Route the 'fpga' topics to a board, the previously active board moves to 'board/<key>'
+
+        :raises KeyError: If the key is unknown
+        """
+        with self.lock:
+            controller = self.controllers[key]
+            previous = self.controllers.get(self.active) if self.active != key else None
+            self.active = key
+        if previous is not None:
+            previous.set_routing(self.board_topic(previous.key), previous.affinity)
+        controller.set_routing(default_topic, controller.affinity)
+        logging.debug(f"Controller {controller.name} ({key}) is the active board")
+
+    @staticmethod
+    def board_topic(key: str) -> str:
+        return f'board/{key}'
+
+    def remove(self, key: str) -> OKFPGAController:
+        """ Remove a board, its queued jobs still run before its I/O thread stops
+
+        :raises KeyError: If the key is unknown
+        """
+        with self.lock:
+            controller = self.controllers.pop(key)
+            following = next(iter(self.controllers), None) if self.active == key else None
+            if self.active == key:
+                self.active = None
+        controller.unregister_route()
+        router.stop_io_worker(self.affinity(key))
+        if following is not None:
+            self.set_active(following)
+        return controller
+
+    def get(self, key: str) -> OKFPGAController:
+        return self.controllers[key]
+
+    def keys(self) -> List[str]:
+        return list(self.controllers.keys())
+
+    @staticmethod
+    def affinity(key: str) -> str:
+        return f'io:{key}'
+
+    def submit(self, key: str, function: callable, *args) -> Future:
+        """ Run a call on the I/O thread of a board
+
+        :param key: The board
+        :type key: str
+        :param function: Called with the controller followed by ``args``
+        :type function: callable
+        ...
+        :return: Future of the result
+        :rtype: Future
+        """
+        controller = self.controllers[key]
+        future = Future()
+        future.set_running_or_notify_cancel()
+        router.get_io_worker(self.affinity(key)).submit(self.run_job, (future, function, controller, args))
+        return future
+
+    @staticmethod
+    def run_job(job: Tuple[Future, callable, OKFPGAController, tuple]) -> None:
+        future, function, controller, args = job
+        started_at = time.perf_counter()
+        try:
+            result = function(controller, *args)
+        except BaseException as error:
+            future.set_exception(error)
+        else:
+            future.set_result((result, time.perf_counter() - started_at))
+
+    def fan_out(self, function: callable, arguments: Optional[Dict[str, tuple]] = None,
+                keys: Optional[Iterable[str]] = None, timeout: float = default_timeout) -> ControllerSnapshot:
+        """ Run an operation on several boards concurrently and collect the answers
+
+        A board that raises or does not answer within ``timeout`` ends up in ``errors``, the other boards
+        are not affected.
+
+        :param function: Called on the thread of every board with the controller followed by its arguments
+        :type function: callable
+        :param arguments: Arguments per board key, boards without an entry get none
+        :type arguments: Optional[Dict[str, tuple]]
+        :param keys: Boards to run on, defaults to the boards in ``arguments`` or all boards
+        :type keys: Optional[Iterable[str]]
+        :param timeout: Seconds to wait for all boards together
+        :type timeout: float
+        ...
+        :return: Results and errors per board
+        :rtype: ControllerSnapshot
+        """
+        arguments = arguments or {}
+        if keys is None:
+            keys = arguments.keys() if arguments else self.keys()
+        timestamp = time.time()
+        started_at = time.perf_counter()
+        futures = {key: self.submit(key, function, *arguments.get(key, ())) for key in keys}
+
+        snapshot = ControllerSnapshot(timestamp=timestamp, duration=0.0)
+        deadline = started_at + timeout
+        for key, future in futures.items():
+            try:
+                snapshot.results[key], snapshot.durations[key] = \
+                    future.result(timeout=max(deadline - time.perf_counter(), 0.0))
+            except Exception as error:
+                snapshot.errors[key] = error
+                logging.error(f"Controller {key} failed: {error!r}")
+        snapshot.duration = time.perf_counter() - started_at
+        return snapshot
+
+    def read_channels(self, handles: Dict[str, np.ndarray], timeout: float = default_timeout) -> ControllerSnapshot:
+        """ Bulk read on every board at once
+
+        :param handles: Channel handles to read per board key
+        :type handles: Dict[str, np.ndarray]
+        ...
+        :return: One value array per board
+        :rtype: ControllerSnapshot
+        """
+        return self.fan_out(
+            lambda controller, board_handles: controller.read_channels(board_handles),
+            {key: (board_handles,) for key, board_handles in handles.items()},
+            timeout=timeout
+        )
+
+    def connect_all(self, timeout: float = default_timeout) -> ControllerSnapshot:
+        return self.fan_out(lambda controller: controller.init(), timeout=timeout)
+
+    def close(self) -> None:
+        """ Disconnect every connected board and stop the board threads
+        """
+        connected = [key for key, controller in self.controllers.items() if controller.fpga is not None]
+        if connected:
+            self.fan_out(lambda controller: controller.disconnect(), keys=connected)
+        for key in self.keys():
+            self.remove(key)
@@ -1,76 +1,226 @@
+from functools import partial
+from typing import Optional, Tuple
+import numpy as np
 from PySide6.QtCore import QObject
 from pathlib import Path
-from nexusflow.systemdesigner.controllers import fpga
 from nexusflow.utils import string_uuid
 from nexusflow import router
+from nexusflow.systemdesigner.controllers.outputstage import OutputStage
+from nexusflow.systemdesigner.module.addressmap import add_devices, function_names, get_address_map, parse_pin_id
 
+try:
+    from nexusflow.systemdesigner.controllers import fpga
+except ImportError:
+    # The Opal Kelly driver package is only available on machines with the FrontPanel SDK
+    fpga = None
 
-def ic_mapper(ic_id: str):
-    if ic_id[:3] == 'ADD':
-        ic_id.replace('ADD', '')
-        ic_id_split = ic_id.split(' ')
-        if ic_id[0] == '1':
-            return 0, int(ic_id_split[1])
-        elif ic_id[0] == '3':
-            return 1, int(ic_id_split[1])
-        elif ic_id[0] == '4':
-            return 2, int(ic_id_split[1])
-        else:
-            raise ValueError(f"Invalid IC ID {ic_id}")
+default_bitfile = 'C:/Users/aspus/Desktop/nexusflow/nexusflow/systemdesigner/controllers/fpga/bitfiles/' \
+                  'xem7310_flc5.0_200_160MHz_11_05_2022.bit'
+# Route of the connection LED of the GUI controller item, not registered when running headless
+connection_route = 'asdoncdsajcbds'
+
+
+def ic_mapper(ic_id: str) -> Tuple[int, int]:
+    """ Device index and channel of an ADD pin id such as 'ADD3 3'
+
+    Routing uses the precomputed AddressMap, this is for callers that only have the id.
+
+    :raises ValueError: If the id does not belong to an ADD device
+    """
+    _, device_index, channel = parse_pin_id(ic_id)
+    if device_index < 0:
+        raise ValueError(f"Invalid IC ID {ic_id}")
+    return device_index, channel
 
 
 class OKFPGAController(QObject):
-    def __init__(self):
+    def __init__(self, bitfile: str = default_bitfile, serial: Optional[str] = None, topic: str = 'fpga',
+                 affinity: str = 'io'):
+        """ Opal Kelly board, driven through the '<topic>/...' topics
+
+        :param bitfile: Bitfile loaded on connect
+        :type bitfile: str
+        :param serial: Serial number of the board, identifies it when several boards are used
+        :type serial: Optional[str]
+        :param topic: Topic prefix of the board
+        :type topic: str
+        :param affinity: Router affinity of the hardware calls, see router.register_route
+        :type affinity: str
+        """
         super().__init__()
         self.uuid = string_uuid()
         self.name = "Opal Kelly FPGA"
-        self.bitfile = 'C:/Users/aspus/Desktop/nexusflow/nexusflow/systemdesigner/controllers/fpga/bitfiles/xem7310_flc5.0_200_160MHz_11_05_2022.bit'
+        self.bitfile = bitfile
+        self.serial = serial
+        self.topic = topic
+        self.affinity = affinity
         self.fpga = None
         self.modules = {}
+        self.subscriptions = []
+        self.output_stage = OutputStage(self.write_outputs, dispatch=self.dispatch_flush)
 
         self.register_route()
 
-    def init(self):
-        self.fpga = fpga.FPGAController(self.bitfile)
-        router.route(destination_id='asdoncdsajcbds', payload={'function': 'on'})
+    def create_fpga(self):
+        """ Open the board, overridden by controllers that do not talk to real hardware
+
+        :raises RuntimeError: If the Opal Kelly driver package is not installed
+        """
+        if fpga is None:
+            raise RuntimeError("Opal Kelly driver package nexusflow.systemdesigner.controllers.fpga is not installed")
+        return fpga.FPGAController(self.bitfile)
+
+    def open(self):
+        """ Connect the board, also the HostedController entry point of the controller process
+        """
+        self.fpga = self.create_fpga()
         self.add_module('')
 
+    def close(self):
+        self.output_stage.stop()
+        self.fpga = None
+
+    def init(self):
+        self.open()
+        self.notify_connection('on')
+
     def add_module(self, module_excel_path: str):
         self.modules['ADD_adapter_test'] = self.fpga.add_module("C:/Users/aspus/Desktop/ADD_adapter_test.xlsm")
 
     def disconnect(self):
-        del self.fpga
-        router.route(destination_id='asdoncdsajcbds', payload={'function': 'off'})
+        self.close()
+        self.notify_connection('off')
+
+    @staticmethod
+    def notify_connection(function: str):
+        if router.has_route(connection_route):
+            router.route(destination_id=connection_route, payload={'function': function})
+
+    def dispatch_flush(self, flush: callable) -> None:
+        # The driver is not thread safe, coalesced writes go through the board's I/O thread like every other call
+        if self.affinity == 'io' or self.affinity.startswith('io:'):
+            router.get_io_worker(self.affinity).submit(lambda payload: flush(), None)
+        else:
+            flush()
+
+    @property
+    def key(self) -> str:
+        """ Serial number if known, UUID otherwise
+        """
+        return self.serial if self.serial else self.uuid
 
     def register_route(self):
-        # router.register_route(self.uuid, self.handle_route)
-        router.register_route('aihfdoaousadpgfpef', self.handle_route)
-
-    def handle_route(self, payload: dict):
-        if payload['id'] == 'fpga':
-            if  payload['function'] == 'connect':
-                self.init()
-            elif payload['id'] == 'disconnect':
-                self.disconnect()
-        elif payload['id'][:3] == 'ADD':
-            data = payload['id'].replace('ADD', '')
-            data = data.split(' ')
-            channel_index = int(data[1])
-            if data[0] == '1':
-                device_index = 0
-            elif data[0] == '3':
-                device_index = 1
-            elif data[0] == '4':
-                device_index = 2
+        # Bitfile loading and register access are slow, keep them off the GUI thread
+        topic, affinity = self.topic, self.affinity
+        self.subscriptions = [
+            router.subscribe(f'{topic}/connect', lambda payload: self.init(), affinity=affinity),
+            router.subscribe(f'{topic}/disconnect', lambda payload: self.disconnect(), affinity=affinity),
+            router.subscribe(f'{topic}/flush', lambda payload: self.output_stage.flush(), affinity=affinity),
+            router.subscribe(f'{topic}/channel/+', self.write_channel, converters=(int,), affinity=affinity)
+        ]
+        for device_id, device_index in add_devices.items():
+            self.subscriptions.append(
+                router.subscribe(f'{topic}/{device_id}/+', partial(self.write_digital, device_index),
+                                 converters=(int,), affinity=affinity)
+            )
+
+    def set_routing(self, topic: str, affinity: str):
+        """ Move the board to another topic prefix and I/O thread
+        """
+        self.unregister_route()
+        self.topic = topic
+        self.affinity = affinity
+        self.register_route()
+
+    def unregister_route(self):
+        for subscription in self.subscriptions:
+            router.unsubscribe(subscription)
+        self.subscriptions = []
+
+    def write_channel(self, handle: int, value: float):
+        """ Write an output channel by handle, the address comes from the current AddressMap
+
+        :raises ValueError: If the channel is not on an ADD device
+        """
+        address_map = get_address_map()
+        device_index = int(address_map.device_index[handle])
+        if device_index < 0:
+            raise ValueError(f"Channel {address_map.address(handle).id} is not on an ADD device")
+        self.output_stage.write(
+            device_index,
+            function_names[address_map.function[handle]],
+            int(address_map.channel[handle]),
+            value
+        )
+
+    def write_channels(self, handles: np.ndarray, values: np.ndarray):
+        """ Write many output channels by handle on the calling thread, one bulk write per device and function
+
+        Writes do not go through the output stage, the caller coalesces them, e.g. the controller process per
+        batch of commands.
+
+        :raises ValueError: If a channel is not on an ADD device
+        """
+        address_map = get_address_map()
+        handles = np.asarray(handles, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        device_index = address_map.device_index[handles]
+        if np.any(device_index < 0):
+            unroutable = handles[device_index < 0]
+            raise ValueError(f"Channels {[address_map.address(handle).id for handle in unroutable]} are not on an "
+                             f"ADD device")
+        function = address_map.function[handles]
+        for device, code in sorted(set(zip(device_index.tolist(), function.tolist()))):
+            selected = (device_index == device) & (function == code)
+            self.write_outputs(device, function_names[code], address_map.channel[handles[selected]].astype(np.int64),
+                               values[selected])
+
+    def read_channels(self, handles: np.ndarray) -> np.ndarray:
+        """ Read input channels by handle, one driver call per channel
+
+        :return: One value per handle
+        :rtype: np.ndarray
+        """
+        address_map = get_address_map()
+        values = np.empty(len(handles))
+        for index, handle in enumerate(handles):
+            device_index = int(address_map.device_index[handle])
+            channel_index = int(address_map.channel[handle])
+            if function_names[address_map.function[handle]] == 'ADC':
+                values[index] = self.read_adc(device_index, channel_index)
             else:
-                raise ValueError(f"Invalid IC ID {payload['id']} for ADD")
+                values[index] = self.read_digital(device_index, channel_index)
+        return values
+
+    def write_digital(self, device_index: int, channel_index: int, value: bool):
+        self.output_stage.write(device_index, 'DIG_OUT', channel_index, value)
 
-            if payload['function'] == 'DIG_OUT':
-                self.modules['ADD_adapter_test'].adds[device_index].write_digital(channel_index, payload['value'])
-        # elif payload['id'][:3] == 'DAC':
-        #     pass
-        # elif payload['id'][:2] == 'DG':
+    def write_dac(self, device_index: int, channel_index: int, value: float):
+        self.output_stage.write(device_index, 'DAC', channel_index, value)
 
+    def write_outputs(self, device_index: int, function: str, channels: np.ndarray, values: np.ndarray):
+        """ Write many channels of one device, called by the output stage
 
+        Uses the bulk call of the device when it has one, otherwise writes channel by channel.
+        """
+        device = self.modules['ADD_adapter_test'].adds[device_index]
+        if function == 'DIG_OUT':
+            if hasattr(device, 'write_digital_bulk'):
+                device.write_digital_bulk(channels, values != 0)
+            else:
+                for channel_index, value in zip(channels, values):
+                    device.write_digital(int(channel_index), bool(value))
+        elif function == 'DAC':
+            if hasattr(device, 'write_dac_bulk'):
+                device.write_dac_bulk(channels, values)
+            else:
+                for channel_index, value in zip(channels, values):
+                    device.write_dac(int(channel_index), float(value))
+        else:
+            raise ValueError(f"Cannot write to {function} channels")
 
+    def read_digital(self, device_index: int, channel_index: int) -> bool:
+        return self.modules['ADD_adapter_test'].adds[device_index].read_digital(channel_index)
 
+    def read_adc(self, device_index: int, channel_index: int) -> float:
+        return self.modules['ADD_adapter_test'].adds[device_index].read_adc(channel_index)
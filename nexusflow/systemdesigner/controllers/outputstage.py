@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.DEBUG)
+
+default_window = 0.005  # s
+
+
+class OutputStage:
+    def __init__(self, write_bulk: callable, window: float = default_window, dispatch: Optional[callable] = None):
+        """ Collects output writes and sends them as one bulk write per device
+
+        Writes to the same channel within a window replace each other, only the last value is sent.
+        The window starts with the first pending write; ``flush`` sends everything right away.
+
+        :param write_bulk: Called with (device_index, function, channels, values) once per device and function
+        :type write_bulk: callable
+        :param window: Seconds to collect writes before they are sent, 0 sends every write right away
+        :type window: float
+        :param dispatch: Called with ``flush`` when a window ends, e.g. to run it on the thread that owns the
+            device, defaults to calling it on the window thread
+        :type dispatch: Optional[callable]
+        """
+        self.write_bulk = write_bulk
+        self.dispatch = dispatch if dispatch is not None else lambda flush: flush()
+        self.window = window
+        self.condition = threading.Condition()
+        self.pending: Dict[Tuple[int, str], Dict[int, float]] = {}
+        self.deadline: Optional[float] = None
+        self.thread = None
+        self.running = False
+
+        self.requested_writes = 0
+        self.superseded_writes = 0
+        self.bulk_writes = 0
+
+    def write(self, device_index: int, function: str, channel_index: int, value: float) -> None:
+        """ Queue an output write
+
+        :param device_index: Device the channel belongs to
+        :type device_index: int
+        :param function: Pin function, e.g. 'DIG_OUT' or 'DAC'
+        :type function: str
+        :param channel_index: Channel of the device
+        :type channel_index: int
+        :param value: The value
+        :type value: float
+        """
+        with self.condition:
+            channels = self.pending.setdefault((device_index, function), {})
+            if channel_index in channels:
+                self.superseded_writes += 1
+            channels[channel_index] = value
+            self.requested_writes += 1
+            if self.window > 0:
+                if self.deadline is None:
+                    self.deadline = time.perf_counter() + self.window
+                    self.ensure_thread()
+                    self.condition.notify()
+                return
+        self.flush()
+
+    def ensure_thread(self) -> None:
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name='nexusflow-outputs', daemon=True)
+            self.thread.start()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.running and self.deadline is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                delay = self.deadline - time.perf_counter()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                # The window is over, writes arriving before the dispatched flush runs are sent with it
+                self.deadline = None
+            self.dispatch(self.flush)
+
+    def flush(self) -> int:
+        """ Send every pending write
+
+        :return: Number of bulk writes
+        :rtype: int
+        """
+        with self.condition:
+            pending, self.pending = self.pending, {}
+            self.deadline = None
+        for (device_index, function), channels in pending.items():
+            try:
+                self.write_bulk(
+                    device_index,
+                    function,
+                    np.fromiter(channels.keys(), dtype=np.int64, count=len(channels)),
+                    np.fromiter(channels.values(), dtype=np.float64, count=len(channels))
+                )
+            except Exception:
+                logging.exception(f"Writing {len(channels)} {function} channels of device {device_index} failed")
+        self.bulk_writes += len(pending)
+        return len(pending)
+
+    def stop(self) -> None:
+        """ Send pending writes and stop the flush thread
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
@@ -0,0 +1,332 @@
+import logging
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from nexusflow import router
+from nexusflow.systemdesigner.module.addressmap import AddressMap, set_address_map
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+
+logging.basicConfig(level=logging.DEBUG)
+
+command_dtype = np.dtype([
+    ('opcode', '<u4'),
+    ('handle', '<u4'),
+    ('value', '<f8')
+])
+opcode_write = 1
+opcode_stop = 2
+
+header_size = 128  # producer and consumer counters live on separate cache lines
+default_ring_capacity = 4096
+default_poll_interval = 0.001  # s, child process
+input_functions = ('ADC', 'DIG_IN')
+
+
+class HostedController(Protocol):
+    """ Interface of a controller that runs inside the controller process, e.g. OKFPGAController
+
+    Channels are addressed by system handle, the controller process sets up the AddressMap before the
+    controller is created.
+    """
+
+    def open(self) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+    def write_channels(self, handles: np.ndarray, values: np.ndarray) -> None:
+        ...
+
+    def read_channels(self, handles: np.ndarray) -> np.ndarray:
+        ...
+
+
+class ChannelTable:
+    """ Latest value and timestamp of every channel, indexed by channel handle, in shared memory
+
+    There is a single writer (the controller process). A sequence counter, odd while a write is in
+    progress, lets readers retry instead of returning a torn snapshot.
+    """
+
+    def __init__(self, channel_count: int, name: Optional[str] = None):
+        self.channel_count = channel_count
+        size = 8 + 16 * max(channel_count, 1)
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.sequence = np.ndarray((1,), dtype='<u8', buffer=self.memory.buf, offset=0)
+        self.values = np.ndarray((channel_count,), dtype='<f8', buffer=self.memory.buf, offset=8)
+        self.timestamps = np.ndarray((channel_count,), dtype='<f8', buffer=self.memory.buf,
+                                     offset=8 + 8 * channel_count)
+        if self.owner:
+            self.sequence[0] = 0
+            self.values[:] = np.nan
+            self.timestamps[:] = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def write(self, handles: np.ndarray, values: np.ndarray, timestamp: float) -> None:
+        self.sequence[0] += 1
+        self.values[handles] = values
+        self.timestamps[handles] = timestamp
+        self.sequence[0] += 1
+
+    def read(self, retries: int = 100) -> Tuple[np.ndarray, np.ndarray]:
+        """ Consistent copy of all values and timestamps
+
+        :return: values, timestamps
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        for _ in range(retries):
+            before = int(self.sequence[0])
+            if before % 2:
+                continue
+            values = self.values.copy()
+            timestamps = self.timestamps.copy()
+            if int(self.sequence[0]) == before:
+                return values, timestamps
+        return self.values.copy(), self.timestamps.copy()
+
+    def close(self) -> None:
+        del self.sequence, self.values, self.timestamps
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class CommandRing:
+    """ Single producer, single consumer ring buffer of commands in shared memory
+
+    The producer only writes ``head`` and the consumer only writes ``tail``, so no lock is needed.
+    Both counters grow forever, the slot is the counter modulo the (power of two) capacity.
+    """
+
+    def __init__(self, capacity: int = default_ring_capacity, name: Optional[str] = None):
+        if capacity & (capacity - 1):
+            raise ValueError(f"Ring capacity {capacity} is not a power of two")
+        self.capacity = capacity
+        self.mask = capacity - 1
+        size = header_size + capacity * command_dtype.itemsize
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.head = np.ndarray((1,), dtype='<u8', buffer=self.memory.buf, offset=0)
+        self.tail = np.ndarray((1,), dtype='<u8', buffer=self.memory.buf, offset=header_size // 2)
+        self.slots = np.ndarray((capacity,), dtype=command_dtype, buffer=self.memory.buf, offset=header_size)
+        if self.owner:
+            self.head[0] = 0
+            self.tail[0] = 0
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def push(self, opcode: int, handle: int = 0, value: float = 0.0) -> bool:
+        """ Append a command
+
+        :return: False if the ring is full
+        :rtype: bool
+        """
+        head = int(self.head[0])
+        if head - int(self.tail[0]) >= self.capacity:
+            return False
+        self.slots[head & self.mask] = (opcode, handle, value)
+        self.head[0] = head + 1
+        return True
+
+    def pop_all(self) -> np.ndarray:
+        """ Take every pending command
+
+        :return: Copy of the pending commands in order
+        :rtype: np.ndarray
+        """
+        tail = int(self.tail[0])
+        head = int(self.head[0])
+        if head == tail:
+            return self.slots[:0].copy()
+        indexes = np.arange(tail, head, dtype=np.uint64) & np.uint64(self.mask)
+        commands = self.slots[indexes]
+        self.tail[0] = head
+        return commands
+
+    def close(self) -> None:
+        del self.head, self.tail, self.slots
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def apply_writes(controller: HostedController, table: ChannelTable, commands: np.ndarray) -> None:
+    """ Send a batch of write commands as one bulk write, a channel written several times gets its last value
+    """
+    if not len(commands):
+        return
+    handles, last = np.unique(commands['handle'][::-1], return_index=True)
+    handles = handles.astype(np.int64)
+    values = commands['value'][::-1][last]
+    try:
+        controller.write_channels(handles, values)
+    except Exception:
+        logging.exception(f"Writing {len(handles)} channels failed")
+        return
+    table.write(handles, values, time.time())
+
+
+def controller_process_main(controller_factory: callable, table_name: str, ring_name: str,
+                            pin_definitions: Sequence[PinDefinition], ring_capacity: int, input_handles: np.ndarray,
+                            poll_interval: float) -> None:
+    """ Entry point of the controller process
+
+    Applies queued commands and polls the input channels into the shared channel table until a stop
+    command arrives.
+    """
+    table = ChannelTable(len(pin_definitions), name=table_name)
+    ring = CommandRing(ring_capacity, name=ring_name)
+    controller: Optional[HostedController] = None
+    try:
+        # The controller addresses channels by system handle like it does in the GUI process
+        set_address_map(AddressMap(pin_definitions))
+        # Inside the try so a failing controller still releases the shared memory
+        controller = controller_factory()
+        controller.open()
+        next_poll = time.perf_counter()
+        running = True
+        while running:
+            commands = ring.pop_all()
+            stops = np.flatnonzero(commands['opcode'] == opcode_stop)
+            if len(stops):
+                running = False
+                commands = commands[:stops[0]]
+            apply_writes(controller, table, commands[commands['opcode'] == opcode_write])
+            if running and len(input_handles):
+                table.write(input_handles, controller.read_channels(input_handles), time.time())
+            next_poll += poll_interval
+            delay = next_poll - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_poll = time.perf_counter()
+    finally:
+        try:
+            if controller is not None:
+                controller.close()
+        finally:
+            ring.close()
+            table.close()
+
+
+class ControllerProcessHost:
+    def __init__(self, name: str, controller_factory: callable, pin_definitions: Sequence[PinDefinition],
+                 input_handles: Optional[np.ndarray] = None, ring_capacity: int = default_ring_capacity,
+                 poll_interval: float = default_poll_interval):
+        """ Runs a controller in a child process so acquisition and the GUI use separate cores
+
+        Channels are addressed by the handles of the AddressMap built from ``pin_definitions``. Channel values
+        come back through a shared memory ChannelTable, commands go out over a CommandRing. Writes are routed
+        from the topic '<name>/channel/<handle>'. The acquisition reads the table with ``read_channels``,
+        so hosted samples are converted, checked for alarms and recorded like those of an in-process board.
+
+        :param name: Controller name, used as topic prefix
+        :type name: str
+        :param controller_factory: Picklable callable creating the HostedController inside the child process,
+            e.g. a controller class
+        :type controller_factory: callable
+        :param pin_definitions: Pin definitions of the whole system, the handle of a pin is its index
+        :type pin_definitions: Sequence[PinDefinition]
+        :param input_handles: Handles polled by the child process, defaults to every ADC and DIG_IN pin
+        :type input_handles: Optional[np.ndarray]
+        """
+        self.name = name
+        self.controller_factory = controller_factory
+        self.pin_definitions = list(pin_definitions)
+        self.channel_count = len(self.pin_definitions)
+        if input_handles is None:
+            input_handles = [handle for handle, pin_definition in enumerate(self.pin_definitions)
+                             if pin_definition.function in input_functions]
+        self.input_handles = np.asarray(input_handles, dtype=np.int64)
+        self.ring_capacity = ring_capacity
+        self.poll_interval = poll_interval
+        self.table = None
+        self.ring = None
+        self.process = None
+        self.subscription = None
+
+    def start(self) -> None:
+        if self.process is not None:
+            return
+        self.table = ChannelTable(self.channel_count)
+        self.ring = CommandRing(self.ring_capacity)
+        self.process = multiprocessing.get_context('spawn').Process(
+            target=controller_process_main,
+            args=(self.controller_factory, self.table.name, self.ring.name, self.pin_definitions, self.ring_capacity,
+                  self.input_handles, self.poll_interval),
+            name=f'nexusflow-{self.name}',
+            daemon=True
+        )
+        self.process.start()
+        self.subscription = router.subscribe(f'{self.name}/channel/+', self.write, converters=(int,))
+        logging.debug(f"Started controller process for {self.name}, pid {self.process.pid}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self.process is None:
+            return
+        router.unsubscribe(self.subscription)
+        self.subscription = None
+        # A dead child never drains a full ring, give up on the stop command then and terminate
+        deadline = time.perf_counter() + timeout
+        while not self.ring.push(opcode_stop):
+            if not self.process.is_alive() or time.perf_counter() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+        self.process.join(max(deadline - time.perf_counter(), 0.0))
+        if self.process.is_alive():
+            logging.warning(f"Controller process for {self.name} did not stop, terminating")
+            self.process.terminate()
+        self.process = None
+        self.ring.close()
+        self.table.close()
+        self.ring = None
+        self.table = None
+
+    def write(self, handle: int, value: float) -> None:
+        """ Queue a channel write for the controller process, only call from one thread (the ring has a
+        single producer)
+
+        :raises RuntimeError: If the process is not running or the command ring is full
+        """
+        if self.ring is None:
+            raise RuntimeError(f"Controller process for {self.name} is not running")
+        if not self.ring.push(opcode_write, handle, float(value)):
+            raise RuntimeError(f"Command ring of {self.name} is full")
+
+    def read(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ Latest values and timestamps of every channel
+
+        :return: values, timestamps indexed by channel handle
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        return self.table.read()
+
+    def read_channels(self, handles: np.ndarray) -> np.ndarray:
+        """ Latest values of channels, usable as the acquisition read_channels
+
+        :raises RuntimeError: If the process is not running
+        """
+        table = self.table
+        if table is None:
+            raise RuntimeError(f"Controller process for {self.name} is not running")
+        values, _ = table.read()
+        return values[handles]
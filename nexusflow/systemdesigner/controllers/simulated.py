@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+from nexusflow.systemdesigner.controllers.okfpga import OKFPGAController
+from nexusflow.systemdesigner.module.addressmap import add_devices, get_address_map
+
+logging.basicConfig(level=logging.DEBUG)
+
+generator_kinds = ('constant', 'sine', 'square', 'ramp', 'noise')
+default_channels_per_device = 64
+sample_size = 4  # bytes per channel on the simulated link
+command_size = 8  # bytes per write
+
+
+@dataclass(kw_only=True)
+class LinkSettings:
+    latency: float = 0.0005  # s per transfer
+    jitter: float = 0.0002  # s, uniformly distributed on top of the latency
+    bandwidth: float = 20e6  # bytes per second
+
+
+@dataclass(kw_only=True)
+class SignalGenerator:
+    kind: str = 'sine'
+    amplitude: float = 1.0
+    frequency: float = 1.0  # Hz
+    offset: float = 0.0
+    phase: float = 0.0  # rad
+
+    def __post_init__(self):
+        if self.kind not in generator_kinds:
+            raise ValueError(f"Unknown signal generator {self.kind}, expected one of {generator_kinds}")
+
+
+class SimulatedLink:
+    def __init__(self, settings: LinkSettings, seed: Optional[int] = None):
+        """ USB/PCIe link model, every transfer blocks for latency + jitter + size / bandwidth
+
+        Transfers are serialized like on a real bus.
+        """
+        self.settings = settings
+        self.random = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.transfers = 0
+        self.transferred_bytes = 0
+        self.busy_time = 0.0
+
+    def transfer(self, byte_count: int) -> None:
+        with self.lock:
+            delay = self.settings.latency + self.random.uniform(0.0, self.settings.jitter) + \
+                byte_count / self.settings.bandwidth
+            if delay > 0:
+                time.sleep(delay)
+            self.transfers += 1
+            self.transferred_bytes += byte_count
+            self.busy_time += delay
+
+
+class SignalBank:
+    def __init__(self, channel_count: int, seed: Optional[int] = None):
+        """ Signal generators of every channel, evaluated for many channels at once
+        """
+        self.random = np.random.default_rng(seed)
+        self.kind = np.zeros(channel_count, dtype=np.int8)
+        self.amplitude = np.zeros(channel_count)
+        self.frequency = np.zeros(channel_count)
+        self.offset = np.zeros(channel_count)
+        self.phase = np.zeros(channel_count)
+
+    def set_generator(self, handle: int, generator: SignalGenerator) -> None:
+        self.kind[handle] = generator_kinds.index(generator.kind)
+        self.amplitude[handle] = generator.amplitude
+        self.frequency[handle] = generator.frequency
+        self.offset[handle] = generator.offset
+        self.phase[handle] = generator.phase
+
+    def evaluate(self, handles: np.ndarray, t: float) -> np.ndarray:
+        kind = self.kind[handles]
+        angle = 2 * np.pi * self.frequency[handles] * t + self.phase[handles]
+        shapes = np.select(
+            [kind == 1, kind == 2, kind == 3, kind == 4],
+            [np.sin(angle), np.sign(np.sin(angle)), (angle / (2 * np.pi)) % 1.0,
+             self.random.standard_normal(len(handles))],
+            default=0.0
+        )
+        return self.offset[handles] + self.amplitude[handles] * shapes
+
+
+class SimulatedADD:
+    def __init__(self, board: 'SimulatedFPGA', device_index: int):
+        self.board = board
+        self.device_index = device_index
+
+    def handle(self, channel_index: int | np.ndarray) -> int | np.ndarray:
+        return self.device_index * self.board.channels_per_device + channel_index
+
+    def write_digital(self, channel_index: int, value: bool) -> None:
+        self.board.write_channel(self.handle(channel_index), 1.0 if value else 0.0)
+
+    def write_digital_bulk(self, channels: np.ndarray, values: np.ndarray) -> None:
+        self.board.write_channels(self.handle(channels), np.where(values, 1.0, 0.0))
+
+    def write_dac(self, channel_index: int, value: float) -> None:
+        self.board.write_channel(self.handle(channel_index), value)
+
+    def write_dac_bulk(self, channels: np.ndarray, values: np.ndarray) -> None:
+        self.board.write_channels(self.handle(channels), values)
+
+    def read_digital(self, channel_index: int) -> bool:
+        return bool(self.board.read_channels(np.array([self.handle(channel_index)]))[0] != 0)
+
+    def read_adc(self, channel_index: int) -> float:
+        return float(self.board.read_channels(np.array([self.handle(channel_index)]))[0])
+
+
+class SimulatedModule:
+    def __init__(self, board: 'SimulatedFPGA'):
+        self.adds = [SimulatedADD(board, device_index) for device_index in range(len(add_devices))]
+
+
+class SimulatedFPGA:
+    def __init__(self, link: Optional[LinkSettings] = None, channels_per_device: int = default_channels_per_device,
+                 generators: Optional[Dict[int, SignalGenerator]] = None, seed: Optional[int] = None):
+        """ Stand-in for the Opal Kelly board
+
+        Channels are addressed by handle ``device_index * channels_per_device + channel_index``. Written
+        channels read back the written value, the others return their signal generator.
+
+        :param link: Link timing, defaults to LinkSettings()
+        :type link: Optional[LinkSettings]
+        :param channels_per_device: Channels of every ADD device
+        :type channels_per_device: int
+        :param generators: Signal generator per channel handle, other channels read 0
+        :type generators: Optional[Dict[int, SignalGenerator]]
+        """
+        self.link_settings = LinkSettings() if link is None else link
+        self.channels_per_device = channels_per_device
+        self.channel_count = channels_per_device * len(add_devices)
+        self.generator_settings = generators or {}
+        self.seed = seed
+        self.link = None
+        self.signals = None
+        self.outputs = None
+        self.started_at = 0.0
+        self.open()
+
+    def open(self) -> None:
+        self.link = SimulatedLink(self.link_settings, self.seed)
+        self.signals = SignalBank(self.channel_count, self.seed)
+        for handle, generator in self.generator_settings.items():
+            self.signals.set_generator(handle, generator)
+        self.outputs = np.full(self.channel_count, np.nan)
+        self.started_at = time.perf_counter()
+
+    def close(self) -> None:
+        logging.debug(f"Simulated FPGA closed after {self.link.transfers} transfers, "
+                      f"{self.link.transferred_bytes} bytes")
+
+    def add_module(self, module_excel_path: str) -> SimulatedModule:
+        self.link.transfer(command_size)
+        return SimulatedModule(self)
+
+    def write_channel(self, handle: int, value: float) -> None:
+        self.link.transfer(command_size)
+        self.outputs[handle] = value
+
+    def write_channels(self, handles: np.ndarray, values: np.ndarray) -> None:
+        """ Write many channels in one transfer
+        """
+        self.link.transfer(command_size * len(handles))
+        self.outputs[handles] = values
+
+    def read_channels(self, handles: np.ndarray) -> np.ndarray:
+        """ Read many channels in one transfer
+
+        :param handles: Channel handles
+        :type handles: np.ndarray
+        ...
+        :return: One value per handle
+        :rtype: np.ndarray
+        """
+        handles = np.asarray(handles, dtype=np.int64)
+        self.link.transfer(sample_size * len(handles))
+        values = self.signals.evaluate(handles, time.perf_counter() - self.started_at)
+        written = self.outputs[handles]
+        return np.where(np.isnan(written), values, written)
+
+
+class SimulatedFPGAController(OKFPGAController):
+    def __init__(self, link: Optional[LinkSettings] = None, channels_per_device: int = default_channels_per_device,
+                 generators: Optional[Dict[int, SignalGenerator]] = None, serial: Optional[str] = None,
+                 topic: str = 'fpga', affinity: str = 'io'):
+        """ OKFPGAController backed by a SimulatedFPGA, for running and load testing without hardware
+        """
+        super().__init__(bitfile='', serial=serial, topic=topic, affinity=affinity)
+        self.name = "Simulated FPGA"
+        self.link_settings = link
+        self.channels_per_device = channels_per_device
+        self.generators = generators
+
+    def disconnect(self):
+        # PySide resolves inherited overrides of QObject methods to the QObject one, redeclare it
+        super().disconnect()
+
+    def create_fpga(self) -> SimulatedFPGA:
+        return SimulatedFPGA(self.link_settings, self.channels_per_device, self.generators)
+
+    def read_channels(self, handles: np.ndarray) -> np.ndarray:
+        """ Bulk read by system channel handle, usable as the acquisition read_channels
+
+        :raises RuntimeError: If the controller is not connected
+        """
+        board = self.fpga
+        if board is None:
+            raise RuntimeError(f"{self.name} is not connected")
+        address_map = get_address_map()
+        handles = np.asarray(handles, dtype=np.int64)
+        device_index = address_map.device_index[handles]
+        routable = device_index >= 0
+        values = np.full(len(handles), np.nan)
+        values[routable] = board.read_channels(
+            device_index[routable].astype(np.int64) * board.channels_per_device + address_map.channel[handles[routable]]
+        )
+        return values
@@ -0,0 +1,133 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+from nexusflow.messages import SampleBlock
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+
+digital_functions = ('DIG_IN', 'DIG_OUT')
+kelvin_offset = 273.15
+
+
+class ConversionEngine:
+    def __init__(self, pin_definitions: Sequence[PinDefinition], handles: Optional[Sequence[int]] = None):
+        """ Converts raw values to engineering units for whole sample blocks at once
+
+        The coefficients of every pin are compiled into arrays once, ``convert`` then costs a handful of
+        vectorized operations per block, independent of the number of channels.
+
+        - digital pins: 1.0 if the raw value is non zero, inverted for active low pins
+        - analog pins: ``k * raw + C``
+        - analog pins with an enabled exponential: the linear result is a resistance R converted to a
+          temperature with the B-parameter equation ``1 / T = 1 / T0 + ln(R / R0) / B``, T0 and the
+          result in degrees Celsius
+
+        :param pin_definitions: The pin definitions
+        :type pin_definitions: Sequence[PinDefinition]
+        :param handles: Channel handle of every pin definition, defaults to its index
+        :type handles: Optional[Sequence[int]]
+        """
+        count = len(pin_definitions)
+        handles = np.arange(count) if handles is None else np.asarray(handles, dtype=np.int64)
+        self.slot_of_handle = np.full(int(handles.max()) + 1 if count else 0, -1, dtype=np.int64)
+        self.slot_of_handle[handles] = np.arange(count)
+
+        self.k = np.ones(count)
+        self.C = np.zeros(count)
+        self.digital = np.zeros(count, dtype=bool)
+        self.active_low = np.zeros(count, dtype=bool)
+        self.exponential = np.zeros(count, dtype=bool)
+        self.B = np.ones(count)
+        self.R0 = np.ones(count)
+        self.T0 = np.full(count, kelvin_offset)
+
+        for slot, pin_definition in enumerate(pin_definitions):
+            if pin_definition.conversion_coefficients is not None:
+                self.k[slot] = pin_definition.conversion_coefficients.k
+                self.C[slot] = pin_definition.conversion_coefficients.C
+            self.digital[slot] = pin_definition.function in digital_functions
+            self.active_low[slot] = pin_definition.active_low
+            exponential = pin_definition.exponential
+            if exponential is not None and exponential.enable and exponential.B and exponential.R0:
+                self.exponential[slot] = True
+                self.B[slot] = exponential.B
+                self.R0[slot] = exponential.R0
+                self.T0[slot] = exponential.T0 + kelvin_offset
+        self.any_exponential = bool(self.exponential.any())
+
+    def slots(self, handles: np.ndarray) -> np.ndarray:
+        """ Coefficient slot of every handle
+
+        :raises KeyError: If a handle has no pin definition
+        """
+        handles = np.asarray(handles, dtype=np.int64)
+        if len(handles) and (handles.max() >= len(self.slot_of_handle) or (self.slot_of_handle[handles] < 0).any()):
+            raise KeyError(f"Channel handles without conversion: {handles[self.unknown(handles)]}")
+        return self.slot_of_handle[handles]
+
+    def unknown(self, handles: np.ndarray) -> np.ndarray:
+        unknown = handles >= len(self.slot_of_handle)
+        unknown[~unknown] = self.slot_of_handle[handles[~unknown]] < 0
+        return unknown
+
+    def convert(self, handles: np.ndarray, raw: np.ndarray) -> np.ndarray:
+        """ Raw values to engineering units
+
+        :param handles: Channel handle of every value
+        :type handles: np.ndarray
+        :param raw: Raw values
+        :type raw: np.ndarray
+        ...
+        :return: Converted values
+        :rtype: np.ndarray
+        """
+        slots = self.slots(handles)
+        raw = np.asarray(raw, dtype=np.float64)
+        values = self.k[slots] * raw + self.C[slots]
+
+        if self.any_exponential:
+            exponential = self.exponential[slots]
+            if exponential.any():
+                selected = slots[exponential]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    inverse_temperature = 1.0 / self.T0[selected] + \
+                        np.log(values[exponential] / self.R0[selected]) / self.B[selected]
+                    values[exponential] = 1.0 / inverse_temperature - kelvin_offset
+
+        digital = self.digital[slots]
+        if digital.any():
+            values[digital] = (raw[digital] != 0) != self.active_low[slots[digital]]
+        return values
+
+    def convert_block(self, block: SampleBlock) -> SampleBlock:
+        """ Block with the same handles and timestamps and converted values
+
+        :param block: Raw samples
+        :type block: SampleBlock
+        ...
+        :return: Converted samples
+        :rtype: SampleBlock
+        """
+        converted = SampleBlock(block.samples.copy())
+        converted.values[:] = self.convert(block.handles, block.values)
+        return converted
+
+    def to_raw(self, handles: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """ Engineering units back to raw values, for outputs
+
+        :param handles: Channel handle of every value
+        :type handles: np.ndarray
+        :param values: Values in engineering units
+        :type values: np.ndarray
+        ...
+        :return: Raw values
+        :rtype: np.ndarray
+        """
+        slots = self.slots(handles)
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw = (values - self.C[slots]) / self.k[slots]
+        digital = self.digital[slots]
+        if digital.any():
+            raw[digital] = (values[digital] != 0) != self.active_low[slots[digital]]
+        return raw
@@ -9,17 +9,22 @@ logging.basicConfig(level=logging.DEBUG)
 
 
 ignore_rows = ('PWR',)
+# Bump when the parsed PinDefinitions change, cached modules of older versions are parsed again
+importer_version = 4
+
+
+# Pin function -> (display type, display direction)
+display_types = {
+    'DIG_IN': ('bool', 'output'),
+    'DIG_OUT': ('bool', 'input'),
+    'ADC': ('float', 'output'),
+    'DAC': ('float', 'input')
+}
 
 
 def get_display_type(function) -> Tuple[str, str]:
-    if function == 'DIG_IN':
-        return 'bool', 'output'
-    elif function == 'DIG_OUT':
-        return 'bool', 'input'
-    elif function == 'ADC':
-        return 'float', 'output'
-    elif function == 'DAC':
-        return 'float', 'input'
+    if function in display_types:
+        return display_types[function]
     else:
         raise ValueError(f'Unknown pin function {function}')
 
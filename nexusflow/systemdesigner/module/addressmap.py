@@ -0,0 +1,134 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from nexusflow import router
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+
+logging.basicConfig(level=logging.DEBUG)
+
+# ADD device id -> index of the device in the FPGA module
+add_devices = {'ADD1': 0, 'ADD3': 1, 'ADD4': 2}
+# Pin function -> function code stored in the address table
+function_codes = {'DIG_IN': 0, 'DIG_OUT': 1, 'ADC': 2, 'DAC': 3}
+function_names = tuple(function_codes.keys())
+# Topic the new AddressMap is published to whenever modules are imported or reloaded
+address_map_topic = 'modules/address_map'
+
+
+def parse_pin_id(pin_id: str) -> Tuple[str, int, int]:
+    """ Split a pin id such as 'ADD3 3' into its device and channel
+
+    :param pin_id: The pin id
+    :type pin_id: str
+    ...
+    :raises ValueError: If the pin id has no numeric channel
+    ...
+    :return: device id, device index (-1 for devices that are not ADDs), channel
+    :rtype: Tuple[str, int, int]
+    """
+    parts = pin_id.split()
+    if len(parts) != 2 or not parts[1].lstrip('-').isdigit():
+        raise ValueError(f"Invalid pin id {pin_id}, expected '<device> <channel>'")
+    return parts[0], add_devices.get(parts[0], -1), int(parts[1])
+
+
+@dataclass(frozen=True, kw_only=True)
+class ChannelAddress:
+    handle: int
+    id: str
+    device: str
+    device_index: int
+    channel: int
+    function: str
+    conversion_slot: int
+
+
+class AddressMap:
+    def __init__(self, pin_definitions: Sequence[PinDefinition]):
+        """ Immutable table of channel addresses, built once per import
+
+        The handle of a pin is its position in ``pin_definitions``, which is also its slot in the
+        conversion and alarm engines. Lookups by handle are array indexing, the only string work is the
+        single ``handle_of`` dict lookup for callers that still start from a pin id.
+
+        :param pin_definitions: Pin definitions of the whole system
+        :type pin_definitions: Sequence[PinDefinition]
+        ...
+        A pin id used by several modules keeps the handle of its first pin for ``handle_of``.
+        """
+        count = len(pin_definitions)
+        addresses = []
+        handles: Dict[str, int] = {}
+        device_index = np.empty(count, dtype=np.int16)
+        channel = np.empty(count, dtype=np.int32)
+        function = np.empty(count, dtype=np.int8)
+        for handle, pin_definition in enumerate(pin_definitions):
+            if pin_definition.id in handles:
+                logging.warning(f"Pin id {pin_definition.id} is defined more than once, handle_of returns the "
+                                f"first one")
+            try:
+                device, device_index[handle], channel[handle] = parse_pin_id(pin_definition.id)
+            except ValueError:
+                logging.warning(f"Pin {pin_definition.id} has no device channel, it cannot be routed to hardware")
+                device, device_index[handle], channel[handle] = pin_definition.id, -1, -1
+            function[handle] = function_codes.get(pin_definition.function, -1)
+            handles.setdefault(pin_definition.id, handle)
+            addresses.append(ChannelAddress(
+                handle=handle,
+                id=pin_definition.id,
+                device=device,
+                device_index=int(device_index[handle]),
+                channel=int(channel[handle]),
+                function=pin_definition.function,
+                conversion_slot=handle
+            ))
+
+        for array in (device_index, channel, function):
+            array.flags.writeable = False
+        self.device_index = device_index
+        self.channel = channel
+        self.function = function
+        self.addresses: Tuple[ChannelAddress, ...] = tuple(addresses)
+        self.handles = handles
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def handle_of(self, pin_id: str) -> int:
+        """ Handle of a pin id
+
+        :raises KeyError: If the pin id is unknown
+        """
+        return self.handles[pin_id]
+
+    def address(self, handle: int) -> ChannelAddress:
+        return self.addresses[handle]
+
+    def handles_of_function(self, function: str) -> np.ndarray:
+        return np.flatnonzero(self.function == function_codes[function])
+
+
+current_address_map: Optional[AddressMap] = None
+
+
+def set_address_map(address_map: AddressMap) -> None:
+    """ Make an address map current and publish it to ``address_map_topic``, subscribers holding handles
+    look them up again since a re-import can renumber the pins
+    """
+    global current_address_map
+    logging.debug(f"Address map with {len(address_map)} channels")
+    current_address_map = address_map
+    router.publish(address_map_topic, address_map)
+
+
+def get_address_map() -> AddressMap:
+    """ Address map of the currently imported modules
+
+    :raises RuntimeError: If no module has been imported yet
+    """
+    if current_address_map is None:
+        raise RuntimeError("No address map, import a module first")
+    return current_address_map
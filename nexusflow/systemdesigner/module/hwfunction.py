@@ -36,6 +36,9 @@ class HWFunction(QGroupBox):
         group_layout.addWidget(name_label, 0, 0)
         name_line_edit = QLineEdit()
         name_line_edit.setText(self.pin_definition.name)
+        name_line_edit.textEdited.connect(
+            lambda text: setattr(self.pin_definition, 'name', text)
+        )
         group_layout.addWidget(name_line_edit, 0, 1)
         function_label = QLabel('Function:')
         function_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
@@ -48,6 +51,9 @@ class HWFunction(QGroupBox):
         group_layout.addWidget(unit_label, 2, 0)
         unit_value_line_edit = QLineEdit()
         unit_value_line_edit.setText(self.pin_definition.unit)
+        unit_value_line_edit.textEdited.connect(
+            lambda text: setattr(self.pin_definition, 'unit', text)
+        )
         group_layout.addWidget(unit_value_line_edit, 2, 1)
 
         active_low_checkbox = QCheckBox('Active Low')
@@ -143,7 +149,9 @@ class HWFunction(QGroupBox):
         min_spinbox.setValue(self.pin_definition.value.min)
         # min_spinbox.setSingleStep(0.1)
         # min_spinbox.setDecimals(2)
-        # min_spinbox.valueChanged.connect(self.range_min_spinbox_handler)
+        min_spinbox.valueChanged.connect(
+            lambda value: setattr(self.pin_definition.value, 'min', value)
+        )
         group_layout.addWidget(min_spinbox, 0, 1)
         max_label = QLabel('Max:')
         max_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
@@ -153,7 +161,9 @@ class HWFunction(QGroupBox):
         max_spinbox.setValue(self.pin_definition.value.max)
         # max_spinbox.setSingleStep(0.1)
         # max_spinbox.setDecimals(2)
-        # max_spinbox.valueChanged.connect(self.range_max_spinbox_handler)
+        max_spinbox.valueChanged.connect(
+            lambda value: setattr(self.pin_definition.value, 'max', value)
+        )
         group_layout.addWidget(max_spinbox, 1, 1)
         initial_label = QLabel('Initial:')
         initial_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
@@ -163,7 +173,9 @@ class HWFunction(QGroupBox):
         initial_spinbox.setValue(self.pin_definition.value.initial)
         # initial_spinbox.setSingleStep(0.1)
         # initial_spinbox.setDecimals(2)
-        # initial_spinbox.valueChanged.connect(self.initial_value_spinbox_handler)
+        initial_spinbox.valueChanged.connect(
+            lambda value: setattr(self.pin_definition.value, 'initial', value)
+        )
         group_layout.addWidget(initial_spinbox, 2, 1)
         enable_initial_checkbox = QCheckBox('Enable initial value')
         enable_initial_checkbox.setChecked(self.pin_definition.value.enable_initial)
@@ -175,22 +187,29 @@ class HWFunction(QGroupBox):
         group = QGroupBox('Important GUI')
         group.setCheckable(True)
         group.setChecked(self.pin_definition.important_gui.display)
+        group.toggled.connect(
+            lambda value: setattr(self.pin_definition.important_gui, 'display', value)
+        )
         group_layout = QGridLayout()
         x_label = QLabel('column:')
         x_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
         group_layout.addWidget(x_label, 0, 0)
         x_spinbox = QSpinBox()
         x_spinbox.setValue(self.pin_definition.important_gui.column)
+        x_spinbox.valueChanged.connect(
+            lambda value: setattr(self.pin_definition.important_gui, 'column', value)
+        )
         x_spinbox.setRange(0, int_range[1])
-        # self.important_gui_x_spinbox.valueChanged.connect(self.important_gui_x_spinbox_handler)
         group_layout.addWidget(x_spinbox, 0, 1)
         y_label = QLabel('row:')
         y_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
         group_layout.addWidget(y_label, 1, 0)
         y_spinbox = QSpinBox()
         y_spinbox.setValue(self.pin_definition.important_gui.row)
+        y_spinbox.valueChanged.connect(
+            lambda value: setattr(self.pin_definition.important_gui, 'row', value)
+        )
         y_spinbox.setRange(0, int_range[1])
-        # self.important_gui_y_spinbox.valueChanged.connect(self.important_gui_y_spinbox_handler)
         group_layout.addWidget(y_spinbox, 1, 1)
         group.setLayout(group_layout)
         self.main_layout.addWidget(group, 0, 8)
@@ -248,7 +267,7 @@ class HWFunction(QGroupBox):
         group_layout.addWidget(warning_label, 1, 0)
         warning_spinbox = QDoubleSpinBox()
         warning_spinbox.setRange(float_range[0], float_range[1])
-        warning_spinbox.setValue(self.pin_definition.alarm.warning_value)
+        warning_spinbox.setValue(self.pin_definition.alarm.warning_value or 0.0)
         # warning_spinbox.setSingleStep(0.1)
         # warning_spinbox.setDecimals(2)
         # warning_spinbox.valueChanged.connect(self.alarm_warning_spinbox_handler)
@@ -258,7 +277,7 @@ class HWFunction(QGroupBox):
         group_layout.addWidget(interlock_label, 2, 0)
         interlock_spinbox = QDoubleSpinBox()
         interlock_spinbox.setRange(float_range[0], float_range[1])
-        interlock_spinbox.setValue(self.pin_definition.alarm.interlock_value)
+        interlock_spinbox.setValue(self.pin_definition.alarm.interlock_value or 0.0)
         # interlock_spinbox.setSingleStep(0.1)
         # interlock_spinbox.setDecimals(2)
         # interlock_spinbox.valueChanged.connect(self.alarm_interlock_spinbox_handler)
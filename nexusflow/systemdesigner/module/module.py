@@ -1,20 +1,93 @@
 import logging
-from dataclasses import dataclass
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from dataclasses import dataclass, field, fields
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal, Slot
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QTabWidget, QListWidget, QAbstractItemView
 
-from nexusflow.systemdesigner.excelimport import import_excel
+from nexusflow.systemdesigner.modulecache import ModuleCache, load_module
+from nexusflow.systemdesigner.tableexport import export_table
+from nexusflow.systemdesigner.modulefile import is_module_file, module_name, module_source, save_module_file, \
+    save_module_index, module_file_paths, module_file_name
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+from nexusflow.systemdesigner.module.addressmap import AddressMap, set_address_map
 from nexusflow.systemdesigner.module.hwfunction import HWFunction
 from nexusflow.systemdesigner.module.predefinedwidgetmanager import register_predefined_gui_component
+from nexusflow import router
 
 logging.basicConfig(level=logging.DEBUG)
 
+default_chunk_size = 10  # pin definitions added per event loop iteration, each HWFunction takes a few ms
+default_debounce = 500  # ms without further change events before a watched workbook is reloaded
+
+
+@dataclass(kw_only=True)
+class ModuleDiff:
+    added: List[str] = field(default_factory=list)  # pin ids
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    reordered: bool = False  # pins kept in both lists are in a different order
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed or self.reordered)
+
+    @property
+    def handles_changed(self) -> bool:
+        """ Pins are at other indexes, so channel handles of the module and the modules after it moved
+        """
+        return bool(self.added or self.removed or self.reordered)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed, " \
+               f"{self.unchanged} unchanged" + (", reordered" if self.reordered else "")
+
+
+def diff_pin_definitions(old: Sequence[PinDefinition], new: Sequence[PinDefinition]) -> ModuleDiff:
+    """ Compare two pin definition lists by pin id
+
+    :param old: The loaded pin definitions
+    :type old: Sequence[PinDefinition]
+    :param new: The pin definitions of the changed workbook
+    :type new: Sequence[PinDefinition]
+    ...
+    :return: Ids of the added, removed and changed pins and whether the kept pins moved
+    :rtype: ModuleDiff
+    """
+    old_by_id = {pin_definition.id: pin_definition for pin_definition in old}
+    new_ids = {pin_definition.id for pin_definition in new}
+    diff = ModuleDiff(removed=[pin_id for pin_id in old_by_id if pin_id not in new_ids])
+    diff.reordered = [pin_id for pin_id in old_by_id if pin_id in new_ids] != \
+        [pin_definition.id for pin_definition in new if pin_definition.id in old_by_id]
+    for pin_definition in new:
+        previous = old_by_id.get(pin_definition.id)
+        if previous is None:
+            diff.added.append(pin_definition.id)
+        elif previous != pin_definition:
+            diff.changed.append(pin_definition.id)
+        else:
+            diff.unchanged += 1
+    return diff
+
+
+def update_pin_definition(pin_definition: PinDefinition, new: PinDefinition) -> None:
+    """ Copy every field of new into pin_definition, GUI items holding pin_definition see the new values
+    """
+    for definition_field in fields(pin_definition):
+        setattr(pin_definition, definition_field.name, getattr(new, definition_field.name))
+
 
 class Module(QWidget):
-    def __init__(self, name: str):
+    def __init__(self, name: str, path: Optional[str] = None):
         self.name = name
+        self.path = path  # workbook the module was imported from
         self.pin_definitions = []
         super().__init__()
         self.main_layout = QHBoxLayout()
@@ -41,6 +114,54 @@ class Module(QWidget):
             self.pin_definitions.append(HWFunction(function))
             self.scroll_area_layout.addWidget(self.pin_definitions[-1])
 
+    def update_functions(self, module_data: List[PinDefinition]) -> ModuleDiff:
+        """ Bring the module in line with a re-imported pin list, rebuilding only what changed
+
+        Unchanged pins keep their HWFunction. Changed pins keep their PinDefinition object, which is updated
+        in place so GUI items built from it stay attached, and get a new HWFunction. Removed pins are
+        dropped, added pins are created, and the pins end up in the order of ``module_data``.
+
+        :param module_data: The pin definitions of the re-imported workbook
+        :type module_data: List[PinDefinition]
+        ...
+        :return: What was added, removed and changed
+        :rtype: ModuleDiff
+        """
+        functions = {function.pin_definition.id: function for function in self.pin_definitions}
+        previous = {pin_id: function.pin_definition for pin_id, function in functions.items()}
+        diff = diff_pin_definitions(list(previous.values()), module_data)
+        if not diff:
+            return diff
+
+        selected = {item.text() for item in self.hw_functions_list.selectedItems()}
+        for pin_id in diff.removed + diff.changed:
+            function = functions.pop(pin_id)
+            self.scroll_area_layout.removeWidget(function)
+            function.deleteLater()
+        changed = set(diff.changed)
+        updated = []
+        for pin_definition in module_data:
+            function = functions.get(pin_definition.id)
+            if function is None:
+                if pin_definition.id in changed:
+                    update_pin_definition(previous[pin_definition.id], pin_definition)
+                    pin_definition = previous[pin_definition.id]
+                function = HWFunction(pin_definition)
+            updated.append(function)
+
+        # The list items are cheap, rebuild them and the widget order instead of moving them one by one
+        self.hw_functions_list.blockSignals(True)
+        self.hw_functions_list.clear()
+        self.hw_functions_list.addItems([function.pin_definition.id for function in updated])
+        for row, function in enumerate(updated):
+            self.scroll_area_layout.insertWidget(row, function)
+            if function.pin_definition.id in selected:
+                self.hw_functions_list.item(row).setSelected(True)
+        self.hw_functions_list.blockSignals(False)
+        self.pin_definitions = updated
+        self.display_functions()
+        return diff
+
     def display_functions(self):
         for function in self.pin_definitions:
             function.hide()
@@ -51,29 +172,466 @@ class Module(QWidget):
 
 
 class ModuleManager(QTabWidget):
-    def __init__(self):
+    module_reloaded = Signal(object, object)
+
+    def __init__(self, cache_directory: Optional[Path] = None, watch: bool = False, cache: bool = True):
+        """ Tabs of the imported modules
+
+        Signals: ``module_reloaded(module, diff)`` after a loaded module was updated from its workbook.
+
+        :param cache_directory: Where parsed workbooks are cached, defaults to the user cache directory
+        :type cache_directory: Optional[Path]
+        :param watch: Reload the workbooks of the imported modules when they are saved
+        :type watch: bool
+        :param cache: Cache parsed workbooks, False parses every import
+        :type cache: bool
+        """
         super().__init__()
+        self.modules: List[Module] = []  # import order, handles must not change when tabs are moved
+        self.module_cache = ModuleCache(cache_directory) if cache else None
+        self.watcher = ModuleWatcher(self) if watch else None
         # self.setTabsClosable(True)
         # self.tabCloseRequested.connect(self.close_tab_handler)
         self.setMovable(True)
         self.setUsesScrollButtons(True)
         # self.setDocumentMode(True)
 
+    def load_pin_definitions(self, path: str) -> List[PinDefinition]:
+        """ Parse a module workbook, through the cache if there is one, safe to call from any thread
+        """
+        return load_module(path, self.module_cache)
+
     def import_functions(self, path: str) -> None:
-        """ Import a module from a path
+        """ Import a module from a workbook or a native module file, blocking until it is done
 
         :param path: The path to the module
         :type path: str
         """
-        module_data = import_excel(path)
-        new_module = Module(Path(path).stem)
-        new_module.import_functions(module_data)
+        new_module = Module(module_name(path), module_source(path))
+        new_module.import_functions(self.load_pin_definitions(path))
+        self.add_module(new_module)
+
+    def save_modules(self, directory: Path) -> List[Path]:
+        """ Save every module as a native module file, plus the module order
+
+        Opening the files with ``open_modules`` skips the workbook parser, the workbooks stay the source the
+        modules are re-imported and reloaded from.
+
+        :param directory: Where the module files are written, created if needed
+        :type directory: Path
+        ...
+        :return: The module files
+        :rtype: List[Path]
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for index, module in enumerate(self.modules):
+            # Workbooks of the same name from different folders give modules of the same name
+            paths.append(directory / module_file_name(index, module.name))
+            source = module.path if module.path is not None and not is_module_file(module.path) else None
+            save_module_file(paths[-1], module.name,
+                             [function.pin_definition for function in module.pin_definitions], source)
+        save_module_index(directory, [path.name for path in paths])
+        logging.debug(f"Saved {len(paths)} modules to {directory}")
+        return paths
+
+    def export_module(self, module: Module, path: str) -> None:
+        """ Write the pin definitions of a module, including the edits made in its HWFunctions, to a workbook
+
+        :param module: The module
+        :type module: Module
+        :param path: The .xlsx file to write
+        :type path: str
+        """
+        export_table(path, [function.pin_definition for function in module.pin_definitions], module.name)
+
+    def open_modules(self, directory: Path) -> 'BatchModuleImport':
+        """ Import the module files saved by ``save_modules`` in their saved order, without blocking the GUI
+
+        :return: The running import
+        :rtype: BatchModuleImport
+        """
+        return self.import_modules(module_file_paths(directory))
+
+    def find_module(self, name: str) -> Optional[Module]:
+        return next((module for module in self.modules if module.name == name), None)
+
+    def reimport_functions(self, path: str, module: Optional[Module] = None) -> ModuleDiff:
+        """ Re-import a changed workbook into its loaded module, only the changed pins are rebuilt
+
+        Channel handles stay the same unless pins are added, removed or reordered, in which case the pins
+        after them shift and a running acquisition has to be restarted, see ModuleDiff.handles_changed. A
+        workbook that is not loaded yet is imported.
+
+        :param path: The workbook
+        :type path: str
+        :param module: The module to update, defaults to the module named after the workbook
+        :type module: Optional[Module]
+        ...
+        :return: What was added, removed and changed
+        :rtype: ModuleDiff
+        """
+        module = module if module is not None else self.find_module(module_name(path))
+        pin_definitions = self.load_pin_definitions(path)
+        if module is None:
+            new_module = Module(module_name(path), module_source(path))
+            new_module.import_functions(pin_definitions)
+            self.add_module(new_module)
+            return ModuleDiff(added=[pin_definition.id for pin_definition in pin_definitions])
+        module.path = path
+        return self.apply_pin_definitions(module, pin_definitions)
+
+    def apply_pin_definitions(self, module: Module, pin_definitions: List[PinDefinition]) -> ModuleDiff:
+        """ Update a loaded module to a re-parsed pin list and emit ``module_reloaded`` if anything changed
+        """
+        diff = module.update_functions(pin_definitions)
+        if diff:
+            # Same module object, registering again keeps the predefined components pointing at it
+            register_predefined_gui_component(module.name, module)
+            register_predefined_gui_component(module.name+'-important', module)
+            set_address_map(AddressMap(self.get_pin_definitions()))
+            self.module_reloaded.emit(module, diff)
+        logging.info(f"Re-imported {module.path}: {diff}")
+        return diff
+
+    def import_functions_in_background(self, path: str, chunk_size: int = default_chunk_size) -> 'ModuleImport':
+        """ Import a module from a path without blocking the GUI thread
+
+        :param path: The path to the module
+        :type path: str
+        :param chunk_size: Pin definitions added to the module per event loop iteration
+        :type chunk_size: int
+        ...
+        :return: The running import, for progress and cancellation
+        :rtype: ModuleImport
+        """
+        module_import = ModuleImport(self, path, chunk_size)
+        module_import.start()
+        return module_import
+
+    def import_modules(self, paths: Sequence[str], max_workers: Optional[int] = None,
+                       chunk_size: int = default_chunk_size) -> 'BatchModuleImport':
+        """ Import many module workbooks, parsed in parallel worker processes
+
+        The modules are added in the order of ``paths`` so their channel handles do not depend on which
+        workbook is parsed first.
+
+        :param paths: The workbooks
+        :type paths: Sequence[str]
+        :param max_workers: Worker processes, defaults to one per core up to one per workbook
+        :type max_workers: Optional[int]
+        :param chunk_size: Pin definitions added to a module per event loop iteration
+        :type chunk_size: int
+        ...
+        :return: The running import
+        :rtype: BatchModuleImport
+        """
+        batch_import = BatchModuleImport(self, paths, max_workers, chunk_size)
+        batch_import.start()
+        return batch_import
+
+    def add_module(self, new_module: Module) -> None:
         register_predefined_gui_component(new_module.name, new_module)
         register_predefined_gui_component(new_module.name+'-important', new_module)
+        self.modules.append(new_module)
+        set_address_map(AddressMap(self.get_pin_definitions()))
         self.addTab(new_module, new_module.name)
+        if self.watcher is not None and new_module.path is not None and os.path.exists(new_module.path):
+            self.watcher.watch(new_module.path)
+
+    def get_pin_definitions(self) -> List[PinDefinition]:
+        """ Pin definitions of every module, in import order, the index of a pin is its channel handle
+
+        :return: The pin definitions
+        :rtype: List[PinDefinition]
+        """
+        pin_definitions = []
+        for module in self.modules:
+            pin_definitions.extend(function.pin_definition for function in module.pin_definitions)
+        return pin_definitions
 
     def get_default_gui_items(self):
         """ Get the default gui items for a module
         """
         for module_index in range(self.count()):
             print(self.widget(module_index))
+
+
+class ModuleWatcher(QObject):
+    parsed = Signal(str, int, object)
+
+    def __init__(self, module_manager: ModuleManager, debounce: int = default_debounce):
+        """ Reloads the workbooks of loaded modules when they are saved
+
+        Saving a workbook fires several change events, a reload starts once none arrived for ``debounce``
+        ms. The workbook is parsed on the thread pool through the module cache and only the changed pins are
+        applied to the module, see ModuleManager.apply_pin_definitions. A workbook that cannot be parsed,
+        e.g. because it is still being written, leaves the module as it is.
+
+        :param module_manager: Owner of the modules
+        :type module_manager: ModuleManager
+        :param debounce: Quiet time in ms before reloading
+        :type debounce: int
+        """
+        super().__init__(module_manager)
+        self.module_manager = module_manager
+        self.debounce = debounce
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.file_changed_handler)
+        self.timers: Dict[str, QTimer] = {}
+        self.generations: Dict[str, int] = {}  # latest reload per path, older results are dropped
+        self.parsed.connect(self.parsed_handler)
+
+    def watch(self, path: str) -> None:
+        path = str(Path(path).resolve())
+        if path in self.timers:
+            return
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(self.debounce)
+        timer.timeout.connect(partial(self.reload, path))
+        self.timers[path] = timer
+        self.generations[path] = 0
+        if not self.watcher.addPath(path):
+            logging.warning(f"Cannot watch {path}")
+
+    def unwatch(self, path: str) -> None:
+        path = str(Path(path).resolve())
+        timer = self.timers.pop(path, None)
+        if timer is None:
+            return
+        timer.stop()
+        timer.deleteLater()
+        self.generations.pop(path)
+        self.watcher.removePath(path)
+
+    def paths(self) -> List[str]:
+        return list(self.timers.keys())
+
+    @Slot(str)
+    def file_changed_handler(self, path: str):
+        timer = self.timers.get(path)
+        if timer is None:
+            return
+        # Saving by writing a new file and renaming it over the old one ends the watch, start it again
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+        timer.start()
+
+    def reload(self, path: str) -> None:
+        if path not in self.generations or not os.path.exists(path):
+            return
+        self.generations[path] += 1
+        router.get_thread_pool().submit(self.parse, path, self.generations[path])
+
+    def parse(self, path: str, generation: int) -> None:
+        # Thread pool, the signal is queued to the GUI thread
+        try:
+            pin_definitions = self.module_manager.load_pin_definitions(path)
+        except Exception:
+            logging.warning(f"Reloading {path} failed, the module is left unchanged", exc_info=True)
+            return
+        self.parsed.emit(path, generation, pin_definitions)
+
+    @Slot(str, int, object)
+    def parsed_handler(self, path: str, generation: int, pin_definitions: List[PinDefinition]):
+        if self.generations.get(path) != generation:
+            return
+        module = next((module for module in self.module_manager.modules
+                       if module.path is not None and str(Path(module.path).resolve()) == path), None)
+        if module is not None:
+            self.module_manager.apply_pin_definitions(module, pin_definitions)
+
+
+class ModuleImport(QObject):
+    parsed = Signal(int)
+    chunk_parsed = Signal(object)
+    failed = Signal(str)
+    progress = Signal(int, int)
+    finished = Signal(object)
+
+    def __init__(self, module_manager: ModuleManager, path: str, chunk_size: int = default_chunk_size,
+                 loader: Optional[Callable[[], List[PinDefinition]]] = None):
+        """ Parses a module workbook on the thread pool and fills a new Module chunk by chunk
+
+        The worker sends the pin definitions back in chunks, the GUI thread adds one chunk per event loop
+        iteration so the window keeps repainting. The module is only added to the manager, and so gets its
+        channel handles, once it is complete.
+
+        Signals: ``progress(done, total)``, ``finished(module)`` with None if cancelled, ``failed(message)``.
+
+        :param loader: Returns the pin definitions, called on the thread pool, defaults to parsing ``path``
+        :type loader: Optional[Callable[[], List[PinDefinition]]]
+        """
+        super().__init__()
+        self.module_manager = module_manager
+        self.path = path
+        self.loader = loader if loader is not None else partial(module_manager.load_pin_definitions, path)
+        self.chunk_size = chunk_size
+        self.module = Module(module_name(path), module_source(path))
+        self.cancelled = threading.Event()
+        self.pending = deque()
+        self.total = None
+        self.done = 0
+        self.running = True
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.populate)
+        self.parsed.connect(self.parsed_handler)
+        self.chunk_parsed.connect(self.chunk_parsed_handler)
+        self.failed.connect(self.failed_handler)
+
+    def start(self) -> None:
+        router.get_thread_pool().submit(self.parse)
+
+    def parse(self) -> None:
+        # Thread pool, the signals are queued to the GUI thread
+        try:
+            pin_definitions = self.loader()
+        except Exception as error:
+            logging.exception(f"Importing {self.path} failed")
+            self.failed.emit(str(error))
+            return
+        self.parsed.emit(len(pin_definitions))
+        for start in range(0, len(pin_definitions), self.chunk_size):
+            if self.cancelled.is_set():
+                return
+            self.chunk_parsed.emit(pin_definitions[start:start + self.chunk_size])
+
+    @Slot(int)
+    def parsed_handler(self, total: int):
+        self.total = total
+        if total == 0 and not self.cancelled.is_set():
+            self.complete()
+
+    @Slot(str)
+    def failed_handler(self, message: str):
+        self.running = False
+        self.module.deleteLater()
+
+    @Slot(object)
+    def chunk_parsed_handler(self, chunk: List[PinDefinition]):
+        if self.cancelled.is_set():
+            return
+        self.pending.append(chunk)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    @Slot()
+    def populate(self):
+        if not self.pending:
+            self.timer.stop()
+            return
+        chunk = self.pending.popleft()
+        try:
+            self.module.import_functions(chunk)
+        except Exception as error:
+            # Without this the timer would keep firing and the import would never finish
+            logging.exception(f"Importing {self.path} failed after {self.done} pin definitions")
+            self.cancelled.set()
+            self.timer.stop()
+            self.pending.clear()
+            self.failed.emit(str(error))
+            return
+        self.done += len(chunk)
+        self.progress.emit(self.done, self.total)
+        if self.done >= self.total:
+            self.complete()
+
+    def complete(self) -> None:
+        self.running = False
+        self.timer.stop()
+        self.module_manager.add_module(self.module)
+        logging.debug(f"Imported {self.done} pin definitions from {self.path}")
+        self.finished.emit(self.module)
+
+    def cancel(self) -> None:
+        """ Stop the import, the partly filled module is discarded
+        """
+        if not self.running:
+            return
+        self.running = False
+        self.cancelled.set()
+        self.timer.stop()
+        self.pending.clear()
+        self.module.deleteLater()
+        logging.info(f"Import of {self.path} cancelled after {self.done} pin definitions")
+        self.finished.emit(None)
+
+
+class BatchModuleImport(QObject):
+    progress = Signal(int, int)
+    finished = Signal(object)
+
+    def __init__(self, module_manager: ModuleManager, paths: Sequence[str], max_workers: Optional[int] = None,
+                 chunk_size: int = default_chunk_size):
+        """ Parses many workbooks in a process pool, then fills their modules one after the other
+
+        Signals: ``progress(imported, total)`` after every workbook, ``finished(modules)`` with the imported
+        modules once all are done or the import is cancelled. A failing workbook is logged and skipped.
+        """
+        super().__init__()
+        self.module_manager = module_manager
+        self.paths = list(paths)
+        self.max_workers = max_workers or max(1, min(len(self.paths), os.cpu_count() or 1))
+        self.chunk_size = chunk_size
+        self.futures: List[Optional[Future]] = []  # None for module files, they are read on the thread pool
+        self.current: Optional[ModuleImport] = None
+        self.index = 0
+        self.modules: List[Module] = []
+        self.running = True
+
+    def start(self) -> None:
+        self.futures = [None] * len(self.paths)
+        workbooks = [index for index, path in enumerate(self.paths) if not is_module_file(path)]
+        if workbooks:
+            # Forking the multi-threaded GUI process is unsafe, start clean interpreters like ControllerProcessHost
+            executor = ProcessPoolExecutor(max_workers=min(self.max_workers, len(workbooks)),
+                                           mp_context=multiprocessing.get_context('spawn'))
+            for index in workbooks:
+                self.futures[index] = executor.submit(load_module, self.paths[index], self.module_manager.module_cache)
+            # Queued workbooks are still parsed, the worker processes exit once they are done
+            executor.shutdown(wait=False)
+        self.import_next()
+
+    def import_next(self) -> None:
+        if not self.running:
+            return
+        if self.index >= len(self.paths):
+            self.running = False
+            logging.debug(f"Imported {len(self.modules)} of {len(self.paths)} modules")
+            self.finished.emit(self.modules)
+            return
+        future = self.futures[self.index]
+        self.current = ModuleImport(self.module_manager, self.paths[self.index], self.chunk_size,
+                                    loader=future.result if future is not None else None)
+        self.current.finished.connect(self.module_finished_handler)
+        self.current.failed.connect(self.module_failed_handler)
+        self.current.start()
+
+    @Slot(object)
+    def module_finished_handler(self, module: Optional[Module]):
+        if module is not None:
+            self.modules.append(module)
+        self.index += 1
+        self.progress.emit(self.index, len(self.paths))
+        self.import_next()
+
+    @Slot(str)
+    def module_failed_handler(self, message: str):
+        logging.error(f"Skipping module {self.paths[self.index]}: {message}")
+        self.module_finished_handler(None)
+
+    def cancel(self) -> None:
+        """ Stop after discarding the module being filled, modules already added stay
+        """
+        if not self.running:
+            return
+        self.running = False
+        for future in self.futures:
+            if future is not None:
+                future.cancel()
+        if self.current is not None:
+            self.current.cancel()
+        self.finished.emit(self.modules)
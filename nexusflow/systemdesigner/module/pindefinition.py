@@ -13,14 +13,10 @@ class Miscellaneous:
 class Alarm:
     enable: bool
     above: int  # 0 = below, 1 = above
-    warning_value: float
-    interlock_value: float
-
-    def __post_init__(self):
-        if self.warning_value is None:
-            self.warning_value = 0.0
-        if self.interlock_value is None:
-            self.interlock_value = 0.0
+    warning_value: Optional[float]  # None if the cell is empty, the level is never reached
+    interlock_value: Optional[float]
+    hysteresis: float = 0.0
+    debounce: int = 0  # consecutive samples a new level has to persist before it is reported
 
 
 @dataclass(kw_only=True)
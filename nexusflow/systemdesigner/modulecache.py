@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from nexusflow.systemdesigner.excelimport import importer_version
+from nexusflow.systemdesigner.tableimport import import_excel_table
+from nexusflow.systemdesigner.modulefile import is_module_file, load_module_file, save_module_file, \
+    module_file_suffix
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+
+logging.basicConfig(level=logging.DEBUG)
+
+hash_block_size = 1 << 20
+
+
+def user_cache_directory() -> Path:
+    """ Module cache directory of the current user, outside of any system directory
+    """
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+    elif sys.platform == 'darwin':
+        base = Path.home() / 'Library' / 'Caches'
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'nexusflow' / 'modules'
+
+
+def importer_name(importer: Callable) -> str:
+    """ File name safe name of an importer, part of every cache key
+    """
+    name = f"{getattr(importer, '__module__', '')}.{getattr(importer, '__qualname__', type(importer).__name__)}"
+    return re.sub(r'[^\w.]+', '_', name)
+
+
+def content_hash(path: Path | str) -> str:
+    """ SHA-256 of a file's content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while block := file.read(hash_block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModuleCache:
+    def __init__(self, directory: Optional[Path | str] = None, version: int = importer_version):
+        """ Parsed pin definitions of imported workbooks, keyed by the workbook content, importer and version
+
+        Entries are module files (JSON lines, see modulefile), loading one takes milliseconds where parsing
+        the workbook with openpyxl takes seconds, and reading one never runs code from the file. Renaming or
+        moving a workbook keeps its entry, changing it or changing the importer (bump ``importer_version``)
+        does not.
+
+        :param directory: Cache directory, created on first store, defaults to the user cache directory
+        :type directory: Optional[Path | str]
+        :param version: Importer version, part of every key
+        :type version: int
+        """
+        self.directory = Path(directory) if directory is not None else user_cache_directory()
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, digest: str, importer: Callable = import_excel_table) -> Path:
+        return self.directory / f'{digest}-{importer_name(importer)}-v{self.version}{module_file_suffix}'
+
+    def load(self, digest: str, importer: Callable = import_excel_table) -> Optional[List[PinDefinition]]:
+        """ Cached pin definitions of a workbook hash, None if there are none or the entry is unreadable
+        """
+        path = self.entry_path(digest, importer)
+        if not path.exists():
+            return None
+        try:
+            return load_module_file(path).pin_definitions
+        except Exception:
+            logging.warning(f"Module cache entry {path} is unreadable, the workbook is parsed again", exc_info=True)
+            return None
+
+    def store(self, digest: str, pin_definitions: List[PinDefinition], importer: Callable = import_excel_table
+              ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Atomic, a concurrent reader sees the old entry or the complete new one
+        save_module_file(self.entry_path(digest, importer), digest, pin_definitions)
+
+    def import_module(self, path: Path | str, importer: Callable[[Path | str], List[PinDefinition]] = import_excel_table
+                      ) -> List[PinDefinition]:
+        """ Pin definitions of a workbook, parsed only if the cache has no entry for its content
+
+        :param path: The workbook
+        :type path: Path | str
+        :param importer: Parser used on a cache miss
+        :type importer: Callable[[Path | str], List[PinDefinition]]
+        ...
+        :return: The pin definitions
+        :rtype: List[PinDefinition]
+        """
+        digest = content_hash(path)
+        pin_definitions = self.load(digest, importer)
+        if pin_definitions is not None:
+            self.hits += 1
+            logging.debug(f"Module {path} loaded from the cache")
+            return pin_definitions
+        self.misses += 1
+        pin_definitions = importer(path)
+        try:
+            self.store(digest, pin_definitions, importer)
+        except OSError:
+            logging.warning(f"Could not cache module {path}", exc_info=True)
+        return pin_definitions
+
+    def clear(self) -> int:
+        """ Remove every entry
+
+        :return: Number of removed entries
+        :rtype: int
+        """
+        removed = 0
+        if self.directory.exists():
+            for path in self.directory.glob(f'*{module_file_suffix}'):
+                path.unlink()
+                removed += 1
+        return removed
+
+
+def load_module(path: Path | str, cache: Optional[ModuleCache] = None) -> List[PinDefinition]:
+    """ Pin definitions of a module workbook, through the cache if given, or of a native module file
+
+    Module level and free of Qt so it can run in a worker process.
+    """
+    if is_module_file(path):
+        return load_module_file(path).pin_definitions
+    if cache is not None:
+        return cache.import_module(path)
+    return import_excel_table(path)
@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition, ConversionCoefficients, Gui, Value, \
+    Miscellaneous, Exponential, Alarm
+
+module_file_format = 'nexusflow-module'
+module_file_version = 1
+module_file_suffix = '.nfmod'
+module_index_name = 'modules.json'
+
+# Nested dataclass of every PinDefinition field that holds one
+nested_fields = {
+    'main_gui': Gui,
+    'important_gui': Gui,
+    'value': Value,
+    'miscellaneous': Miscellaneous,
+    'conversion_coefficients': ConversionCoefficients,
+    'exponential': Exponential,
+    'alarm': Alarm
+}
+
+
+@dataclass(kw_only=True)
+class ModuleFile:
+    name: str
+    source: Optional[str] = None  # workbook the pin definitions were imported from
+    pin_definitions: List[PinDefinition] = field(default_factory=list)
+
+
+def is_module_file(path: Path | str) -> bool:
+    return Path(path).suffix == module_file_suffix
+
+
+def save_module_file(path: Path | str, name: str, pin_definitions: Sequence[PinDefinition],
+                     source: Optional[str] = None) -> None:
+    """ Write pin definitions as a native module file
+
+    JSON lines: a header with format, version, module name, source workbook and pin count, then one
+    PinDefinition per line. The file is replaced atomically.
+
+    :param path: The module file
+    :type path: Path | str
+    :param name: Module name
+    :type name: str
+    :param pin_definitions: The pin definitions, in channel handle order
+    :type pin_definitions: Sequence[PinDefinition]
+    :param source: Workbook the module was imported from
+    :type source: Optional[str]
+    """
+    path = Path(path)
+    header = {'format': module_file_format, 'version': module_file_version, 'name': name, 'source': source,
+              'pins': len(pin_definitions)}
+    # A unique temporary file per call, threads of one process may save the same module at the same time
+    descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(header) + '\n')
+            for pin_definition in pin_definitions:
+                file.write(json.dumps(asdict(pin_definition)) + '\n')
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def read_header(file) -> dict:
+    header = json.loads(file.readline() or '{}')
+    if header.get('format') != module_file_format:
+        raise ValueError(f"{file.name} is not a module file")
+    if header.get('version') != module_file_version:
+        raise ValueError(f"{file.name} has module file version {header.get('version')}, "
+                         f"expected {module_file_version}")
+    return header
+
+
+def load_module_file(path: Path | str) -> ModuleFile:
+    """ Read a native module file
+
+    :param path: The module file
+    :type path: Path | str
+    ...
+    :raises ValueError: If the file is not a module file, has another version or is truncated
+    ...
+    :return: Name, source workbook and pin definitions
+    :rtype: ModuleFile
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        header = read_header(file)
+        pin_definitions = []
+        for line in file:
+            values = json.loads(line)
+            for name, nested_type in nested_fields.items():
+                if values.get(name) is not None:
+                    values[name] = nested_type(**values[name])
+            pin_definitions.append(PinDefinition(**values))
+    if len(pin_definitions) != header['pins']:
+        raise ValueError(f"{path} holds {len(pin_definitions)} of {header['pins']} pin definitions")
+    return ModuleFile(name=header['name'], source=header['source'], pin_definitions=pin_definitions)
+
+
+def module_name(path: Path | str) -> str:
+    """ Name of the module in a file: from the header of a module file, the file name of a workbook
+    """
+    if is_module_file(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return read_header(file)['name']
+    return Path(path).stem
+
+
+def module_file_name(index: int, name: str) -> str:
+    """ File name of the index-th module of a system, unique even if several modules share a name
+    """
+    return f'{index:03d}-{name}{module_file_suffix}'
+
+
+def module_source(path: Path | str) -> str:
+    """ The file to reload a module from: the source workbook of a module file if it still exists, else path
+    """
+    if is_module_file(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            source = read_header(file)['source']
+        if source is not None and os.path.exists(source):
+            return source
+    return str(path)
+
+
+def save_module_index(directory: Path | str, file_names: Sequence[str]) -> None:
+    """ Write the module order of a directory of module files, which fixes the channel handles
+
+    Module files of the directory that are not in the index, left over from earlier saves, are removed.
+    """
+    directory = Path(directory)
+    with open(directory / module_index_name, 'w', encoding='utf-8') as file:
+        json.dump({'version': module_file_version, 'modules': list(file_names)}, file)
+    for path in directory.glob(f'*{module_file_suffix}'):
+        if path.name not in file_names:
+            path.unlink()
+
+
+def module_file_paths(directory: Path | str) -> List[str]:
+    """ The module files of a directory in their saved order, empty if there is no index
+    """
+    index_path = Path(directory) / module_index_name
+    if not index_path.exists():
+        return []
+    with open(index_path, 'r', encoding='utf-8') as file:
+        index = json.load(file)
+    return [str(Path(directory) / file_name) for file_name in index['modules']]
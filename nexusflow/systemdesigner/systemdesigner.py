@@ -1,27 +1,48 @@
 import json
 import logging
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, List, Optional
 
-from PySide6.QtCore import Qt, QObject
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import QWidget, QGridLayout, QLabel, QPushButton, QGroupBox, QDialog, QPlainTextEdit, \
-    QComboBox, QVBoxLayout, QHBoxLayout
+    QComboBox, QVBoxLayout, QHBoxLayout, QProgressDialog, QFileDialog, QCheckBox
 
 from nexusflow.settingsdialog import SettingsDialog
-from nexusflow.systemdesigner.module.module import ModuleManager
-from nexusflow.utils import str_to_datatype
+from nexusflow.systemdesigner.module.module import Module, ModuleDiff, ModuleManager
+from nexusflow.utils import str_to_datatype, string_uuid
 from nexusflow.systemdesigner.module.predefinedwidgetmanager import register_predefined_gui_component
 from nexusflow.systemdesigner.controllers.okfpga import OKFPGAController
+from nexusflow.systemdesigner.controllers.simulated import SimulatedFPGAController
+from nexusflow.systemdesigner.controllers.processhost import ControllerProcessHost
+from nexusflow.systemdesigner.controllers.controllermanager import ControllerManager
+from nexusflow.systemdesigner.acquisition import AcquisitionScheduler
+from nexusflow.systemdesigner.conversion import ConversionEngine
+from nexusflow.systemdesigner.alarms import AlarmEngine
+from nexusflow.messages import SampleBlock
+from nexusflow.history import HistoryStore
+from nexusflow.timeseries import SessionRecorder, SessionReader, new_session_path, list_sessions
+from nexusflow import router
 
 logging.basicConfig(level=logging.DEBUG)
 
+controller_types = {
+    "Opal Kelly FPGA": OKFPGAController,
+    "Simulated FPGA": SimulatedFPGAController
+}
+
 data = {
     'description': {
         "type": 'str',
         "display": True,
         "editable": True,
         "value": ""
+    },
+    'watch_modules': {
+        "type": 'bool',
+        "display": False,
+        "editable": True,
+        "value": True
     }
 }
 
@@ -64,6 +85,13 @@ class System(QWidget):
         self.path = path
         self.version = version
         self.controllers = {}
+        self.controller_manager = ControllerManager()
+        self.acquisition = None
+        self.conversion = None
+        self.alarms = None
+        self.history = None
+        self.recorder = None
+        self.module_imports = []
 
         if new:
             self.data = data
@@ -81,7 +109,13 @@ class System(QWidget):
         self.bold_font.setBold(True)
         self.main_layout = QVBoxLayout()
         self.top_bar()
-        self.module_manager = ModuleManager()
+        # The cache lives in the user cache directory, not in the system directory other people may share.
+        # Systems saved before the setting existed reload their workbooks on save, like new ones.
+        watch_modules = self.data.get('watch_modules', data['watch_modules'])['value']
+        self.module_manager = ModuleManager(watch=watch_modules)
+        self.module_manager.module_reloaded.connect(self.module_reloaded_handler)
+        if not new:
+            self.module_imports.append(self.module_manager.open_modules(self.path / self.version / 'modules'))
         self.main_layout.addWidget(self.module_manager)
         self.setLayout(self.main_layout)
 
@@ -126,20 +160,183 @@ class System(QWidget):
     def controller_group(self) -> QGroupBox:
         group = QGroupBox("Hardware Controllers")
         group_layout = QGridLayout()
-        controller_selection_combo = QComboBox()
-        controller = OKFPGAController()
-        self.controllers[controller.name] = controller
-        register_predefined_gui_component(controller.name, self.controllers[controller.name])
+        self.controller_selection_combo = QComboBox()
+        self.add_controller(OKFPGAController())
 
-        controller_selection_combo.addItem("Opal Kelly FPGA")
-        group_layout.addWidget(controller_selection_combo, 0, 0)
+        self.controller_selection_combo.addItems(list(controller_types.keys()))
+        group_layout.addWidget(self.controller_selection_combo, 0, 0)
         add_controller_button = QPushButton("Add")
+        add_controller_button.clicked.connect(self.add_controller_button_handler)
         group_layout.addWidget(add_controller_button, 0, 1)
+        self.separate_process_check_box = QCheckBox("Separate process")
+        group_layout.addWidget(self.separate_process_check_box, 1, 0)
         controller_settings_button = QPushButton("Settings")
         group_layout.addWidget(controller_settings_button, 1, 1)
+        self.record_button = QPushButton("Record")
+        self.record_button.setCheckable(True)
+        self.record_button.toggled.connect(self.record_button_handler)
+        group_layout.addWidget(self.record_button, 2, 0)
+        self.recording_label = QLabel()
+        group_layout.addWidget(self.recording_label, 2, 1)
+        self.recording_timer = QTimer(self)
+        self.recording_timer.setInterval(1000)
+        self.recording_timer.timeout.connect(self.update_recording_label)
         group.setLayout(group_layout)
         return group
 
+    def record_button_handler(self, checked: bool):
+        if not checked:
+            self.stop_recording()
+            return
+        if not self.module_manager.get_pin_definitions():
+            logging.warning("Import a module before recording")
+            self.record_button.setChecked(False)
+            return
+        self.start_recording()
+
+    def update_recording_label(self, recorder: Optional[SessionRecorder] = None):
+        recorder = recorder or self.recorder
+        if recorder is None:
+            return
+        text = f"{recorder.recorded_samples} samples"
+        if recorder.dropped_blocks:
+            # The disk could not keep up even with backpressure, the recording has gaps
+            text += f", {recorder.dropped_blocks} blocks dropped"
+            self.recording_label.setStyleSheet('color: red')
+        self.recording_label.setText(text)
+
+    def add_controller(self, controller: OKFPGAController, active: bool = False) -> str:
+        """ Add an FPGA board to the rack, every board runs its hardware calls on its own thread
+
+        :param controller: The controller
+        :type controller: OKFPGAController
+        :param active: Route the 'fpga' topics of the GUI components to this board
+        :type active: bool
+        ...
+        :return: The key of the board, its serial number or UUID
+        :rtype: str
+        """
+        key = self.controller_manager.add(controller, active)
+        self.controllers[key] = controller
+        register_predefined_gui_component(controller.name, controller)
+        logging.debug(f"Controller {controller.name} ({key}) on topic {controller.topic}")
+        return key
+
+    def add_controller_button_handler(self):
+        controller_type = controller_types[self.controller_selection_combo.currentText()]
+        if self.separate_process_check_box.isChecked():
+            if not self.module_manager.get_pin_definitions():
+                logging.warning("Import a module before starting a controller in a separate process")
+                return
+            self.host_controller_in_process(controller_type)
+            return
+        # The board picked by the user is the one the Connect buttons and pin widgets talk to
+        self.add_controller(controller_type(), active=True)
+
+    def host_controller_in_process(self, controller_factory: callable,
+                                   rates: Optional[Dict[str, float]] = None) -> ControllerProcessHost:
+        """ Run a controller in a child process instead of the GUI process and acquire its inputs
+
+        The child process addresses channels by the handles of the imported modules, the acquisition reads
+        them from the shared channel table, so samples go through conversion, alarms, history and recording
+        like those of a board in this process. Channel writes go to 'board/<key>/channel/<handle>'.
+
+        :param controller_factory: Picklable callable creating the controller inside the child process, e.g.
+            SimulatedFPGAController
+        :type controller_factory: callable
+        :param rates: Rate in Hz per pin function, see start_acquisition
+        :type rates: Optional[Dict[str, float]]
+        ...
+        :return: The started process host
+        :rtype: ControllerProcessHost
+        """
+        key = string_uuid()
+        host = ControllerProcessHost(ControllerManager.board_topic(key), controller_factory,
+                                     self.module_manager.get_pin_definitions())
+        host.start()
+        self.controllers[key] = host
+        self.start_acquisition(host.read_channels, rates)
+        return host
+
+    def start_acquisition(self, read_channels: callable,
+                          rates: Optional[Dict[str, float]] = None) -> AcquisitionScheduler:
+        """ Start polling every ADC and DIG_IN pin of the imported modules
+
+        Raw blocks are converted to engineering units, checked for alarms and added to the history on the
+        acquisition thread before they are published. Channel handles are the indexes of the pin definitions returned by
+        ModuleManager.get_pin_definitions.
+
+        :param read_channels: Bulk read of a controller, returns one value per handle
+        :type read_channels: callable
+        :param rates: Rate in Hz per pin function, defaults to the scheduler defaults
+        :type rates: Optional[Dict[str, float]]
+        ...
+        :return: The running scheduler
+        :rtype: AcquisitionScheduler
+        """
+        self.stop_acquisition()
+        pin_definitions = self.module_manager.get_pin_definitions()
+        self.conversion = ConversionEngine(pin_definitions)
+        self.alarms = AlarmEngine(pin_definitions)
+        self.history = HistoryStore(len(pin_definitions))
+        self.acquisition = AcquisitionScheduler(read_channels, publish=self.process_raw_samples)
+        self.acquisition.add_pin_definitions(pin_definitions, rates=rates)
+        self.acquisition.start()
+        return self.acquisition
+
+    def process_raw_samples(self, block: SampleBlock) -> None:
+        converted = self.conversion.convert_block(block)
+        self.alarms.evaluate(converted)
+        self.history.append(converted)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(converted)
+        router.publish_samples(converted)
+
+    def stop_acquisition(self) -> None:
+        if self.acquisition is not None:
+            self.acquisition.stop()
+            self.acquisition = None
+
+    def start_recording(self) -> SessionRecorder:
+        """ Record the converted samples to a new session in the version directory
+
+        :return: The running recorder
+        :rtype: SessionRecorder
+        """
+        self.stop_recording()
+        pin_definitions = self.module_manager.get_pin_definitions()
+        recorder = SessionRecorder(new_session_path(self.path / self.version),
+                                   channel_ids=[pin_definition.id for pin_definition in pin_definitions])
+        recorder.start()
+        self.recorder = recorder
+        self.recording_label.setStyleSheet('')
+        self.recording_timer.start()
+        return recorder
+
+    def stop_recording(self) -> None:
+        recorder, self.recorder = self.recorder, None
+        self.recording_timer.stop()
+        if recorder is not None:
+            recorder.stop()
+            # Final counts, the writer has drained the queue once stop returns
+            self.update_recording_label(recorder)
+
+    def open_recordings(self) -> List[SessionReader]:
+        """ Readers for the recorded sessions of this version, oldest first
+        """
+        return [SessionReader(path) for path in list_sessions(self.path / self.version)]
+
+    def close_controllers(self) -> None:
+        """ Stop the acquisition, the recording, the FPGA boards and every controller running in a child process
+        """
+        self.stop_acquisition()
+        self.stop_recording()
+        self.controller_manager.close()
+        for controller in self.controllers.values():
+            if isinstance(controller, ControllerProcessHost):
+                controller.stop()
+
     def module_controls_group(self) -> QGroupBox:
         group = QGroupBox('Module')
         group_layout = QGridLayout()
@@ -150,6 +347,15 @@ class System(QWidget):
         import_button = QPushButton("Import .xlsx")
         import_button.clicked.connect(self.import_module_button_handler)
         group_layout.addWidget(import_button, 1, 0)
+        import_many_button = QPushButton("Import many")
+        import_many_button.clicked.connect(self.import_modules_button_handler)
+        group_layout.addWidget(import_many_button, 1, 1)
+        reimport_button = QPushButton("Re-import")
+        reimport_button.clicked.connect(self.reimport_module_button_handler)
+        group_layout.addWidget(reimport_button, 2, 1)
+        export_button = QPushButton("Export .xlsx")
+        export_button.clicked.connect(self.export_module_button_handler)
+        group_layout.addWidget(export_button, 0, 1)
         remove_button = QPushButton("Remove")
         # remove_button.clicked.connect(self.import_module_button_handler)
         group_layout.addWidget(remove_button, 2, 0)
@@ -170,6 +376,7 @@ class System(QWidget):
         logging.debug(f"Saving system to {self.path}")
         with open(self.path / 'system.json', 'w') as f:
             f.write(json.dumps(self.data))
+        self.module_manager.save_modules(self.path / self.version / 'modules')
 
     def set_data_value(self, key: str, value: Any) -> None:
         """ Set a value in the system data
@@ -224,4 +431,61 @@ class System(QWidget):
         }
         dialog = SettingsDialog(settings)
         if dialog.exec() == QDialog.Accepted:
-            self.module_manager.import_functions(dialog.settings['Import from']['value'])
+            path = dialog.settings['Import from']['value']
+            progress_dialog = QProgressDialog(f"Importing {Path(path).name}", "Cancel", 0, 0, self)
+            progress_dialog.setWindowTitle("Import module")
+            progress_dialog.setMinimumDuration(300)
+            module_import = self.module_manager.import_functions_in_background(path)
+            module_import.progress.connect(lambda done, total: (progress_dialog.setMaximum(total),
+                                                                progress_dialog.setValue(done)))
+            module_import.finished.connect(lambda module: self.module_import_finished(progress_dialog))
+            module_import.failed.connect(lambda message: self.module_import_finished(progress_dialog))
+            progress_dialog.canceled.connect(module_import.cancel)
+            self.module_imports.append(module_import)
+
+    def import_modules_button_handler(self):
+        paths, _ = QFileDialog.getOpenFileNames(self, "Import modules", "", "Excel (*.xlsx *.xlsm)")
+        if not paths:
+            return
+        progress_dialog = QProgressDialog(f"Importing {len(paths)} modules", "Cancel", 0, len(paths), self)
+        progress_dialog.setWindowTitle("Import modules")
+        progress_dialog.setMinimumDuration(300)
+        batch_import = self.module_manager.import_modules(paths)
+        batch_import.progress.connect(lambda done, total: progress_dialog.setValue(done))
+        batch_import.finished.connect(lambda modules: self.module_import_finished(progress_dialog))
+        progress_dialog.canceled.connect(batch_import.cancel)
+        self.module_imports.append(batch_import)
+
+    def reimport_module_button_handler(self):
+        module = self.module_manager.currentWidget()
+        if module is None or module.path is None:
+            return
+        self.module_manager.reimport_functions(module.path, module)
+
+    def export_module_button_handler(self):
+        module = self.module_manager.currentWidget()
+        if module is None:
+            return
+        directory = Path(module.path).parent if module.path is not None else self.path
+        path, _ = QFileDialog.getSaveFileName(self, "Export module", str(directory / f'{module.name}.xlsx'),
+                                              "Excel (*.xlsx)")
+        if path:
+            self.module_manager.export_module(module, path)
+
+    def module_reloaded_handler(self, module: Module, diff: ModuleDiff):
+        if self.acquisition is None:
+            return
+        if diff.handles_changed:
+            logging.warning(f"Pins of {module.name} were added, removed or reordered, restart the acquisition to "
+                            f"use the new channel handles")
+            return
+        # Handles are unchanged: a new conversion engine picks up the coefficients from the next block, the
+        # alarm engine keeps the current levels and debounce counters and only takes the new limits
+        pin_definitions = self.module_manager.get_pin_definitions()
+        self.conversion = ConversionEngine(pin_definitions)
+        self.alarms.update_thresholds(pin_definitions)
+
+    def module_import_finished(self, progress_dialog: QProgressDialog):
+        progress_dialog.reset()
+        progress_dialog.deleteLater()
+        self.module_imports = [module_import for module_import in self.module_imports if module_import.running]
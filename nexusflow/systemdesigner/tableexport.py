@@ -0,0 +1,135 @@
+import io
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, List, Sequence
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from nexusflow.systemdesigner.tableimport import columns, header_rows, first_column
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition
+
+logging.basicConfig(level=logging.DEBUG)
+
+row_width = first_column + max(position for _, position in columns.values()) + 1
+column_letters = [get_column_letter(column + 1) for column in range(row_width)]
+sheet_part = 'xl/worksheets/sheet1.xml'
+sheet_namespace = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def header_row() -> List[Any]:
+    """ The last header row, every field named by its first accepted header name at its default column
+    """
+    row = [None] * row_width
+    for name, (aliases, position) in columns.items():
+        row[first_column + position] = aliases[0]
+    return row
+
+
+def table_row(pin_definition: PinDefinition) -> List[Any]:
+    """ The sheet row of a pin definition, the inverse of tableimport.import_table
+    """
+    exponential = pin_definition.exponential
+    alarm = pin_definition.alarm
+    values = {
+        'id': pin_definition.id,
+        'function': pin_definition.function,
+        'name': pin_definition.name,
+        'unit': pin_definition.unit,
+        'k': pin_definition.conversion_coefficients.k,
+        'C': pin_definition.conversion_coefficients.C,
+        'main_display': 0 if pin_definition.main_gui.display else 1,  # the sheet column is 'hide'
+        'main_column': pin_definition.main_gui.column,
+        'main_row': pin_definition.main_gui.row,
+        'dac_range': pin_definition.miscellaneous.dac_range,
+        'adc_range': pin_definition.miscellaneous.adc_range,
+        'min': pin_definition.value.min,
+        'max': pin_definition.value.max,
+        'initial': pin_definition.value.initial,
+        'important_display': int(pin_definition.important_gui.display),
+        'important_column': pin_definition.important_gui.column,
+        'important_row': pin_definition.important_gui.row,
+        'active_low': int(pin_definition.active_low),
+        'exponential_enable': int(exponential.enable) if exponential is not None else 0,
+        'B': exponential.B if exponential is not None else None,
+        'R0': exponential.R0 if exponential is not None else None,
+        'T0': exponential.T0 if exponential is not None else None,
+        'enable_initial': int(pin_definition.value.enable_initial),
+        'alarm_enable': int(alarm.enable) if alarm is not None else 0,
+        'alarm_above': int(alarm.above) if alarm is not None else 0,
+        'warning_value': alarm.warning_value if alarm is not None else None,
+        'interlock_value': alarm.interlock_value if alarm is not None else None,
+        'disable_powerdrop': pin_definition.miscellaneous.disable_powerdrop
+    }
+    row = [None] * row_width
+    for name, value in values.items():
+        row[first_column + columns[name][1]] = value
+    return row
+
+
+def cell_xml(reference: str, value: Any) -> str:
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    if isinstance(value, float):
+        return f'<c r="{reference}"><v>{value!r}</v></c>'
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def row_xml(row_number: int, row: Sequence[Any]) -> str:
+    """ A sheet row as SpreadsheetML, empty cells are left out
+    """
+    cells = ''.join(cell_xml(f'{column_letters[column]}{row_number}', value)
+                    for column, value in enumerate(row) if value is not None)
+    return f'<row r="{row_number}">{cells}</row>'
+
+
+def export_table(path: Path | str, pin_definitions: Sequence[PinDefinition], title: str = 'Pins') -> None:
+    """ Write pin definitions to a new workbook in the column layout the importers read
+
+    openpyxl writes the package of a workbook with one empty sheet, the sheet itself is streamed as
+    SpreadsheetML text one row at a time: openpyxl builds an element per cell, which takes over a second
+    for 5000 pins without lxml. Memory does not grow with the number of pins. Only the pin table is
+    written: other sheets, formatting and macros of a source workbook are not kept, export to a new file
+    rather than over an .xlsm. The file is replaced atomically.
+
+    :param path: The workbook to write
+    :type path: Path | str
+    :param pin_definitions: The pin definitions, written from row 6 in this order
+    :type pin_definitions: Sequence[PinDefinition]
+    :param title: Worksheet title
+    :type title: str
+    """
+    path = Path(path)
+    workbook = Workbook(write_only=True)
+    workbook.create_sheet(title)
+    package = io.BytesIO()
+    workbook.save(package)
+    # A unique temporary file per call, threads of one process may export the same workbook at the same time
+    descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.stem}.', suffix='.tmp')
+    os.close(descriptor)
+    try:
+        with ZipFile(package) as source, ZipFile(temporary_path, 'w', ZIP_DEFLATED) as archive:
+            for item in source.infolist():
+                if item.filename != sheet_part:
+                    archive.writestr(item, source.read(item))
+                    continue
+                with archive.open(sheet_part, 'w') as sheet:
+                    # The legacy importer reads rows up to the sheet size, so the dimension must cover the table
+                    last_cell = f'{column_letters[-1]}{header_rows + len(pin_definitions)}'
+                    sheet.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet '
+                                f'xmlns="{sheet_namespace}"><dimension ref="A1:{last_cell}"/><sheetData>'.encode())
+                    sheet.write(row_xml(header_rows, header_row()).encode())
+                    for row_number, pin_definition in enumerate(pin_definitions, header_rows + 1):
+                        sheet.write(row_xml(row_number, table_row(pin_definition)).encode())
+                    sheet.write(b'</sheetData></worksheet>')
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+    logging.debug(f"Exported {len(pin_definitions)} pin definitions to {path}")
@@ -0,0 +1,275 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+from nexusflow.systemdesigner.excelimport import ignore_rows, display_types
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition, ConversionCoefficients, Gui, Value, \
+    Miscellaneous, Exponential, Alarm
+
+logging.basicConfig(level=logging.DEBUG)
+
+header_rows = 5  # the pin table starts on row 6
+first_column = 1  # column B
+min_header_matches = 3  # known header names a row needs to be taken as the header row
+
+# Field -> (accepted header names, column used when no header matches, relative to column B)
+columns = {
+    'id': (('id', 'pin', 'pin id', 'ic', 'ic id'), 0),
+    'function': (('function', 'type', 'pin function'), 1),
+    'name': (('name', 'description', 'signal'), 2),
+    'unit': (('unit', 'units'), 3),
+    'k': (('k', 'gain', 'slope'), 4),
+    'C': (('c', 'offset'), 5),
+    'main_display': (('hide', 'main hide', 'main display'), 6),
+    'main_column': (('column', 'main column', 'col'), 7),
+    'main_row': (('row', 'main row'), 8),
+    'dac_range': (('dac range',), 9),
+    'adc_range': (('adc range',), 10),
+    'min': (('min', 'minimum'), 11),
+    'max': (('max', 'maximum'), 12),
+    'initial': (('initial', 'initial value', 'default'), 13),
+    'important_display': (('important', 'important display'), 14),
+    'important_column': (('important column',), 15),
+    'important_row': (('important row',), 16),
+    'active_low': (('active low', 'inverted'), 17),
+    'exponential_enable': (('exponential', 'exp', 'ntc'), 18),
+    'B': (('b', 'beta'), 19),
+    'R0': (('r0',), 20),
+    'T0': (('t0',), 21),
+    'enable_initial': (('enable initial', 'set initial'), 22),
+    'alarm_enable': (('alarm', 'alarm enable'), 23),
+    'alarm_above': (('above', 'alarm above'), 24),
+    'warning_value': (('warning', 'warning value'), 25),
+    'interlock_value': (('interlock', 'interlock value'), 26),
+    'disable_powerdrop': (('disable powerdrop', 'powerdrop'), 39)
+}
+required_numbers = ('k', 'C', 'min', 'max', 'initial')
+optional_numbers = ('main_column', 'main_row', 'dac_range', 'adc_range', 'important_column', 'important_row',
+                    'B', 'R0', 'T0', 'warning_value', 'interlock_value')
+flags = ('main_display', 'important_display', 'active_low', 'exponential_enable', 'enable_initial', 'alarm_enable',
+         'alarm_above')
+
+
+@dataclass(kw_only=True)
+class RowError:
+    row: int  # worksheet row number
+    field: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"row {self.row}, {self.field}: {self.message}"
+
+
+@dataclass(kw_only=True)
+class TableImport:
+    pin_definitions: List[PinDefinition] = field(default_factory=list)
+    errors: List[RowError] = field(default_factory=list)
+    column_map: Dict[str, Optional[int]] = field(default_factory=dict)  # field -> sheet column, 0 is column A
+    header_errors: List[RowError] = field(default_factory=list)  # header names that could not be used
+
+
+def normalize_header(value) -> str:
+    return re.sub(r'[\s_\-.]+', ' ', str(value)).strip().lower() if value is not None else ''
+
+
+def map_columns(frame: pd.DataFrame) -> Tuple[Dict[str, Optional[int]], List[RowError]]:
+    """ Sheet column of every field, by header name where the header row names it, else by position
+
+    The header row is the one of the first ``header_rows`` rows that names the most fields, at least
+    ``min_header_matches``, so a title or a note above the table cannot remap a field. A field named in
+    more than one column, or whose default column is named as another field, is reported.
+
+    :return: field -> column index, None if the sheet is too narrow or the column is ambiguous, and the
+        header problems
+    :rtype: Tuple[Dict[str, Optional[int]], List[RowError]]
+    """
+    field_of_alias = {alias: name for name, (aliases, _) in columns.items() for alias in aliases}
+    header_row, named = None, {}
+    for row_index in range(min(header_rows, len(frame))):
+        row_named: Dict[str, List[int]] = {}
+        for column_index, value in enumerate(frame.iloc[row_index]):
+            name = field_of_alias.get(normalize_header(value))
+            if name is not None:
+                row_named.setdefault(name, []).append(column_index)
+        if len(row_named) > len(named):
+            header_row, named = row_index + 1, row_named
+
+    errors = []
+    if len(named) < min_header_matches:
+        errors.append(RowError(row=header_rows, field='header',
+                               message="no header row found, using the default column layout"))
+        header_row, named = header_rows, {}
+
+    column_map: Dict[str, Optional[int]] = {}
+    for name, named_columns in named.items():
+        if len(named_columns) == 1:
+            column_map[name] = named_columns[0]
+        else:
+            letters = ', '.join(get_column_letter(column + 1) for column in named_columns)
+            errors.append(RowError(row=header_row, field=name, message=f"named in columns {letters}, "
+                                                                       f"using the default column"))
+    taken = {column: name for name, column in column_map.items()}
+    for name, (aliases, position) in columns.items():
+        if name in column_map:
+            continue
+        column = first_column + position if first_column + position < frame.shape[1] else None
+        if column is not None and column in taken:
+            errors.append(RowError(row=header_row, field=name,
+                                   message=f"default column {get_column_letter(column + 1)} is named "
+                                           f"{taken[column]}, the field is not imported"))
+            column = None
+        column_map[name] = column
+    return {name: column_map[name] for name in columns}, errors
+
+
+def import_table(path: Path | str) -> TableImport:
+    """ Read the pin table of a module workbook in one pass and validate it column by column
+
+    Rows with a missing function or a function in ``ignore_rows`` are skipped. Rows with invalid cells are
+    reported in ``errors`` and left out, the other rows are imported.
+
+    :param path: The workbook
+    :type path: Path | str
+    ...
+    :return: Pin definitions, row errors, the column of every field and header problems
+    :rtype: TableImport
+    """
+    workbook = load_workbook(filename=path, data_only=True, read_only=True)
+    try:
+        frame = pd.DataFrame(workbook.worksheets[0].iter_rows(values_only=True), dtype=object)
+    finally:
+        workbook.close()
+    column_map, header_errors = map_columns(frame)
+    result = TableImport(column_map=column_map, header_errors=header_errors)
+    data = frame.iloc[header_rows:]
+    rows = data.index.to_numpy() + 1  # worksheet row numbers
+
+    def column(name: str) -> pd.Series:
+        index = result.column_map[name]
+        if index is None:
+            return pd.Series([None] * len(data), index=data.index, dtype=object)
+        return data.iloc[:, index]
+
+    function = column('function')
+    selected = function.notna() & ~function.astype(str).isin(ignore_rows)
+    data = data[selected]
+    rows = rows[selected.to_numpy()]
+    valid = np.ones(len(data), dtype=bool)
+
+    def report(name: str, invalid: np.ndarray, message: str) -> None:
+        for row in rows[invalid]:
+            result.errors.append(RowError(row=int(row), field=name, message=message))
+        valid[invalid] = False
+
+    function = column('function').astype(str)
+    report('function', ~function.isin(display_types).to_numpy(), f"unknown pin function, expected one of "
+                                                                 f"{tuple(display_types)}")
+
+    numbers: Dict[str, np.ndarray] = {}
+    for name in required_numbers + optional_numbers:
+        raw = column(name)
+        converted = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64)
+        missing = raw.isna().to_numpy()
+        report(name, ~missing & np.isnan(converted), "not a number")
+        if name in required_numbers:
+            report(name, missing, "missing")
+        numbers[name] = converted
+
+    ids = column('id')
+    report('id', ids.isna().to_numpy(), "missing")
+    ids = ids.astype(str)
+    report('id', ids.duplicated(keep='first').to_numpy(), "defined more than once")
+
+    values = {name: pd.to_numeric(column(name), errors='coerce').to_numpy(dtype=np.float64) for name in flags}
+    main_display = values['main_display'] == 0
+    important_display = values['important_display'] == 1
+    active_low = values['active_low'] == 1
+    exponential_enable = values['exponential_enable'] == 1
+    enable_initial = values['enable_initial'] == 1
+    alarm_enable = values['alarm_enable'] == 1
+    alarm_above = values['alarm_above'] == 1
+
+    display = function.map(lambda name: display_types.get(name, ('', '')))
+    display_type = display.str[0].to_numpy()
+    display_direction = display.str[1].to_numpy()
+    names = column('name').where(column('name').notna(), None).map(str).to_numpy()
+    units = column('unit').where(column('unit').notna(), None).map(str).to_numpy()
+    disable_powerdrop = column('disable_powerdrop').where(column('disable_powerdrop').notna(), None).to_numpy()
+
+    def optional(name: str, index: int) -> Optional[float]:
+        value = numbers[name][index]
+        return None if np.isnan(value) else float(value)
+
+    def position(name: str, index: int) -> int:
+        value = numbers[name][index]
+        return 0 if np.isnan(value) else int(value)
+
+    id_values = ids.to_numpy()
+    function_values = function.to_numpy()
+    for index in np.flatnonzero(valid):
+        result.pin_definitions.append(PinDefinition(
+            id=id_values[index],
+            function=function_values[index],
+            name=names[index],
+            unit=units[index],
+            conversion_coefficients=ConversionCoefficients(k=float(numbers['k'][index]), C=float(numbers['C'][index])),
+            main_gui=Gui(
+                display=bool(main_display[index]),
+                column=position('main_column', index),
+                row=position('main_row', index),
+                display_type=display_type[index],
+                display_direction=display_direction[index]
+            ),
+            value=Value(
+                min=float(numbers['min'][index]),
+                max=float(numbers['max'][index]),
+                initial=float(numbers['initial'][index]),
+                enable_initial=bool(enable_initial[index])
+            ),
+            important_gui=Gui(
+                display=bool(important_display[index]),
+                column=position('important_column', index),
+                row=position('important_row', index),
+                display_type=display_type[index],
+                display_direction=display_direction[index]
+            ),
+            active_low=bool(active_low[index]),
+            exponential=Exponential(
+                enable=bool(exponential_enable[index]),
+                B=optional('B', index),
+                R0=optional('R0', index),
+                T0=optional('T0', index)
+            ),
+            alarm=Alarm(
+                enable=bool(alarm_enable[index]),
+                above=1 if alarm_above[index] else 0,
+                warning_value=optional('warning_value', index),
+                interlock_value=optional('interlock_value', index)
+            ),
+            miscellaneous=Miscellaneous(
+                dac_range=optional('dac_range', index),
+                adc_range=optional('adc_range', index),
+                disable_powerdrop=disable_powerdrop[index]
+            )
+        ))
+
+    result.errors.sort(key=lambda error: error.row)
+    return result
+
+
+def import_excel_table(path: Path | str) -> List[PinDefinition]:
+    """ Pin definitions of a module workbook, invalid rows are logged and skipped
+
+    Drop-in replacement for excelimport.import_excel.
+    """
+    result = import_table(path)
+    for error in result.header_errors + result.errors:
+        logging.warning(f"{Path(path).name}: {error}")
+    return result.pin_definitions
@@ -0,0 +1,98 @@
+import logging
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QTableWidget, \
+    QTableWidgetItem, QLabel, QHeaderView
+from PySide6.QtCore import Qt, QTimer, Slot
+
+from nexusflow import router
+
+logging.basicConfig(level=logging.DEBUG)
+
+refresh_interval = 500  # ms
+
+statistics_columns = (
+    ('Destination', 'name'),
+    ('Messages', 'messages'),
+    ('Coalesced', 'coalesced'),
+    ('Rate [1/s]', 'rate'),
+    ('Latency p50 [ms]', 'latency_p50'),
+    ('Latency p99 [ms]', 'latency_p99'),
+    ('Callback p50 [ms]', 'execution_p50'),
+    ('Callback p99 [ms]', 'execution_p99'),
+    ('Queue', 'queue_depth'),
+    ('Max queue', 'max_queue_depth')
+)
+seconds_columns = ('latency_p50', 'latency_p99', 'execution_p50', 'execution_p99')
+
+
+class SystemRunner(QWidget):
+    def __init__(self):
+        """ Live view of router statistics, shown in the System Runner dock
+        """
+        super().__init__()
+        self.main_layout = QVBoxLayout()
+
+        controls_layout = QHBoxLayout()
+        self.enable_checkbox = QCheckBox('Collect route statistics')
+        self.enable_checkbox.toggled.connect(self.enable_checkbox_handler)
+        controls_layout.addWidget(self.enable_checkbox)
+        reset_button = QPushButton('Reset')
+        reset_button.clicked.connect(self.reset_button_handler)
+        controls_layout.addWidget(reset_button)
+        self.queues_label = QLabel()
+        controls_layout.addWidget(self.queues_label)
+        controls_layout.addStretch(1)
+        self.main_layout.addLayout(controls_layout)
+
+        self.statistics_table = QTableWidget(0, len(statistics_columns))
+        self.statistics_table.setHorizontalHeaderLabels([title for title, _ in statistics_columns])
+        self.statistics_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.statistics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.statistics_table.setSortingEnabled(True)
+        self.main_layout.addWidget(self.statistics_table)
+        self.setLayout(self.main_layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(refresh_interval)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    @Slot(bool)
+    def enable_checkbox_handler(self, checked: bool):
+        if checked:
+            router.enable_statistics()
+            self.refresh_timer.start()
+        else:
+            router.disable_statistics()
+            self.refresh_timer.stop()
+        logging.debug(f"Route statistics {'enabled' if checked else 'disabled'}")
+
+    @Slot()
+    def reset_button_handler(self):
+        if router.statistics is not None:
+            router.statistics.reset()
+        self.statistics_table.setRowCount(0)
+
+    @Slot()
+    def refresh(self):
+        statistics = router.statistics
+        if statistics is None:
+            return
+        queues = router.queue_depths()
+        self.queues_label.setText('Queued: ' + ', '.join(f'{name} {depth}' for name, depth in queues.items()))
+
+        rows = statistics.snapshot()
+        self.statistics_table.setSortingEnabled(False)
+        self.statistics_table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            for column_index, (_, key) in enumerate(statistics_columns):
+                value = row[key]
+                item = QTableWidgetItem()
+                if key == 'name':
+                    item.setText(str(value))
+                elif key in seconds_columns:
+                    item.setData(Qt.DisplayRole, round(value * 1000, 3))
+                elif key == 'rate':
+                    item.setData(Qt.DisplayRole, round(value, 1))
+                else:
+                    item.setData(Qt.DisplayRole, value)
+                self.statistics_table.setItem(row_index, column_index, item)
+        self.statistics_table.setSortingEnabled(True)
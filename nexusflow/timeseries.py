@@ -0,0 +1,519 @@
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from nexusflow.messages import SampleBlock
+
+logging.basicConfig(level=logging.DEBUG)
+
+session_format_version = 1
+session_file = 'session.json'
+index_file = 'chunks.idx'
+recordings_directory = 'recordings'
+default_chunk_samples = 1 << 16
+default_queue_blocks = 1024
+default_levels = (16, 256)  # samples of one channel per summary record
+default_put_timeout = 1.0  # seconds record waits for the writer before it drops a block
+
+# One column file per sample field, little endian so sessions can be read on any machine
+column_dtypes = {
+    'timestamps': np.dtype('<f8'),
+    'handles': np.dtype('<u4'),
+    'values': np.dtype('<f8')
+}
+# One record per chunk, appended when the chunk is full or the recording stops
+chunk_dtype = np.dtype([('first', '<u8'), ('count', '<u4'), ('t_min', '<f8'), ('t_max', '<f8')])
+# Min/max pyramid: one record per run of up to ``factor`` samples of one channel within a chunk, sorted by handle
+# and time within the chunk. first and last are sample indexes, the level index holds the record count after
+# every chunk.
+summary_dtype = np.dtype([('first', '<u8'), ('last', '<u8'), ('t_first', '<f8'), ('handle', '<u4'),
+                          ('minimum', '<f8'), ('maximum', '<f8'), ('sum', '<f8'), ('count', '<u4')])
+level_offset_dtype = np.dtype('<u8')
+
+
+def level_files(path: Path, factor: int) -> Tuple[Path, Path]:
+    return path / f'level_{factor}.bin', path / f'level_{factor}.idx'
+
+
+def summarize_chunk(handles: np.ndarray, values: np.ndarray, timestamps: np.ndarray, first: int,
+                    factor: int) -> np.ndarray:
+    """ Summary records of the samples of one chunk, runs of up to ``factor`` samples per channel
+
+    :param first: Sample index of the first sample of the chunk
+    :type first: int
+    ...
+    :return: Records sorted by handle, then time
+    :rtype: np.ndarray
+    """
+    order = np.argsort(handles, kind='stable')
+    sorted_handles = handles[order]
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_handles)) + 1))
+    # Position of every sample within the samples of its channel
+    rank = np.arange(len(order)) - np.repeat(run_starts, np.diff(np.append(run_starts, len(order))))
+    boundaries = np.flatnonzero(rank % factor == 0)
+    ends = np.append(boundaries[1:], len(order)) - 1
+    sorted_values = values[order]
+
+    records = np.empty(len(boundaries), dtype=summary_dtype)
+    records['first'] = order[boundaries] + first
+    records['last'] = order[ends] + first
+    records['t_first'] = timestamps[order[boundaries]]
+    records['handle'] = sorted_handles[boundaries]
+    records['minimum'] = np.minimum.reduceat(sorted_values, boundaries)
+    records['maximum'] = np.maximum.reduceat(sorted_values, boundaries)
+    records['sum'] = np.add.reduceat(sorted_values, boundaries)
+    records['count'] = ends - boundaries + 1
+    return records
+
+
+def new_session_path(version_path: Path | str) -> Path:
+    """ Directory for a new recording of a system version, named after the current time
+    """
+    name = time.strftime('%Y%m%d-%H%M%S')
+    path = Path(version_path) / recordings_directory / name
+    suffix = 1
+    while path.exists():
+        path = path.with_name(f'{name}-{suffix}')
+        suffix += 1
+    return path
+
+
+class ColumnFile:
+    def __init__(self, path: Path, dtype: np.dtype, chunk_samples: int):
+        """ Append-only column, the chunk being written is memory mapped
+        """
+        self.path = path
+        self.dtype = dtype
+        self.chunk_samples = chunk_samples
+        self.path.touch()
+        self.chunk: Optional[np.memmap] = None
+
+    def map_chunk(self, chunk_index: int) -> np.memmap:
+        # np.memmap grows the file to the end of the mapped range
+        self.chunk = np.memmap(self.path, dtype=self.dtype, mode='r+',
+                               offset=chunk_index * self.chunk_samples * self.dtype.itemsize,
+                               shape=(self.chunk_samples,))
+        return self.chunk
+
+    def release(self) -> None:
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.chunk = None
+
+    def truncate(self, samples: int) -> None:
+        """ Cut the unused end of the last chunk
+        """
+        self.release()
+        with open(self.path, 'r+b') as file:
+            file.truncate(samples * self.dtype.itemsize)
+
+
+class SessionRecorder:
+    def __init__(self, path: Path | str, channel_ids: Optional[Sequence[str]] = None,
+                 chunk_samples: int = default_chunk_samples, queue_blocks: int = default_queue_blocks,
+                 put_timeout: float = default_put_timeout, levels: Sequence[int] = default_levels):
+        """ Streams sample blocks to chunked, memory-mapped column files on a writer thread
+
+        A session directory holds one file per column (timestamps, handles, values), the chunk index, a
+        min/max pyramid per entry of ``levels`` and session.json. Only the chunk being written is mapped, so
+        memory use does not grow with the length of the recording. ``record`` puts the block in a bounded
+        queue and the writer thread drains every queued block at once, so bursts are written in a few large
+        copies. When the queue is full ``record`` waits up to ``put_timeout`` for the writer; only blocks that
+        still do not fit are dropped and counted.
+
+        :param path: Session directory, created if needed
+        :type path: Path | str
+        :param channel_ids: Pin id of every channel handle, stored with the session
+        :type channel_ids: Optional[Sequence[str]]
+        :param chunk_samples: Samples per chunk
+        :type chunk_samples: int
+        :param queue_blocks: Blocks that may wait for the writer thread
+        :type queue_blocks: int
+        :param put_timeout: Seconds ``record`` waits for room in the queue, 0 drops without waiting
+        :type put_timeout: float
+        :param levels: Samples per summary record of the min/max pyramid levels, increasing
+        :type levels: Sequence[int]
+        ...
+        :raises FileExistsError: If the directory already holds a session
+        :raises ValueError: If chunk_samples is not positive or the levels are not increasing
+        """
+        if chunk_samples < 1:
+            raise ValueError(f"Chunk size must be positive, got {chunk_samples}")
+        levels = tuple(int(factor) for factor in levels)
+        if any(factor <= previous for previous, factor in zip((1,) + levels, levels)):
+            raise ValueError(f"Summary levels must be increasing and larger than 1, got {levels}")
+        self.path = Path(path)
+        if (self.path / session_file).exists():
+            raise FileExistsError(f"{self.path} already holds a recording")
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.channel_ids = list(channel_ids) if channel_ids is not None else None
+        self.chunk_samples = chunk_samples
+        self.queue = queue.Queue(maxsize=queue_blocks)
+        self.put_timeout = put_timeout
+        self.thread = None
+
+        self.columns: Dict[str, ColumnFile] = {
+            name: ColumnFile(self.path / f'{name}.bin', dtype, chunk_samples) for name, dtype in column_dtypes.items()
+        }
+        self.chunks: Dict[str, np.memmap] = {}
+        self.index_file = open(self.path / index_file, 'wb')
+        self.levels = levels
+        self.level_files = {factor: tuple(open(name, 'wb') for name in level_files(self.path, factor))
+                            for factor in levels}
+        self.level_records = {factor: 0 for factor in levels}
+        self.chunk_index = 0
+        self.chunk_fill = 0
+        self.chunk_t_min = np.inf
+        self.chunk_t_max = -np.inf
+        self.started_at = None
+
+        self.recorded_samples = 0
+        self.dropped_blocks = 0
+        self.dropped_samples = 0
+        self.write_session(complete=False)
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self.map_chunk()
+        self.thread = threading.Thread(target=self.run, name='nexusflow-recorder', daemon=True)
+        self.thread.start()
+        logging.info(f"Recording to {self.path}")
+
+    def record(self, block: SampleBlock) -> None:
+        """ Queue a block for writing, the block must not be changed afterwards
+
+        Blocks the caller while the queue is full, at most ``put_timeout`` seconds.
+        """
+        if not len(block):
+            return
+        try:
+            self.queue.put(block, timeout=self.put_timeout) if self.put_timeout > 0 else self.queue.put_nowait(block)
+        except queue.Full:
+            if not self.dropped_blocks:
+                logging.warning(f"Recording to {self.path} cannot keep up, dropping blocks")
+            self.dropped_blocks += 1
+            self.dropped_samples += len(block)
+
+    def run(self) -> None:
+        while True:
+            blocks = [self.queue.get()]
+            # Take everything that queued up meanwhile, one write per burst instead of one per block
+            while blocks[-1] is not None:
+                try:
+                    blocks.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = blocks[-1] is None
+            if stop:
+                blocks.pop()
+            if blocks:
+                block = blocks[0] if len(blocks) == 1 else \
+                    SampleBlock(np.concatenate([block.data[:block.size] for block in blocks]))
+                try:
+                    self.write(block)
+                except Exception:
+                    logging.exception(f"Writing {len(block)} samples to {self.path} failed")
+            if stop:
+                return
+
+    def map_chunk(self) -> None:
+        self.chunks = {name: column.map_chunk(self.chunk_index) for name, column in self.columns.items()}
+
+    def write(self, block: SampleBlock) -> None:
+        written = 0
+        while written < len(block):
+            count = min(len(block) - written, self.chunk_samples - self.chunk_fill)
+            timestamps = block.timestamps[written:written + count]
+            self.chunks['timestamps'][self.chunk_fill:self.chunk_fill + count] = timestamps
+            self.chunks['handles'][self.chunk_fill:self.chunk_fill + count] = block.handles[written:written + count]
+            self.chunks['values'][self.chunk_fill:self.chunk_fill + count] = block.values[written:written + count]
+            self.chunk_t_min = min(self.chunk_t_min, float(timestamps.min()))
+            self.chunk_t_max = max(self.chunk_t_max, float(timestamps.max()))
+            self.chunk_fill += count
+            self.recorded_samples += count
+            written += count
+            if self.chunk_fill == self.chunk_samples:
+                self.seal_chunk()
+                self.map_chunk()
+
+    def seal_chunk(self) -> None:
+        """ Flush the current chunk, add it to the index and summarize it into the pyramid levels
+        """
+        if self.chunk_fill:
+            self.write_levels()
+        self.chunks = {}
+        for column in self.columns.values():
+            column.release()
+        if self.chunk_fill:
+            record = np.array([(self.chunk_index * self.chunk_samples, self.chunk_fill, self.chunk_t_min,
+                                self.chunk_t_max)], dtype=chunk_dtype)
+            self.index_file.write(record.tobytes())
+            self.index_file.flush()
+        self.chunk_index += 1
+        self.chunk_fill = 0
+        self.chunk_t_min = np.inf
+        self.chunk_t_max = -np.inf
+
+    def write_levels(self) -> None:
+        handles = np.asarray(self.chunks['handles'][:self.chunk_fill])
+        values = np.asarray(self.chunks['values'][:self.chunk_fill])
+        timestamps = np.asarray(self.chunks['timestamps'][:self.chunk_fill])
+        for factor, (records_file, offsets_file) in self.level_files.items():
+            records = summarize_chunk(handles, values, timestamps, self.chunk_index * self.chunk_samples, factor)
+            records_file.write(records.tobytes())
+            records_file.flush()
+            self.level_records[factor] += len(records)
+            offsets_file.write(np.array([self.level_records[factor]], dtype=level_offset_dtype).tobytes())
+            offsets_file.flush()
+
+    def write_session(self, complete: bool) -> None:
+        session = {
+            'version': session_format_version,
+            'chunk_samples': self.chunk_samples,
+            'columns': {name: dtype.str for name, dtype in column_dtypes.items()},
+            'levels': list(self.levels),
+            'started_at': self.started_at,
+            'stopped_at': time.time() if complete else None,
+            'samples': self.recorded_samples,
+            'dropped_blocks': self.dropped_blocks,
+            'dropped_samples': self.dropped_samples,
+            'complete': complete,
+            'channel_ids': self.channel_ids
+        }
+        with open(self.path / session_file, 'w') as file:
+            json.dump(session, file)
+
+    def stop(self) -> None:
+        """ Write the queued blocks, then close the files
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.seal_chunk()
+        self.index_file.close()
+        for files in self.level_files.values():
+            for file in files:
+                file.close()
+        for column in self.columns.values():
+            column.truncate(self.recorded_samples)
+        self.write_session(complete=True)
+        if self.dropped_blocks:
+            logging.warning(f"Recording dropped {self.dropped_blocks} blocks ({self.dropped_samples} samples)")
+        logging.info(f"Recorded {self.recorded_samples} samples to {self.path}")
+
+
+def list_sessions(version_path: Path | str) -> List[Path]:
+    """ Session directories of a system version, oldest first
+    """
+    directory = Path(version_path) / recordings_directory
+    if not directory.exists():
+        return []
+    return sorted(path for path in directory.iterdir() if (path / session_file).exists())
+
+
+@dataclass(kw_only=True)
+class SessionQuery:
+    timestamps: np.ndarray  # start of every point
+    minimum: np.ndarray
+    maximum: np.ndarray
+    mean: np.ndarray
+    counts: np.ndarray  # samples per point
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class SessionReader:
+    def __init__(self, path: Path | str):
+        """ Memory maps a recorded session for time range queries
+
+        Chunks are located with a binary search over the chunk index and samples with a binary search over
+        the timestamps of the first and last chunk, so only the samples in the requested range are touched.
+        Zoomed-out queries read the min/max pyramid levels instead of the samples. A session that is still
+        being recorded can be read, it shows the chunks sealed so far.
+
+        :param path: Session directory written by SessionRecorder
+        :type path: Path | str
+        ...
+        :raises ValueError: If the directory does not hold a supported session
+        """
+        self.path = Path(path)
+        with open(self.path / session_file, 'r') as file:
+            self.session = json.load(file)
+        if self.session.get('version') != session_format_version:
+            raise ValueError(f"{self.path} is not a version {session_format_version} session")
+        self.channel_ids: Optional[List[str]] = self.session.get('channel_ids')
+        self.chunks = np.fromfile(self.path / index_file, dtype=chunk_dtype)
+        self.sample_count = int(self.chunks['first'][-1] + self.chunks['count'][-1]) if len(self.chunks) else 0
+
+        # Bounds that stay sorted even if chunks overlap in time
+        self.chunk_t_max = np.maximum.accumulate(self.chunks['t_max']) if len(self.chunks) else self.chunks['t_max']
+        self.chunk_t_min = np.minimum.accumulate(self.chunks['t_min'][::-1])[::-1] if len(self.chunks) else \
+            self.chunks['t_min']
+
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, dtype in column_dtypes.items():
+            if self.sample_count:
+                self.columns[name] = np.memmap(self.path / f'{name}.bin', dtype=dtype, mode='r',
+                                               shape=(self.sample_count,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+
+        # Pyramid levels, coarsest first; sessions recorded without levels are queried from the samples
+        self.levels: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        for factor in sorted(self.session.get('levels', []), reverse=True):
+            records_path, offsets_path = level_files(self.path, factor)
+            offsets = np.fromfile(offsets_path, dtype=level_offset_dtype)[:len(self.chunks)]
+            record_count = int(offsets[-1]) if len(offsets) else 0
+            records = np.memmap(records_path, dtype=summary_dtype, mode='r', shape=(record_count,)) \
+                if record_count else np.empty(0, dtype=summary_dtype)
+            self.levels.append((factor, offsets, records))
+
+    def __len__(self) -> int:
+        return self.sample_count
+
+    def handle_of(self, channel_id: str) -> int:
+        """ :raises KeyError: If the session has no channel with that pin id
+        """
+        if self.channel_ids is None or channel_id not in self.channel_ids:
+            raise KeyError(f"{self.path} has no channel {channel_id}")
+        return self.channel_ids.index(channel_id)
+
+    def time_range(self) -> Tuple[float, float]:
+        """ First and last timestamp, NaN for an empty session
+        """
+        if not len(self.chunks):
+            return np.nan, np.nan
+        return float(self.chunks['t_min'].min()), float(self.chunks['t_max'].max())
+
+    def chunk_range(self, start: float, end: float) -> Tuple[int, int]:
+        """ Index range of the chunks that may hold samples with timestamps in [start, end]
+        """
+        first_chunk = int(np.searchsorted(self.chunk_t_max, start, side='left'))
+        last_chunk = int(np.searchsorted(self.chunk_t_min, end, side='right'))
+        return first_chunk, last_chunk
+
+    def sample_range(self, start: float, end: float) -> Tuple[int, int]:
+        """ Index range of the samples with timestamps in [start, end]
+        """
+        first_chunk, last_chunk = self.chunk_range(start, end)
+        if first_chunk >= last_chunk:
+            return 0, 0
+        timestamps = self.columns['timestamps']
+        chunk = self.chunks[first_chunk]
+        first = int(chunk['first']) + int(np.searchsorted(
+            timestamps[chunk['first']:chunk['first'] + chunk['count']], start, side='left'))
+        chunk = self.chunks[last_chunk - 1]
+        last = int(chunk['first']) + int(np.searchsorted(
+            timestamps[chunk['first']:chunk['first'] + chunk['count']], end, side='right'))
+        return first, max(first, last)
+
+    def read(self, handle: int, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """ Every sample of a channel in [start, end]
+
+        :return: timestamps and values
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        first, last = self.sample_range(start, end)
+        selected = np.flatnonzero(self.columns['handles'][first:last] == handle) + first
+        return np.asarray(self.columns['timestamps'][selected]), np.asarray(self.columns['values'][selected])
+
+    def query(self, handle: int, start: float, end: float, points: int,
+              block_samples: int = default_chunk_samples) -> SessionQuery:
+        """ A channel between start and end decimated to at most ``points`` min/max/mean points
+
+        The coarsest pyramid level with at least ``points`` summary records of the channel in the range is
+        used, the samples before its first and after its last record are read directly. Without such a level
+        the samples are processed in blocks of ``block_samples``, so memory use does not depend on the
+        length of the range.
+
+        :param handle: The channel
+        :type handle: int
+        :param start: Start of the range
+        :type start: float
+        :param end: End of the range
+        :type end: float
+        :param points: Maximum number of points, e.g. the plot width in pixels
+        :type points: int
+        :param block_samples: Samples processed at once
+        :type block_samples: int
+        ...
+        :return: The points, empty time buckets are left out
+        :rtype: SessionQuery
+        """
+        points = max(int(points), 1)
+        span = max(end - start, np.finfo(float).tiny)
+        minimum = np.full(points, np.inf)
+        maximum = np.full(points, -np.inf)
+        sums = np.zeros(points)
+        counts = np.zeros(points, dtype=np.int64)
+
+        def accumulate(timestamps, minimums, maximums, totals, sample_counts):
+            buckets = np.minimum(((timestamps - start) / span * points).astype(np.int64), points - 1)
+            # Timestamps are sorted, so every bucket is one run
+            boundaries = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+            indexes = buckets[boundaries]
+            minimum[indexes] = np.minimum(minimum[indexes], np.minimum.reduceat(minimums, boundaries))
+            maximum[indexes] = np.maximum(maximum[indexes], np.maximum.reduceat(maximums, boundaries))
+            sums[indexes] += np.add.reduceat(totals, boundaries)
+            counts[indexes] += np.add.reduceat(sample_counts, boundaries)
+
+        first, last = self.sample_range(start, end)
+        records = self.level_records(handle, start, end, first, last, points)
+        if records is None:
+            sample_ranges = [(first, last)]
+        else:
+            accumulate(records['t_first'], records['minimum'], records['maximum'], records['sum'],
+                       records['count'].astype(np.int64))
+            sample_ranges = [(first, int(records['first'][0])), (int(records['last'][-1]) + 1, last)]
+
+        for range_first, range_last in sample_ranges:
+            for block_start in range(range_first, range_last, block_samples):
+                block_end = min(block_start + block_samples, range_last)
+                selected = np.flatnonzero(self.columns['handles'][block_start:block_end] == handle) + block_start
+                if not len(selected):
+                    continue
+                values = np.asarray(self.columns['values'][selected])
+                accumulate(self.columns['timestamps'][selected], values, values, values,
+                           np.ones(len(values), dtype=np.int64))
+
+        filled = counts > 0
+        return SessionQuery(
+            timestamps=start + np.flatnonzero(filled) * (span / points),
+            minimum=minimum[filled],
+            maximum=maximum[filled],
+            mean=sums[filled] / counts[filled],
+            counts=counts[filled]
+        )
+
+    def level_records(self, handle: int, start: float, end: float, first: int, last: int,
+                      points: int) -> Optional[np.ndarray]:
+        """ Summary records of a channel lying completely within the samples [first, last) from the coarsest
+        level that has at least ``points`` of them, None if no level has enough
+        """
+        first_chunk, last_chunk = self.chunk_range(start, end)
+        if first_chunk >= last_chunk:
+            return None
+        for factor, offsets, records in self.levels:
+            if last_chunk > len(offsets):
+                continue  # level index written after the chunk index, not there yet
+            lower = int(offsets[first_chunk - 1]) if first_chunk else 0
+            segment = records[lower:int(offsets[last_chunk - 1])]
+            segment = segment[segment['handle'] == handle]
+            segment = segment[(segment['first'] >= first) & (segment['last'] < last)]
+            if len(segment) >= points:
+                return np.asarray(segment)
+        return None
+
+    def close(self) -> None:
+        self.columns = {}
+        self.levels = []
@@ -0,0 +1,175 @@
+import logging
+import threading
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+separator = '/'
+single_level_wildcard = '+'
+multi_level_wildcard = '#'
+resolve_cache_limit = 65536
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+@dataclass(kw_only=True)
+class Subscription:
+    pattern: str
+    callback: callable
+    converters: Tuple[callable, ...] = ()
+    kind: str = 'event'
+    affinity: str = 'gui'
+
+
+@dataclass(kw_only=True)
+class ResolvedSubscription:
+    subscription: Subscription
+    address: Tuple[Any, ...]
+    deliver: callable  # callback with the address already bound, called with the payload
+
+
+class TopicNode:
+    __slots__ = ('children', 'single', 'multi', 'subscriptions')
+
+    def __init__(self):
+        self.children: Dict[str, TopicNode] = {}
+        self.single: Optional[TopicNode] = None
+        self.multi: List[Subscription] = []
+        self.subscriptions: List[Subscription] = []
+
+
+def split_topic(topic: str) -> List[str]:
+    return topic.split(separator)
+
+
+class TopicTree:
+    """ Trie of topic subscriptions
+
+    Topics are levels separated by '/', e.g. 'fpga/ADD3/3'. A pattern level '+' matches exactly one level
+    and '#' (only as the last level) matches every remaining level. Levels matched by wildcards become the
+    address passed to the subscriber, each one optionally converted by the matching entry of
+    ``converters``. Resolved topics are cached, so a repeated topic costs one dict lookup.
+
+    The tree is shared by the GUI thread, the I/O threads and the pool: changes and cache misses are made
+    under ``lock``, so a topic resolved while a subscription is removed is never cached with it.
+    """
+
+    def __init__(self):
+        self.root = TopicNode()
+        self.cache: Dict[str, Tuple[ResolvedSubscription, ...]] = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, subscription: Subscription) -> Subscription:
+        """ Add a subscription to the tree
+
+        :param subscription: The subscription
+        :type subscription: Subscription
+        ...
+        :raises ValueError: If '#' is not the last level of the pattern
+        ...
+        :return: The subscription, used to unsubscribe
+        :rtype: Subscription
+        """
+        levels = split_topic(subscription.pattern)
+        if multi_level_wildcard in levels[:-1]:
+            raise ValueError(f"'{multi_level_wildcard}' must be the last level of {subscription.pattern}")
+        with self.lock:
+            node = self.root
+            for level in levels:
+                if level == multi_level_wildcard:
+                    node.multi.append(subscription)
+                    break
+                if level == single_level_wildcard:
+                    if node.single is None:
+                        node.single = TopicNode()
+                    node = node.single
+                else:
+                    node = node.children.setdefault(level, TopicNode())
+            else:
+                node.subscriptions.append(subscription)
+            self.cache.clear()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """ Remove a subscription from the tree
+
+        :param subscription: The subscription returned by subscribe
+        :type subscription: Subscription
+        ...
+        :raises KeyError: If the subscription is not in the tree
+        """
+        with self.lock:
+            node = self.root
+            for level in split_topic(subscription.pattern):
+                if level == multi_level_wildcard:
+                    subscriptions = node.multi
+                    break
+                node = node.single if level == single_level_wildcard else node.children.get(level)
+                if node is None:
+                    raise KeyError(f"Subscription {subscription.pattern} not found")
+            else:
+                subscriptions = node.subscriptions
+            if subscription not in subscriptions:
+                raise KeyError(f"Subscription {subscription.pattern} not found")
+            subscriptions.remove(subscription)
+            self.cache.clear()
+
+    def resolve(self, topic: str) -> Tuple[ResolvedSubscription, ...]:
+        """ Find every subscription matching a topic
+
+        A subscription whose converter fails on the topic, e.g. int('abc') for 'fpga/channel/abc', is
+        skipped with a warning.
+
+        :param topic: The topic, without wildcards
+        :type topic: str
+        ...
+        :return: Matching subscriptions with their parsed address
+        :rtype: Tuple[ResolvedSubscription, ...]
+        """
+        try:
+            return self.cache[topic]
+        except KeyError:
+            pass
+
+        with self.lock:
+            matches = []
+            self.match(self.root, split_topic(topic), 0, (), matches)
+            resolved = []
+            for subscription, captures in matches:
+                try:
+                    resolved.append(self.bind(subscription, captures))
+                except Exception as error:
+                    logging.warning(f"Topic {topic} does not match the converters of {subscription.pattern}: "
+                                    f"{error!r}")
+            resolved = tuple(resolved)
+
+            if len(self.cache) >= resolve_cache_limit:
+                self.cache.clear()
+            self.cache[topic] = resolved
+        return resolved
+
+    def match(self, node: TopicNode, levels: List[str], depth: int, captures: Tuple[str, ...],
+              matches: List[Tuple[Subscription, Tuple[str, ...]]]) -> None:
+        for subscription in node.multi:
+            matches.append((subscription, captures + (separator.join(levels[depth:]),)))
+        if depth == len(levels):
+            for subscription in node.subscriptions:
+                matches.append((subscription, captures))
+            return
+        child = node.children.get(levels[depth])
+        if child is not None:
+            self.match(child, levels, depth + 1, captures, matches)
+        if node.single is not None:
+            self.match(node.single, levels, depth + 1, captures + (levels[depth],), matches)
+
+    @staticmethod
+    def bind(subscription: Subscription, captures: Tuple[str, ...]) -> ResolvedSubscription:
+        address = tuple(
+            subscription.converters[index](capture) if index < len(subscription.converters) else capture
+            for index, capture in enumerate(captures)
+        )
+        return ResolvedSubscription(
+            subscription=subscription,
+            address=address,
+            deliver=partial(subscription.callback, *address)
+        )
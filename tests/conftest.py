@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from nexusflow.systemdesigner.module.pindefinition import PinDefinition, ConversionCoefficients, Gui, Value, \
+    Miscellaneous, Exponential, Alarm  # noqa: E402
+from nexusflow.systemdesigner.excelimport import display_types  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+def make_pin(index: int, function: str = 'ADC', alarm: Alarm = None) -> PinDefinition:
+    """ A pin definition as the table importer produces it, so exported and imported pins compare equal
+    """
+    display_type, display_direction = display_types[function]
+    return PinDefinition(
+        id=f'ADD{(1, 3, 4)[index % 3]} {index}',
+        function=function,
+        name=f'pin {index}',
+        unit='V',
+        conversion_coefficients=ConversionCoefficients(k=1.5, C=-0.25),
+        main_gui=Gui(display=index % 2 == 0, column=index % 4, row=index, display_type=display_type,
+                     display_direction=display_direction),
+        value=Value(min=0.0, max=5.0, initial=1.0, enable_initial=True),
+        important_gui=Gui(display=index % 5 == 0, column=1, row=2, display_type=display_type,
+                          display_direction=display_direction),
+        active_low=False,
+        exponential=Exponential(enable=False, B=None, R0=None, T0=None),
+        alarm=alarm if alarm is not None else Alarm(enable=True, above=1, warning_value=4.0, interlock_value=None),
+        miscellaneous=Miscellaneous(dac_range=10.0, adc_range=10.0, disable_powerdrop=None)
+    )
+
+
+@pytest.fixture
+def pins():
+    functions = tuple(display_types)
+    return [make_pin(index, functions[index % len(functions)]) for index in range(40)]
@@ -0,0 +1,51 @@
+import threading
+
+import numpy as np
+
+from nexusflow.systemdesigner.acquisition import AcquisitionScheduler
+
+
+def test_pins_are_grouped_into_rate_classes(pins):
+    scheduler = AcquisitionScheduler(lambda handles: np.zeros(len(handles)), publish=lambda block: None)
+    scheduler.add_pin_definitions(pins, rates={'ADC': 100.0, 'DIG_IN': 10.0})
+    scheduler.add_channels([0, 1], 10.0)
+
+    assert sorted(scheduler.rate_classes) == [10.0, 100.0]
+    assert scheduler.rate_classes[100.0].handles.tolist() == \
+        [handle for handle, pin in enumerate(pins) if pin.function == 'ADC']
+    assert scheduler.rate_classes[10.0].handles.tolist() == \
+        sorted({0, 1} | {handle for handle, pin in enumerate(pins) if pin.function == 'DIG_IN'})
+
+
+def test_tick_counts_missed_deadlines():
+    blocks = []
+    scheduler = AcquisitionScheduler(lambda handles: handles * 2.0, publish=blocks.append)
+    scheduler.add_channels([3, 5], 100.0)
+    rate_class = scheduler.rate_classes[100.0]
+    deadline = rate_class.next_deadline
+    scheduler.tick(rate_class, deadline + 0.035)
+
+    assert (rate_class.ticks, rate_class.missed) == (1, 3)
+    assert rate_class.next_deadline == deadline + 4 * rate_class.period
+    assert blocks[0].handles.tolist() == [3, 5] and blocks[0].values.tolist() == [6.0, 10.0]
+
+
+def test_failing_read_does_not_stop_the_acquisition():
+    reads = []
+    published = threading.Event()
+
+    def read_channels(handles):
+        reads.append(len(reads))
+        if len(reads) == 1:
+            raise OSError("link lost")
+        return np.ones(len(handles))
+
+    scheduler = AcquisitionScheduler(read_channels, publish=lambda block: published.set())
+    scheduler.add_channels([0], 200.0)
+    scheduler.start()
+    try:
+        assert published.wait(5.0)
+    finally:
+        scheduler.stop()
+    statistics, = scheduler.statistics()
+    assert statistics['ticks'] == len(reads) - 1 >= 1
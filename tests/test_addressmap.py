@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from nexusflow.systemdesigner.module import addressmap
+from nexusflow.systemdesigner.module.addressmap import AddressMap, parse_pin_id, get_address_map, set_address_map
+
+from conftest import make_pin
+
+
+def test_parse_pin_id():
+    assert parse_pin_id('ADD3 3') == ('ADD3', 1, 3)
+    assert parse_pin_id('PSU 2') == ('PSU', -1, 2)
+    with pytest.raises(ValueError):
+        parse_pin_id('ADD3')
+    with pytest.raises(ValueError):
+        parse_pin_id('ADD3 x')
+
+
+def test_address_map_arrays_and_lookups(pins):
+    extra = make_pin(40, 'ADC')
+    extra.id = 'thermistor'
+    duplicate = make_pin(41, 'DAC')
+    duplicate.id = pins[0].id
+    address_map = AddressMap(pins + [extra, duplicate])
+
+    assert len(address_map) == 42
+    assert address_map.handle_of('ADD3 4') == 4
+    assert address_map.handle_of(pins[0].id) == 0
+    address = address_map.address(4)
+    assert (address.device, address.device_index, address.channel, address.function) == ('ADD3', 1, 4, pins[4].function)
+    assert (address_map.device_index[40], address_map.channel[40]) == (-1, -1)
+    assert address_map.handles_of_function('DAC').tolist() == \
+        [handle for handle, pin in enumerate(pins + [extra, duplicate]) if pin.function == 'DAC']
+    with pytest.raises(KeyError):
+        address_map.handle_of('ADD1 99')
+    with pytest.raises(ValueError):
+        address_map.device_index[0] = 2
+
+
+def test_current_address_map(pins, monkeypatch):
+    monkeypatch.setattr(addressmap, 'current_address_map', None)
+    with pytest.raises(RuntimeError):
+        get_address_map()
+    address_map = AddressMap(pins)
+    set_address_map(address_map)
+    assert get_address_map() is address_map
+    assert np.array_equal(get_address_map().channel, np.arange(40))
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from nexusflow.messages import SampleBlock
+from nexusflow.systemdesigner.alarms import AlarmEngine, level_ok, level_warning, level_interlock
+from nexusflow.systemdesigner.module.pindefinition import Alarm
+
+
+def engine(*alarms: Alarm):
+    events = []
+    return AlarmEngine([SimpleNamespace(alarm=alarm) for alarm in alarms], on_event=events.append), events
+
+
+def feed(alarm_engine: AlarmEngine, values, handle: int = 0):
+    for timestamp, value in enumerate(values):
+        alarm_engine.evaluate(SampleBlock.from_arrays(np.array([handle]), np.array([value]), float(timestamp)))
+
+
+def test_levels_and_hysteresis():
+    alarm_engine, events = engine(Alarm(enable=True, above=1, warning_value=5.0, interlock_value=8.0,
+                                        hysteresis=1.0))
+    feed(alarm_engine, [4.0, 5.0, 9.0, 7.5, 6.9, 4.5, 3.9])
+
+    assert [(event.previous_level, event.level, event.value) for event in events] == [
+        (level_ok, level_warning, 5.0),
+        (level_warning, level_interlock, 9.0),
+        (level_interlock, level_warning, 6.9),
+        (level_warning, level_ok, 3.9)
+    ]
+
+
+def test_below_alarm():
+    alarm_engine, events = engine(Alarm(enable=True, above=0, warning_value=1.0, interlock_value=0.5))
+    feed(alarm_engine, [2.0, 0.9, 0.4])
+
+    assert [event.level for event in events] == [level_warning, level_interlock]
+
+
+def test_debounce_needs_consecutive_samples():
+    alarm_engine, events = engine(Alarm(enable=True, above=1, warning_value=5.0, interlock_value=8.0, debounce=2))
+    feed(alarm_engine, [6.0, 6.0, 4.0, 6.0, 6.0, 6.0])
+
+    assert [(event.level, event.timestamp) for event in events] == [(level_warning, 5.0)]
+
+
+def test_repeated_channel_in_one_block_is_applied_in_order():
+    alarm_engine, events = engine(Alarm(enable=True, above=1, warning_value=5.0, interlock_value=8.0))
+    alarm_engine.evaluate(SampleBlock.from_arrays(np.array([0, 0, 0]), np.array([6.0, 9.0, 1.0]),
+                                                  np.array([0.0, 1.0, 2.0])))
+
+    assert [event.level for event in events] == [level_warning, level_interlock, level_ok]
+
+
+def test_blank_threshold_never_trips():
+    alarm_engine, events = engine(Alarm(enable=True, above=1, warning_value=5.0, interlock_value=None),
+                                  Alarm(enable=True, above=0, warning_value=None, interlock_value=None))
+    feed(alarm_engine, [7.0, 1e9])
+    feed(alarm_engine, [-1e9], handle=1)
+
+    assert [(event.handle, event.level) for event in events] == [(0, level_warning)]
+
+
+def test_update_thresholds_keeps_levels_and_clears_disabled_channels():
+    alarm_engine, events = engine(Alarm(enable=True, above=1, warning_value=5.0, interlock_value=8.0),
+                                  Alarm(enable=True, above=1, warning_value=5.0, interlock_value=8.0))
+    feed(alarm_engine, [9.0])
+    feed(alarm_engine, [9.0], handle=1)
+    cleared = alarm_engine.update_thresholds([
+        SimpleNamespace(alarm=Alarm(enable=True, above=1, warning_value=6.0, interlock_value=10.0)),
+        SimpleNamespace(alarm=Alarm(enable=False, above=1, warning_value=6.0, interlock_value=10.0))
+    ])
+
+    assert [(event.handle, event.previous_level, event.level) for event in cleared] == \
+        [(1, level_interlock, level_ok)]
+    assert events[-1] is cleared[0]
+    assert list(alarm_engine.active(level_interlock)) == [0]
+    assert list(alarm_engine.active(level_warning)) == [0]
+    feed(alarm_engine, [10.5])
+    assert len(events) == 3
+    feed(alarm_engine, [9.5])
+    assert [(event.handle, event.level) for event in events[3:]] == [(0, level_warning)]
@@ -0,0 +1,149 @@
+import threading
+
+import numpy as np
+
+from nexusflow import router
+from nexusflow.systemdesigner.controllers.controllermanager import ControllerManager
+from nexusflow.systemdesigner.controllers.outputstage import OutputStage
+from nexusflow.systemdesigner.controllers.simulated import SimulatedFPGAController, LinkSettings, SignalGenerator
+from nexusflow.systemdesigner.module.addressmap import AddressMap, set_address_map
+
+fast_link = LinkSettings(latency=0.0, jitter=0.0)
+
+
+def test_simulated_board_connects_headless(pins):
+    set_address_map(AddressMap(pins))
+    generators = {0: SignalGenerator(kind='constant', offset=2.0)}
+    controller = SimulatedFPGAController(link=fast_link, generators=generators, topic='test/headless')
+    try:
+        controller.init()
+        assert controller.fpga is not None
+        assert controller.read_channels(np.array([0]))[0] == 2.0
+        controller.disconnect()
+        assert controller.fpga is None
+    finally:
+        controller.unregister_route()
+
+
+def test_connection_is_shown_when_the_route_exists(pins, monkeypatch):
+    set_address_map(AddressMap(pins))
+    states = []
+    monkeypatch.setitem(router.routes, 'asdoncdsajcbds', None)
+    monkeypatch.setattr(router, 'route', lambda destination_id, payload: states.append(payload['function']))
+    controller = SimulatedFPGAController(link=fast_link, topic='test/led')
+    try:
+        controller.init()
+        controller.disconnect()
+    finally:
+        controller.unregister_route()
+    assert states == ['on', 'off']
+
+
+def test_output_stage_coalesces_writes_per_device():
+    writes = []
+    stage = OutputStage(lambda device, function, channels, values: writes.append(
+        (device, function, channels.tolist(), values.tolist())), window=10.0)
+    stage.write(0, 'DAC', 1, 1.0)
+    stage.write(0, 'DAC', 2, 2.0)
+    stage.write(0, 'DAC', 1, 3.0)
+    stage.write(1, 'DIG_OUT', 4, 1.0)
+
+    assert writes == []
+    assert stage.flush() == 2
+    assert sorted(writes) == [(0, 'DAC', [1, 2], [3.0, 2.0]), (1, 'DIG_OUT', [4], [1.0])]
+    assert (stage.requested_writes, stage.superseded_writes, stage.bulk_writes) == (4, 1, 2)
+    stage.stop()
+
+
+def test_output_stage_flushes_through_dispatch_when_the_window_ends():
+    flushed = threading.Event()
+    threads = []
+
+    def dispatch(flush):
+        threads.append(threading.current_thread().name)
+        flush()
+        flushed.set()
+
+    writes = []
+    stage = OutputStage(lambda *arguments: writes.append(arguments), window=0.01, dispatch=dispatch)
+    stage.write(0, 'DAC', 1, 1.0)
+    try:
+        assert flushed.wait(5.0)
+    finally:
+        stage.stop()
+    assert threads == ['nexusflow-outputs'] and len(writes) == 1
+
+
+def test_board_flushes_on_its_io_thread(pins):
+    set_address_map(AddressMap(pins))
+    controller = SimulatedFPGAController(link=fast_link, topic='test/flush', affinity='io:test-flush')
+    threads = []
+    flushed = threading.Event()
+    write_outputs = controller.write_outputs
+
+    def record_thread(*arguments):
+        threads.append(threading.current_thread().name)
+        write_outputs(*arguments)
+        flushed.set()
+
+    controller.write_outputs = record_thread
+    controller.output_stage.write_bulk = record_thread
+    try:
+        controller.open()
+        output = next(handle for handle, pin in enumerate(pins) if pin.function == 'DAC')
+        controller.write_channel(output, 1.5)
+        assert flushed.wait(5.0)
+        assert threads == ['nexusflow-io:test-flush']
+        assert controller.read_channels(np.array([output]))[0] == 1.5
+    finally:
+        controller.close()
+        controller.unregister_route()
+        router.stop_io_worker('io:test-flush')
+
+
+def test_controller_manager_routes_the_active_board(pins):
+    set_address_map(AddressMap(pins))
+    manager = ControllerManager()
+    first = SimulatedFPGAController(link=fast_link, serial='first')
+    second = SimulatedFPGAController(link=fast_link, serial='second')
+    try:
+        manager.add(first)
+        manager.add(second)
+        assert (manager.active, first.topic, second.topic) == ('first', 'fpga', 'board/second')
+        manager.set_active('second')
+        assert (first.topic, second.topic) == ('board/first', 'fpga')
+        assert (first.affinity, second.affinity) == ('io:first', 'io:second')
+
+        snapshot = manager.connect_all()
+        assert snapshot.complete and set(snapshot.results) == {'first', 'second'}
+        snapshot = manager.fan_out(lambda controller: threading.current_thread().name)
+        assert snapshot.results == {'first': 'nexusflow-io:first', 'second': 'nexusflow-io:second'}
+
+        manager.remove('second')
+        assert (manager.active, first.topic) == ('first', 'fpga')
+    finally:
+        manager.close()
+    assert len(manager) == 0 and first.fpga is None
+
+
+def test_fan_out_isolates_failing_and_slow_boards(pins):
+    set_address_map(AddressMap(pins))
+    manager = ControllerManager()
+    for serial in ('ok', 'failing', 'slow'):
+        manager.add(SimulatedFPGAController(link=fast_link, serial=serial))
+    release = threading.Event()
+
+    def operation(controller):
+        if controller.serial == 'failing':
+            raise OSError("board not found")
+        if controller.serial == 'slow':
+            release.wait(5.0)
+        return controller.serial
+
+    try:
+        snapshot = manager.fan_out(operation, timeout=0.2)
+    finally:
+        release.set()
+        manager.close()
+    assert snapshot.results == {'ok': 'ok'}
+    assert set(snapshot.errors) == {'failing', 'slow'} and isinstance(snapshot.errors['failing'], OSError)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from nexusflow.messages import SampleBlock
+from nexusflow.systemdesigner.conversion import ConversionEngine
+from nexusflow.systemdesigner.module.pindefinition import ConversionCoefficients, Exponential
+
+from conftest import make_pin
+
+
+def test_linear_and_digital_conversion():
+    analog = make_pin(0, 'ADC')
+    digital = make_pin(1, 'DIG_IN')
+    inverted = make_pin(2, 'DIG_IN')
+    inverted.active_low = True
+    engine = ConversionEngine([analog, digital, inverted], handles=[10, 20, 30])
+
+    values = engine.convert(np.array([10, 20, 30, 10]), np.array([2.0, 5.0, 5.0, 0.0]))
+    assert values.tolist() == [1.5 * 2.0 - 0.25, 1.0, 0.0, -0.25]
+    assert engine.to_raw(np.array([10, 30]), np.array([2.75, 1.0])).tolist() == [2.0, 0.0]
+    with pytest.raises(KeyError):
+        engine.convert(np.array([11]), np.array([0.0]))
+    with pytest.raises(KeyError):
+        engine.convert(np.array([31]), np.array([0.0]))
+
+
+def test_exponential_conversion():
+    pin = make_pin(0, 'ADC')
+    pin.conversion_coefficients = ConversionCoefficients(k=1.0, C=0.0)
+    pin.exponential = Exponential(enable=True, B=3950.0, R0=10e3, T0=25.0)
+    engine = ConversionEngine([pin])
+
+    at_t0, colder = engine.convert(np.array([0, 0]), np.array([10e3, 20e3]))
+    assert at_t0 == pytest.approx(25.0)
+    expected = 1.0 / (1.0 / 298.15 + np.log(2.0) / 3950.0) - 273.15
+    assert colder == pytest.approx(expected)
+
+
+def test_convert_block_keeps_handles_and_timestamps(pins):
+    engine = ConversionEngine(pins)
+    block = SampleBlock.from_arrays(np.array([0, 4]), np.array([1.0, 2.0]), np.array([5.0, 6.0]))
+    converted = engine.convert_block(block)
+
+    assert converted.handles.tolist() == [0, 4] and converted.timestamps.tolist() == [5.0, 6.0]
+    assert converted.values.tolist() == engine.convert(block.handles, block.values).tolist()
+    assert block.values.tolist() == [1.0, 2.0]
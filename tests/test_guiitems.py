@@ -0,0 +1,50 @@
+import numpy as np
+from PySide6.QtCore import QEvent
+from PySide6.QtWidgets import QWidget
+
+from nexusflow import router
+from nexusflow.guidesigner.guiitems import GuiOutputWidgetItem, PinSampleDisplay
+from nexusflow.messages import SampleBlock
+from nexusflow.systemdesigner.module.addressmap import AddressMap, set_address_map
+
+
+def publish(handle: int, value: float):
+    router.publish_samples(SampleBlock.from_arrays(np.array([handle]), np.array([value]), 0.0))
+
+
+def test_output_follows_its_pin_when_pins_are_renumbered(qapp, pins):
+    set_address_map(AddressMap(pins))
+    shown = []
+    widget = QWidget()
+    display = PinSampleDisplay(pins[3].id, shown.append, widget)
+    publish(3, 1.0)
+    publish(4, 2.0)
+
+    set_address_map(AddressMap(pins[::-1]))
+    publish(3, 3.0)
+    publish(len(pins) - 4, 4.0)
+    assert shown == [1.0, 4.0]
+    assert display.handle == len(pins) - 4
+
+    subscriptions = len(router.sample_subscriptions)
+    widget.deleteLater()
+    qapp.sendPostedEvents(None, QEvent.DeferredDelete)
+    assert len(router.sample_subscriptions) == subscriptions - 1
+    assert display.sample_subscription is None and display.address_map_subscription is None
+    set_address_map(AddressMap(pins))
+    publish(3, 5.0)
+    assert shown == [1.0, 4.0]
+
+
+def test_output_widget_shows_samples(qapp, pins):
+    set_address_map(AddressMap(pins))
+    handle = next(handle for handle, pin in enumerate(pins) if pin.main_gui.display_type == 'float')
+    item = GuiOutputWidgetItem()
+    item.add_data(pins[handle], False)
+    widget = item.get_gui()
+    try:
+        publish(handle, 2.5)
+        assert widget.layout().itemAt(1).widget().value() == 2.5
+    finally:
+        widget.deleteLater()
+        qapp.sendPostedEvents(None, QEvent.DeferredDelete)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from nexusflow.history import HistoryStore
+from nexusflow.messages import SampleBlock
+
+
+def fill(store: HistoryStore, count: int, handle: int = 0):
+    timestamps = np.arange(count, dtype=np.float64)
+    for start in range(0, count, 100):
+        chunk = timestamps[start:start + 100]
+        store.append(SampleBlock.from_arrays(np.full(len(chunk), handle), np.sin(chunk / 50), chunk))
+    return timestamps, np.sin(timestamps / 50)
+
+
+def test_recent_range_is_served_from_raw_samples():
+    store = HistoryStore(2, capacity=256, factors=(16, 256))
+    timestamps, values = fill(store, 1000)
+
+    result = store.query_range(0, 900.0, 999.0, 200)
+    assert result.factor == 1
+    assert np.array_equal(result.timestamps, timestamps[900:])
+    assert np.array_equal(result.mean, values[900:])
+    assert store.latest(0) == (values[-1], 999.0)
+    assert np.isnan(store.latest(1)[0])
+
+
+def test_long_range_uses_min_max_buckets():
+    store = HistoryStore(1, capacity=256, factors=(16, 256))
+    timestamps, values = fill(store, 4000)
+
+    result = store.query_range(0, 0.0, 3999.0, 50)
+    assert result.factor > 1 and len(result) <= 50
+    assert result.minimum.min() == pytest.approx(values.min())
+    assert result.maximum.max() == pytest.approx(values.max())
+    assert np.all(result.minimum <= result.mean) and np.all(result.mean <= result.maximum)
+    # Older raw samples were overwritten, the ring keeps its capacity
+    assert store.levels[0].oldest_timestamp(0) == 4000 - 256
+
+
+def test_repeated_channels_and_unknown_handles():
+    store = HistoryStore(2, capacity=16, factors=(4,))
+    store.append(SampleBlock.from_arrays(np.array([0, 1, 0, 5]), np.array([1.0, 2.0, 3.0, 9.0]),
+                                         np.array([0.0, 0.0, 1.0, 1.0])))
+
+    result = store.query_range(0, 0.0, 1.0, 10)
+    assert result.mean.tolist() == [1.0, 3.0]
+    assert store.latest(1) == (2.0, 0.0)
+    with pytest.raises(IndexError):
+        store.query_range(5, 0.0, 1.0, 10)
+    with pytest.raises(ValueError):
+        HistoryStore(1, factors=(16, 8))
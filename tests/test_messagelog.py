@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from nexusflow import router
+from nexusflow.messages import SampleBlock
+from nexusflow.messagelog import MessageRecorder, MessageReplayer, destination_route, destination_topic, \
+    destination_samples
+
+
+def test_recorded_messages_read_back(tmp_path):
+    path = tmp_path / 'messages.nxlog'
+    block = SampleBlock.from_arrays(np.array([1, 2]), np.array([0.5, 1.5]), 3.0)
+    payloads = [None, True, -7, 2.5, 'text', {'function': 'on', 'values': [1, 2.5, None]}, (1, 'a')]
+    recorder = MessageRecorder(path)
+    for payload in payloads:
+        recorder.record(destination_route, 'route', payload)
+    recorder.record(destination_topic, 'fpga/channel/3', 1.0)
+    recorder.record(destination_samples, 'samples', block)
+    recorder.close()
+
+    replayer = MessageReplayer(path)
+    try:
+        messages = list(replayer.messages())
+    finally:
+        replayer.close()
+    assert [(kind, destination, payload) for _, kind, destination, payload in messages[:-1]] == \
+        [(destination_route, 'route', payload) for payload in payloads[:-1]] + \
+        [(destination_route, 'route', [1, 'a']), (destination_topic, 'fpga/channel/3', 1.0)]
+    assert np.array_equal(messages[-1][3].samples, block.samples)
+
+
+def test_unrecordable_payload_is_skipped(tmp_path):
+    path = tmp_path / 'messages.nxlog'
+    recorder = MessageRecorder(path)
+    recorder.record(destination_route, 'route', object())
+    recorder.record(destination_route, 'route', {'value': object()})
+    recorder.record(destination_route, 'route', 1)
+    recorder.close()
+
+    assert (recorder.record_count, recorder.skipped_count) == (1, 2)
+    replayer = MessageReplayer(path)
+    try:
+        assert [payload for _, _, _, payload in replayer.messages()] == [1]
+    finally:
+        replayer.close()
+
+
+def test_recording_never_blocks_routing(tmp_path, qapp, monkeypatch):
+    delivered = []
+    router.register_route('messagelog test', delivered.append)
+    monkeypatch.setattr(router, 'recorder', MessageRecorder(tmp_path / 'messages.nxlog'))
+    payload = object()
+    try:
+        router.route('messagelog test', payload)
+    finally:
+        router.recorder.close()
+    assert delivered == [payload]
+
+
+def test_recorder_does_not_append_to_other_files(tmp_path):
+    path = tmp_path / 'messages.nxlog'
+    path.write_bytes(b'not a message log')
+    with pytest.raises(ValueError):
+        MessageRecorder(path)
@@ -0,0 +1,120 @@
+import time
+from dataclasses import replace
+
+from nexusflow.systemdesigner.module.module import Module, ModuleImport, ModuleManager
+from nexusflow.systemdesigner.module.pindefinition import Miscellaneous
+from nexusflow.systemdesigner.tableexport import export_table
+
+from conftest import make_pin
+
+
+def wait_until(qapp, condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        qapp.processEvents()
+
+
+def start_import(module_manager: ModuleManager, pin_definitions, chunk_size: int = 7) -> tuple:
+    module_import = ModuleImport(module_manager, 'module.xlsx', chunk_size, loader=lambda: pin_definitions)
+    finished, failed = [], []
+    module_import.finished.connect(finished.append)
+    module_import.failed.connect(failed.append)
+    module_import.start()
+    return module_import, finished, failed
+
+
+def test_import_fills_module_in_chunks(qapp, pins):
+    module_manager = ModuleManager(cache=False)
+    module_import, finished, failed = start_import(module_manager, pins)
+    wait_until(qapp, lambda: not module_import.running)
+
+    assert failed == [] and finished == module_manager.modules
+    assert module_manager.get_pin_definitions() == pins
+
+
+def test_failing_chunk_ends_import(qapp, pins):
+    # HWFunction cannot show a pin without ADC range, the import must fail instead of waiting forever
+    pins[15] = replace(pins[15], miscellaneous=Miscellaneous(dac_range=10.0, adc_range=None, disable_powerdrop=None))
+    module_manager = ModuleManager(cache=False)
+    module_import, finished, failed = start_import(module_manager, pins)
+    wait_until(qapp, lambda: not module_import.running)
+
+    assert len(failed) == 1 and finished == []
+    assert module_manager.modules == [] and not module_import.timer.isActive()
+
+
+def test_cancelled_empty_import_is_not_added(qapp):
+    module_manager = ModuleManager(cache=False)
+    module_import, finished, failed = start_import(module_manager, [])
+    module_import.cancel()
+    wait_until(qapp, lambda: module_import.total is not None)
+
+    assert finished == [None] and module_manager.modules == []
+
+
+def test_update_functions_rebuilds_only_changed_pins(qapp, pins):
+    module = Module('module')
+    module.import_functions(pins[:10])
+    functions = list(module.pin_definitions)
+    changed = replace(pins[4], name='renamed')
+    added = make_pin(40)
+
+    diff = module.update_functions(pins[:4] + [changed] + pins[6:10] + [added])
+    assert diff.added == [added.id] and diff.removed == [pins[5].id] and diff.changed == [changed.id]
+    assert diff.unchanged == 8 and str(diff) == "1 added, 1 removed, 1 changed, 8 unchanged"
+
+    assert [function.pin_definition.id for function in module.pin_definitions] == \
+        [pin.id for pin in pins[:5] + pins[6:10]] + [added.id]
+    assert module.pin_definitions[:4] == functions[:4] and module.pin_definitions[5:9] == functions[6:10]
+    # The changed pin keeps its PinDefinition object, GUI items built from it see the new name
+    assert module.pin_definitions[4] is not functions[4]
+    assert module.pin_definitions[4].pin_definition is functions[4].pin_definition
+    assert functions[4].pin_definition.name == 'renamed'
+    assert [module.hw_functions_list.item(row).text() for row in range(module.hw_functions_list.count())] == \
+        [function.pin_definition.id for function in module.pin_definitions]
+
+
+def test_update_functions_without_changes_keeps_everything(qapp, pins):
+    module = Module('module')
+    module.import_functions(pins[:10])
+    functions = list(module.pin_definitions)
+
+    diff = module.update_functions([replace(pin) for pin in pins[:10]])
+    assert not diff and diff.unchanged == 10
+    assert module.pin_definitions == functions
+
+
+def test_reordered_pins_change_handles(qapp, pins):
+    module = Module('module')
+    module.import_functions(pins[:10])
+
+    diff = module.update_functions(pins[1:10] + pins[:1])
+    assert diff and diff.reordered and diff.handles_changed and diff.unchanged == 10
+    assert [function.pin_definition.id for function in module.pin_definitions] == \
+        [pin.id for pin in pins[1:10] + pins[:1]]
+    assert not module.update_functions(pins[1:10] + pins[:1]).reordered
+
+
+def test_watcher_reloads_saved_workbook(qapp, tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins[:10])
+    module_manager = ModuleManager(watch=True, cache=False)
+    module_manager.watcher.debounce = 10
+    module_manager.import_functions(str(path))
+    reloaded = []
+    module_manager.module_reloaded.connect(lambda module, diff: reloaded.append(diff))
+
+    export_table(path, pins[:3] + [replace(pins[3], unit='mV')] + pins[4:10])
+    wait_until(qapp, lambda: reloaded)
+    assert reloaded[0].changed == [pins[3].id] and not reloaded[0].handles_changed
+    assert module_manager.get_pin_definitions()[3].unit == 'mV'
+
+    # Saving replaced the file, the watch must survive it
+    export_table(path, pins[:9])
+    wait_until(qapp, lambda: len(reloaded) == 2)
+    assert reloaded[1].removed == [pins[9].id]
+
+
+def test_watcher_is_optional(qapp):
+    assert ModuleManager(cache=False).watcher is None
@@ -0,0 +1,16 @@
+from nexusflow.systemdesigner.excelimport import import_excel
+from nexusflow.systemdesigner.modulecache import ModuleCache
+from nexusflow.systemdesigner.tableexport import export_table
+
+
+def test_cache_is_keyed_by_content_and_importer(tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins)
+    cache = ModuleCache(tmp_path / 'cache')
+
+    assert cache.import_module(path) == pins
+    assert cache.import_module(path) == pins
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.import_module(path, importer=import_excel)
+    assert cache.misses == 2
+    assert cache.clear() == 2
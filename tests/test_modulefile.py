@@ -0,0 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from nexusflow.systemdesigner.modulefile import save_module_file, load_module_file
+
+
+def test_module_file_round_trip(tmp_path, pins):
+    path = tmp_path / 'module.nfmod'
+    save_module_file(path, 'module', pins, source='module.xlsx')
+    module_file = load_module_file(path)
+
+    assert module_file.name == 'module' and module_file.source == 'module.xlsx'
+    assert module_file.pin_definitions == pins
+
+
+def test_concurrent_saves_do_not_share_a_temporary_file(tmp_path, pins):
+    path = tmp_path / 'module.nfmod'
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda index: save_module_file(path, f'module {index}', pins), range(32)))
+
+    assert load_module_file(path).pin_definitions == pins
+    assert [child.name for child in tmp_path.iterdir()] == ['module.nfmod']
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from nexusflow.systemdesigner.controllers.processhost import ChannelTable, CommandRing, ControllerProcessHost, \
+    apply_writes, command_dtype, opcode_write, opcode_stop
+from nexusflow.systemdesigner.controllers.simulated import SimulatedFPGAController, LinkSettings
+from nexusflow.systemdesigner.module.addressmap import AddressMap, set_address_map
+
+
+@pytest.fixture
+def table():
+    table = ChannelTable(64)
+    yield table
+    table.close()
+
+
+def test_channel_table_attach_and_read(table):
+    attached = ChannelTable(64, name=table.name)
+    try:
+        attached.write(np.array([3, 5]), np.array([1.5, -2.0]), 10.0)
+        values, timestamps = table.read()
+    finally:
+        attached.close()
+
+    assert values[3] == 1.5 and values[5] == -2.0
+    assert np.isnan(values[0])
+    assert timestamps[3] == timestamps[5] == 10.0 and timestamps[0] == 0.0
+
+
+def test_channel_table_reads_are_never_torn(table):
+    handles = np.arange(64)
+    stop = threading.Event()
+
+    def writer():
+        value = 0.0
+        while not stop.is_set():
+            value += 1.0
+            table.write(handles, np.full(64, value), value)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            values, timestamps = table.read(retries=1_000_000)
+            assert np.all(values == values[0])
+            assert np.all(timestamps == values)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_command_ring_order_and_capacity():
+    ring = CommandRing(4)
+    try:
+        assert all(ring.push(opcode_write, handle, handle * 0.5) for handle in range(4))
+        assert not ring.push(opcode_stop)
+        commands = ring.pop_all()
+        assert [(int(opcode), int(handle), float(value)) for opcode, handle, value in commands] == \
+            [(opcode_write, handle, handle * 0.5) for handle in range(4)]
+        assert ring.push(opcode_stop)
+        assert [int(command[0]) for command in ring.pop_all()] == [opcode_stop]
+        assert len(ring.pop_all()) == 0
+    finally:
+        ring.close()
+
+    with pytest.raises(ValueError):
+        CommandRing(6)
+
+
+def test_controller_writes_by_system_handle(pins):
+    set_address_map(AddressMap(pins))
+    controller = SimulatedFPGAController(link=LinkSettings(latency=0.0, jitter=0.0))
+    controller.open()
+    try:
+        outputs = np.array([handle for handle, pin in enumerate(pins) if pin.function in ('DAC', 'DIG_OUT')])
+        controller.write_channels(outputs, np.ones(len(outputs)))
+        assert np.all(controller.read_channels(outputs) == 1.0)
+        with pytest.raises(ValueError):
+            controller.write_channels(np.array([next(handle for handle, pin in enumerate(pins)
+                                                     if pin.function == 'ADC')]), np.ones(1))
+    finally:
+        controller.close()
+
+
+def test_apply_writes_keeps_the_last_value_per_channel(table):
+    class Recorder:
+        def __init__(self):
+            self.writes = []
+
+        def write_channels(self, handles, values):
+            self.writes.append((handles.tolist(), values.tolist()))
+
+    controller = Recorder()
+    commands = np.array([(opcode_write, 3, 1.0), (opcode_write, 5, 2.0), (opcode_write, 3, 4.0)], dtype=command_dtype)
+    apply_writes(controller, table, commands)
+
+    assert controller.writes == [([3, 5], [4.0, 2.0])]
+    values, _ = table.read()
+    assert (values[3], values[5]) == (4.0, 2.0)
+
+
+def test_hosted_controller_reads_and_writes_by_system_handle(pins):
+    host = ControllerProcessHost('hosted', SimulatedFPGAController, pins)
+    inputs = host.input_handles
+    output = next(handle for handle, pin in enumerate(pins) if pin.function == 'DAC')
+    host.start()
+    try:
+        host.write(output, 2.5)
+        deadline = time.perf_counter() + 30.0
+        while time.perf_counter() < deadline:
+            values = host.read_channels(np.append(inputs, output))
+            if not np.any(np.isnan(values)) and values[-1] == 2.5:
+                break
+            time.sleep(0.05)
+        assert [pins[handle].function for handle in inputs] == \
+            [pin.function for pin in pins if pin.function in ('ADC', 'DIG_IN')]
+        assert not np.any(np.isnan(values)) and values[-1] == 2.5
+    finally:
+        host.stop()
+    with pytest.raises(RuntimeError):
+        host.read_channels(inputs)
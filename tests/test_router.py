@@ -0,0 +1,31 @@
+from nexusflow.router import MessageBus
+
+
+def test_message_bus_coalesces_states_and_keeps_events(qapp):
+    bus = MessageBus()
+    states, events = [], []
+    for value in range(5):
+        bus.post('state', states.append, value, 'state')
+        bus.post('event', events.append, value, 'event')
+
+    assert bus.pending_count() == 6
+    assert bus.flush() == 6
+    assert states == [4]
+    assert events == [0, 1, 2, 3, 4]
+    assert bus.pending_count() == 0
+
+
+def test_message_bus_isolates_failing_subscribers(qapp):
+    bus = MessageBus()
+    delivered = []
+
+    def fail(payload):
+        raise RuntimeError(payload)
+
+    bus.post('failing event', fail, 'event', 'event')
+    bus.post('event', delivered.append, 'event', 'event')
+    bus.post('failing state', fail, 'state', 'state')
+    bus.post('state', delivered.append, 'state', 'state')
+
+    assert bus.flush() == 4
+    assert delivered == ['event', 'state']
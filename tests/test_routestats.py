@@ -0,0 +1,47 @@
+import pytest
+
+from nexusflow.routestats import Histogram, RouteStatistics, histogram_bounds
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    assert histogram.percentile(50) == 0.0
+    for _ in range(99):
+        histogram.add(0.5e-6)
+    histogram.add(3e-6)
+
+    assert histogram.percentile(50) == histogram_bounds[0]
+    assert histogram.percentile(100) == histogram_bounds[2]
+    histogram.add(1e3)
+    assert histogram.percentile(100) == histogram.maximum == 1e3
+
+
+def test_route_statistics_counts_and_queue_depth():
+    statistics = RouteStatistics()
+    delivered = []
+    first = statistics.instrument('route', delivered.append)
+    second = statistics.instrument('route', delivered.append)
+    statistics.record_coalesced('route')
+    statistics.instrument('route', delivered.append)
+
+    assert statistics.get_destination('route').queue_depth == 2
+    first('a')
+    second('b')
+    snapshot, = statistics.snapshot()
+    assert delivered == ['a', 'b']
+    assert (snapshot['messages'], snapshot['coalesced'], snapshot['queue_depth'], snapshot['max_queue_depth']) == \
+        (2, 1, 0, 2)
+
+
+def test_route_statistics_counts_failures():
+    statistics = RouteStatistics()
+
+    def fail(payload):
+        raise RuntimeError(payload)
+
+    with pytest.raises(RuntimeError):
+        statistics.instrument('route', fail)('payload')
+    destination = statistics.get_destination('route')
+    assert (destination.failed, destination.delivered, destination.queue_depth) == (1, 0, 0)
+    statistics.reset()
+    assert statistics.snapshot() == []
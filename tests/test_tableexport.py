@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+from nexusflow.systemdesigner.excelimport import import_excel
+from nexusflow.systemdesigner.tableexport import export_table
+from nexusflow.systemdesigner.tableimport import import_table
+
+
+def test_export_import_round_trip(tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins)
+    result = import_table(path)
+
+    assert result.errors == [] and result.header_errors == []
+    assert result.pin_definitions == pins
+
+
+def test_export_reads_with_legacy_importer(tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins)
+    legacy = import_excel(path)
+
+    assert [pin.id for pin in legacy] == [pin.id for pin in pins]
+    assert [pin.main_gui.display for pin in legacy] == [pin.main_gui.display for pin in pins]
+    assert [pin.important_gui.display for pin in legacy] == [pin.important_gui.display for pin in pins]
+
+
+def test_concurrent_exports_do_not_share_a_temporary_file(tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: export_table(path, pins), range(8)))
+
+    assert import_table(path).pin_definitions == pins
+    assert [child.name for child in tmp_path.iterdir()] == ['module.xlsx']
+
+
+def test_export_keeps_markup_characters_and_spaces(tmp_path, pins):
+    pins = [replace(pins[0], name=' <Vout & Iout> ', unit='"%"')] + pins[1:]
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins)
+
+    assert import_table(path).pin_definitions == pins
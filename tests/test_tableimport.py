@@ -0,0 +1,47 @@
+from openpyxl import load_workbook
+
+from nexusflow.systemdesigner.tableexport import export_table
+from nexusflow.systemdesigner.tableimport import import_table
+
+
+def test_notes_above_the_header_do_not_remap_columns(tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins)
+    workbook = load_workbook(path)
+    worksheet = workbook.active
+    worksheet['B1'], worksheet['C1'], worksheet['D2'] = 'C', 'row', 'min'
+    workbook.save(path)
+    result = import_table(path)
+
+    assert result.header_errors == []
+    assert result.pin_definitions == pins
+
+
+def test_duplicate_and_conflicting_headers_are_reported(tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins)
+    workbook = load_workbook(path)
+    worksheet = workbook.active
+    worksheet['AC5'] = 'min'  # min named twice
+    worksheet['N5'], worksheet['O5'] = None, 'max'  # max moved onto the default column of initial
+    workbook.save(path)
+    result = import_table(path)
+
+    assert {error.field for error in result.header_errors} == {'min', 'initial'}
+    assert result.column_map['min'] == 12
+    assert result.column_map['max'] == 14
+    assert result.column_map['initial'] is None
+
+
+def test_headerless_sheet_uses_default_layout(tmp_path, pins):
+    path = tmp_path / 'module.xlsx'
+    export_table(path, pins)
+    workbook = load_workbook(path)
+    worksheet = workbook.active
+    worksheet.delete_rows(5)
+    worksheet.insert_rows(5)
+    workbook.save(path)
+    result = import_table(path)
+
+    assert [error.field for error in result.header_errors] == ['header']
+    assert result.pin_definitions == pins
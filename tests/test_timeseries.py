@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+import pytest
+
+from nexusflow.messages import SampleBlock
+from nexusflow.timeseries import SessionRecorder, SessionReader
+
+
+def make_block(start: int, size: int = 10) -> SampleBlock:
+    timestamps = np.arange(start, start + size, dtype=np.float64)
+    return SampleBlock.from_arrays(np.arange(size) % 2, timestamps * 2, timestamps)
+
+
+def slow_write(recorder: SessionRecorder, delay: float):
+    write = recorder.write
+
+    def write_slowly(block):
+        time.sleep(delay)
+        write(block)
+    recorder.write = write_slowly
+
+
+def test_burst_waits_for_writer_instead_of_dropping(tmp_path):
+    recorder = SessionRecorder(tmp_path / 'session', channel_ids=['A', 'B'], chunk_samples=64, queue_blocks=4)
+    slow_write(recorder, 0.01)
+    recorder.start()
+    for index in range(200):
+        recorder.record(make_block(index * 10))
+    recorder.stop()
+
+    assert recorder.dropped_blocks == 0
+    reader = SessionReader(tmp_path / 'session')
+    assert len(reader) == 2000
+    timestamps, values = reader.read(reader.handle_of('B'), 0, 2000)
+    assert np.array_equal(timestamps, np.arange(1, 2000, 2))
+    assert np.array_equal(values, timestamps * 2)
+
+
+def test_blocks_are_dropped_and_counted_after_timeout(tmp_path):
+    recorder = SessionRecorder(tmp_path / 'session', chunk_samples=64, queue_blocks=1, put_timeout=0)
+    slow_write(recorder, 0.05)
+    recorder.start()
+    for index in range(20):
+        recorder.record(make_block(index * 10))
+    recorder.stop()
+
+    assert recorder.dropped_blocks > 0
+    assert recorder.dropped_samples == recorder.dropped_blocks * 10
+    assert len(SessionReader(tmp_path / 'session')) == 200 - recorder.dropped_samples
+
+
+def record_sine(path, levels, count=20000, chunk_samples=4096):
+    recorder = SessionRecorder(path, channel_ids=['A', 'B'], chunk_samples=chunk_samples, levels=levels)
+    recorder.start()
+    timestamps = np.arange(count, dtype=np.float64) / 2
+    handles = np.arange(count) % 2
+    values = np.sin(timestamps / 100) + handles
+    for start in range(0, count, 1000):
+        recorder.record(SampleBlock.from_arrays(handles[start:start + 1000], values[start:start + 1000],
+                                                timestamps[start:start + 1000]))
+    recorder.stop()
+    return SessionReader(path), values[handles == 1]
+
+
+def test_zoomed_out_query_uses_pyramid(tmp_path):
+    reader, values = record_sine(tmp_path / 'levels', levels=(16, 256))
+    raw_reader, _ = record_sine(tmp_path / 'raw', levels=())
+    assert raw_reader.levels == []
+
+    records = reader.level_records(1, 1000.0, 9000.0, *reader.sample_range(1000.0, 9000.0), 20)
+    assert records is not None and records['count'].max() == 256
+
+    result = reader.query(1, 1000.0, 9000.0, 20)
+    expected = raw_reader.query(1, 1000.0, 9000.0, 20)
+    sample_timestamps = np.arange(len(values)) + 0.5
+    selected = values[(sample_timestamps >= 1000.0) & (sample_timestamps <= 9000.0)]
+    assert result.counts.sum() == expected.counts.sum() == len(selected)
+    assert result.minimum.min() == expected.minimum.min() == selected.min()
+    assert result.maximum.max() == expected.maximum.max() == selected.max()
+    assert result.mean @ result.counts == pytest.approx(selected.sum())
+
+
+def test_zoomed_in_query_reads_samples(tmp_path):
+    reader, values = record_sine(tmp_path / 'levels', levels=(16, 256))
+    raw_reader, _ = record_sine(tmp_path / 'raw', levels=())
+
+    assert reader.level_records(1, 100.0, 200.0, *reader.sample_range(100.0, 200.0), 400) is None
+    result = reader.query(1, 100.0, 200.0, 400)
+    expected = raw_reader.query(1, 100.0, 200.0, 400)
+    assert np.array_equal(result.timestamps, expected.timestamps)
+    assert np.array_equal(result.mean, expected.mean)
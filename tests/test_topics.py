@@ -0,0 +1,43 @@
+import pytest
+
+from nexusflow.topics import TopicTree, Subscription
+
+
+def resolve(tree: TopicTree, topic: str):
+    return {resolved.subscription.pattern: resolved.address for resolved in tree.resolve(topic)}
+
+
+def test_topic_tree_wildcards():
+    tree = TopicTree()
+    for pattern in ('fpga/connect', 'fpga/channel/+', 'fpga/+/+', 'fpga/#', 'board/+/channel/+'):
+        tree.subscribe(Subscription(pattern=pattern, callback=print,
+                                    converters=(int,) if pattern == 'fpga/channel/+' else ()))
+
+    assert resolve(tree, 'fpga/connect') == {'fpga/connect': (), 'fpga/#': ('connect',)}
+    assert resolve(tree, 'fpga/channel/12') == {'fpga/channel/+': (12,), 'fpga/+/+': ('channel', '12'),
+                                                'fpga/#': ('channel/12',)}
+    assert resolve(tree, 'board/7/channel/3') == {'board/+/channel/+': ('7', '3')}
+    assert resolve(tree, 'fpga') == {'fpga/#': ('',)}
+    assert resolve(tree, 'board/7/channel') == {}
+
+
+def test_topic_tree_unsubscribe_clears_cache():
+    tree = TopicTree()
+    subscription = tree.subscribe(Subscription(pattern='alarm/+/+', callback=print))
+    assert len(tree.resolve('alarm/warning/3')) == 1
+
+    tree.unsubscribe(subscription)
+    assert tree.resolve('alarm/warning/3') == ()
+    with pytest.raises(ValueError):
+        tree.subscribe(Subscription(pattern='alarm/#/3', callback=print))
+    with pytest.raises(KeyError):
+        tree.unsubscribe(Subscription(pattern='other/+', callback=print))
+
+
+def test_topic_tree_skips_subscriptions_whose_converter_fails():
+    tree = TopicTree()
+    tree.subscribe(Subscription(pattern='fpga/channel/+', callback=print, converters=(int,)))
+    tree.subscribe(Subscription(pattern='fpga/#', callback=print))
+
+    assert resolve(tree, 'fpga/channel/abc') == {'fpga/#': ('channel/abc',)}
+    assert resolve(tree, 'fpga/channel/3') == {'fpga/channel/+': (3,), 'fpga/#': ('channel/3',)}